@@ -1,3 +1,14 @@
+import shutil
+
+import pytest
+
+from texnomagic.abc import TexnoMagicAlphabet
+from texnomagic.abcs import TexnoMagicAlphabets
+from texnomagic.index import TexnoMagicDrawingIndex
+from texnomagic.symbol import TexnoMagicSymbol
+from texnomagic import ex
+from texnomagic import memory
+
 import commontest  # common testing code
 
 
@@ -20,3 +31,104 @@ def test_abcs_basic():
     abc_id = f'test:{commontest.ABC.name}'
     abc = abcs.get_alphabet(abc_id)
     assert abc.name == commontest.ABC.name
+
+
+def test_abc_index():
+    idx = TexnoMagicDrawingIndex().build(commontest.ABC)
+    assert len(idx) > 0
+
+    symbol = commontest.ABC.symbols[0]
+    drawing = symbol.drawings[0]
+    meaning, name, dist = idx.knn(drawing, k=3)[0]
+    # indexed drawing is its own nearest neighbour
+    assert (meaning, name) == (symbol.meaning, drawing.name)
+    assert dist < 1e-6
+    assert idx.recognize(drawing, k=1) == [(symbol.meaning, 1.0)]
+    assert idx.duplicates(threshold=0.0) == []
+
+
+def test_abc_index_stale(tmp_path):
+    shutil.copytree(commontest.ABC.path, tmp_path / 'abc')
+    abc = TexnoMagicAlphabet(tmp_path / 'abc').load()
+    n = len(abc.build_index(save=True))
+
+    abc = TexnoMagicAlphabet(tmp_path / 'abc').load()
+    assert len(abc.index) == n
+    # saved index is rebuilt when drawings change
+    drawing = abc.symbols[0].drawings[0]
+    drawing.path.unlink()
+    abc = TexnoMagicAlphabet(tmp_path / 'abc').load()
+    assert len(abc.index) == n - 1
+    assert drawing.name not in abc.index.drawings
+
+
+def test_abcs_reload_alphabet(tmp_path):
+    shutil.copytree(commontest.ABC.path, tmp_path / 'abc1')
+    abcs = TexnoMagicAlphabets({'test': tmp_path})
+    assert len(abcs.abcs['test']) == 1
+    old = abcs.abcs['test']
+
+    # new alphabet is added
+    shutil.copytree(commontest.ABC.path, tmp_path / 'abc2')
+    abc = abcs.reload_alphabet(tmp_path / 'abc2')
+    assert abc.path == tmp_path / 'abc2'
+    assert len(abcs.abcs['test']) == 2
+    # existing list isn't modified
+    assert len(old) == 1
+
+    # existing alphabet is replaced
+    abc1 = abcs.reload_alphabet(tmp_path / 'abc1')
+    assert abc1 is not old[0]
+    assert len(abcs.abcs['test']) == 2
+
+    # removed alphabet is removed
+    shutil.rmtree(tmp_path / 'abc2')
+    assert abcs.reload_alphabet(tmp_path / 'abc2') is None
+    assert [a.path for a in abcs.abcs['test']] == [tmp_path / 'abc1']
+
+    # paths outside alphabets paths
+    assert abcs.get_path_tag(tmp_path / 'abc1') == 'test'
+    assert abcs.get_path_tag(tmp_path.parent / 'abc3') is None
+    with pytest.raises(ValueError):
+        abcs.reload_alphabet(tmp_path.parent / 'abc3')
+
+
+def test_abcs_ambiguous(tmp_path):
+    shutil.copytree(commontest.ABC.path, tmp_path / 'abc1')
+    abcs = TexnoMagicAlphabets({'test': tmp_path, 'other': commontest.ABCS_PATH})
+    with pytest.raises(ex.AmbiguousAlphabet):
+        abcs.get_alphabet(commontest.ABC.name)
+    assert abcs.get_alphabet(f'test:{commontest.ABC.handle}').path == tmp_path / 'abc1'
+
+    # lookup map is kept consistent through reloads
+    shutil.rmtree(tmp_path / 'abc1')
+    abcs.reload_alphabet(tmp_path / 'abc1')
+    assert abcs.get_alphabet(commontest.ABC.name).path.parent == commontest.ABCS_PATH
+
+    abc = abcs.get_alphabet(commontest.ABC.name)
+    symbol = abc.symbols[0]
+    assert abc.get_symbol(symbol.meaning) is symbol
+    assert abc.get_symbol(symbol.name) is symbol
+    dup = TexnoMagicSymbol(meaning=symbol.meaning, name='DUP')
+    abc.symbols.append(dup)
+    abc._symbols_map = None
+    with pytest.raises(ex.AmbiguousSymbol):
+        abc.get_symbol(symbol.meaning)
+    assert abc.get_symbol('DUP') is dup
+
+
+def test_abc_train_memory_budget(tmp_path):
+    shutil.copytree(commontest.ABC.path, tmp_path / 'abc')
+    abc = TexnoMagicAlphabet(tmp_path / 'abc').load()
+    tracker = memory.set_memory_budget(64 * 1024)
+    try:
+        new, fail, _ = abc.train_models(all=True)
+        assert len(new) + len(fail) == len(abc.symbols)
+        # drawings are packed one symbol at a time and released afterwards
+        drawings = [d for s in abc.symbols for d in s.drawings]
+        assert not any(d._store is not None or d._points is not None for d in drawings)
+        abc.check()
+        assert not any(d._store is not None for d in drawings)
+        assert tracker.resident <= tracker.budget
+    finally:
+        memory.set_memory_budget(None)
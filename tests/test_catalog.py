@@ -0,0 +1,98 @@
+import json
+import shutil
+
+from texnomagic.abcs import get_alphabets
+from texnomagic.catalog import TexnoMagicCatalog, get_catalog
+from texnomagic import common
+
+import commontest  # common testing code
+
+
+def test_catalog(tmp_path):
+    root = tmp_path / 'alphabets'
+    abc_path = root / commontest.ABC.path.name
+    shutil.copytree(commontest.ABC.path, abc_path)
+    catalog_path = tmp_path / 'catalog.json'
+
+    catalog = TexnoMagicCatalog(root, path=catalog_path)
+    abcs = catalog.alphabets()
+    assert [a['info']['name'] for a in abcs] == [commontest.ABC.name]
+    symbols = catalog.symbols(abc_path)
+    assert len(symbols) == commontest.N_SYMBOLS
+    assert catalog.misses == 1 + commontest.N_SYMBOLS
+    assert catalog_path.exists()
+
+    # unchanged entries are reused from saved catalog
+    catalog = TexnoMagicCatalog(root, path=catalog_path)
+    catalog.alphabets()
+    catalog.symbols(abc_path)
+    assert catalog.misses == 0
+    assert catalog.hits == 1 + commontest.N_SYMBOLS
+
+    # changed entries are rescanned
+    symbol = sorted(s['name'] for s in symbols)[0]
+    drawings_path = abc_path / 'symbols' / symbol / 'drawings'
+    n_drawings = len(list(drawings_path.iterdir()))
+    shutil.copy(next(drawings_path.iterdir()), drawings_path / 'new.csv')
+    entry = {s['name']: s for s in catalog.symbols(abc_path)}[symbol]
+    assert entry['n_drawings'] == n_drawings + 1
+    assert catalog.misses == 1
+
+    # catalogs of other versions are rebuilt
+    data = json.loads(catalog_path.read_text())
+    data['version'] = 1
+    catalog_path.write_text(json.dumps(data))
+    catalog = TexnoMagicCatalog(root, path=catalog_path)
+    assert not catalog.load()
+    assert len(catalog.alphabets()) == 1
+    assert len(catalog.symbols(abc_path)) == commontest.N_SYMBOLS
+    assert catalog.misses == 1 + commontest.N_SYMBOLS
+
+    # info file written after alphabet dir was cataloged
+    new_abc_path = root / 'newabc'
+    new_abc_path.mkdir()
+    assert len(catalog.alphabets()) == 1
+    (new_abc_path / 'texno_alphabet.json').write_text(json.dumps({'name': 'NewAbc'}))
+    assert [a['name'] for a in catalog.alphabets()] == ['newabc', abc_path.name]
+
+    # alphabets are loaded from catalog
+    get_catalog(root, path=catalog_path)
+    abcs = {a.name: a for a in get_alphabets(root)}
+    assert set(abcs) == {commontest.ABC.name, 'NewAbc'}
+    abc = abcs[commontest.ABC.name]
+    s = abc.get_symbol(entry['info']['name'])
+    assert s._drawings is None
+    assert s.n_drawings == n_drawings + 1
+    assert len(s.drawings) == n_drawings + 1
+    assert abcs['NewAbc'].symbols == []
+
+
+def test_catalog_order(tmp_path):
+    root = tmp_path / 'alphabets'
+    abc_path = root / commontest.ABC.path.name
+    shutil.copytree(commontest.ABC.path, abc_path)
+    catalog = get_catalog(root, path=tmp_path / 'catalog.json')
+
+    # core symbols order by default
+    core = [s.meaning for s in commontest.ABC.symbols]
+    ranks = [common.CORE_SYMBOLS_RANK.get(m, len(common.CORE_SYMBOLS_RANK)) for m in core]
+    assert ranks == sorted(ranks)
+    catalog.alphabets()
+    assert [s['info']['meaning'] for s in catalog.symbols(abc_path)] == core
+
+    # custom order in alphabet info
+    order = core[::-1][:3]
+    info_path = abc_path / 'texno_alphabet.json'
+    info = json.loads(info_path.read_text())
+    info['order'] = order
+    info_path.write_text(json.dumps(info))
+    abc = get_alphabets(root)[0]
+    assert abc.order == order
+    meanings = [s.meaning for s in abc.symbols]
+    assert meanings[:3] == order
+    assert meanings[3:] == [m for m in core if m not in order]
+
+    # same order without catalog
+    abc.catalog = None
+    abc.load_symbols()
+    assert [s.meaning for s in abc.symbols] == meanings
@@ -0,0 +1,161 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from texnomagic import memory
+from texnomagic import render
+from texnomagic import store
+from texnomagic.drawing import TexnoMagicDrawing, check_preprocess, normalize_drawings
+from texnomagic import ex
+
+import commontest  # common testing code
+
+
+def line_drawing(n=1000):
+    t = np.linspace(0.0, 1000.0, n)
+    return TexnoMagicDrawing(curves=[np.column_stack((t, t)).tolist(), [[0.0, 1000.0]]])
+
+
+def test_drawing_resample():
+    d = line_drawing()
+    d.resample(100.0)
+    # single point curve is kept as is
+    assert [len(c) for c in d.curves] == [16, 1]
+    steps = np.linalg.norm(np.diff(d.curves[0], axis=0), axis=1)
+    assert np.allclose(steps, steps[0])
+    assert np.allclose(d.curves[0][[0, -1]], [[0, 0], [1000, 1000]])
+
+
+def test_drawing_simplify():
+    d = line_drawing()
+    d.simplify(1.0)
+    assert [len(c) for c in d.curves] == [2, 1]
+
+
+def test_drawing_preprocessed():
+    d = line_drawing()
+    p = d.preprocessed(resample=10.0, simplify=1.0)
+    assert len(p.points) == 3
+    # original drawing is untouched and result is cached
+    assert len(d.points) == 1001
+    assert d.preprocessed(resample=10.0, simplify=1.0) is p
+    d.clear_preprocessed()
+    assert d.preprocessed(resample=10.0, simplify=1.0) is not p
+
+
+def test_check_preprocess():
+    assert check_preprocess(None) == {}
+    assert check_preprocess({'resample': 10, 'simplify': 1.0}) == {'resample': 10, 'simplify': 1.0}
+    with pytest.raises(ex.InvalidInput):
+        check_preprocess({'resmaple': 10})
+    with pytest.raises(ex.InvalidInput):
+        check_preprocess({'simplify': 'much'})
+
+
+def test_drawing_normalize_batch():
+    rng = np.random.default_rng(42)
+    curves = [[rng.uniform(-50, 500, (n, 2)).tolist()] for n in (5, 1, 30, 2)]
+    drawings = [TexnoMagicDrawing(curves=c) for c in curves]
+    expected = [TexnoMagicDrawing(curves=c) for c in curves]
+    for d in expected:
+        d.normalize()
+
+    changed = normalize_drawings(drawings + [TexnoMagicDrawing(curves=[[]])])
+    assert changed == drawings
+    for d, e in zip(drawings, expected):
+        assert np.allclose(d.points, e.points)
+    # already normalized drawings are unchanged
+    assert normalize_drawings(drawings) == []
+
+
+def test_render_drawings():
+    drawings = [line_drawing(n=20), TexnoMagicDrawing(curves=[[[0, 0], [1000, 0], [500, 1000]]])]
+    images = render.render_drawings(drawings, res=64, antialias=1)
+    assert images.shape == (2, 64, 64)
+    assert images.dtype == np.uint8
+    # diagonal line with round caps and a separate dot
+    assert images[0, 32, 32] == 255
+    assert images[0, 4, 4] == 255
+    assert images[0, 60, 3] == 255
+    assert images[0, 4, 59] == 0
+    if render.PIL_AVAILABLE:
+        # same geometry as PIL renderer apart from edge pixels
+        for d, img in zip(drawings, images):
+            pil = np.asarray(render.render_drawing(d, res=64))
+            assert np.mean((pil > 127) != (img > 127)) < 0.05
+    # anti-aliasing only affects edges
+    aa = render.render_drawings(drawings, res=64)
+    assert np.mean(np.abs(aa.astype(int) - images)) < 20
+    assert len(np.unique(aa)) > 2
+    assert np.array_equal(render.render_drawings(drawings, res=64, jobs=2), aa)
+    with pytest.raises(ValueError):
+        render.render_drawings(drawings, res=64, jobs=0)
+
+
+def test_pack_drawings():
+    drawings = [line_drawing(n) for n in (10, 20, 30)] + [TexnoMagicDrawing(curves=[[]])]
+    points = [d.points.copy() for d in drawings]
+    curves = [[c.copy() for c in d.curves] for d in drawings]
+    drawings_store = store.pack_drawings(drawings)
+    assert len(drawings_store) == 4
+    assert len(drawings_store.points) == 10 + 20 + 30 + 3
+    for d, p, cc in zip(drawings, points, curves):
+        assert d._points is None
+        assert np.array_equal(d.points.reshape(-1, 2), p.reshape(-1, 2))
+        assert [len(c) for c in d.curves] == [len(c) for c in cc]
+    # consecutive drawings points are a single view into store
+    span = store.store_span(drawings[:3])
+    assert np.shares_memory(span, drawings_store.points)
+    assert len(span) == 10 + 20 + 30 + 3
+
+    # in-place changes are written into store
+    drawings[1].flip_y_axis()
+    assert np.array_equal(drawings_store.drawing_points(1)[:, 1], 1000.0 - points[1][:, 1])
+    normalize_drawings(drawings)
+    assert np.shares_memory(drawings[0].points, drawings_store.points)
+
+    # drawings survive pickling (used by parallel rendering)
+    d = pickle.loads(pickle.dumps(drawings[2]))
+    assert d._store is None
+    assert np.array_equal(d.points, drawings[2].points)
+
+    # setting curves detaches drawing from store
+    drawings[0].set_curves(curves[0])
+    assert not np.shares_memory(drawings[0].points, drawings_store.points)
+    assert store.store_span(drawings[:3]) is None
+
+
+def test_drawing_memory_budget():
+    paths = [d.path for s in commontest.ABC.symbols for d in s.drawings][:10]
+    drawings = [TexnoMagicDrawing(p) for p in paths]
+    points = [d.points.copy() for d in drawings]
+    nbytes = max(p.nbytes for p in points)
+    tracker = memory.set_memory_budget(3 * nbytes)
+    try:
+        for d in drawings:
+            d.load_curves()
+        assert tracker.resident <= 3 * nbytes
+        assert tracker.evictions >= len(drawings) - 3
+        # least recently used drawings are evicted
+        assert drawings[0]._points is None
+        assert drawings[-1]._points is not None
+        # and transparently reloaded
+        assert np.array_equal(drawings[0].points, points[0])
+        assert drawings[0]._points is not None
+
+        # modified drawings aren't evicted
+        drawings[0].flip_y_axis()
+        for d in drawings[1:]:
+            d.load_curves()
+        assert drawings[0]._points is not None
+        assert tracker.stats()['drawings'] <= 3
+
+        # garbage collected drawings are forgotten without taking the lock
+        # which may already be held by the collecting thread
+        n = len(tracker)
+        with tracker._lock:
+            del drawings[-2]
+        assert len(tracker) == n - 1
+    finally:
+        memory.set_memory_budget(None)
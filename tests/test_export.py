@@ -0,0 +1,53 @@
+import io
+import os
+import shutil
+import zipfile
+
+from texnomagic import export
+
+import commontest  # common testing code
+
+
+def read_zip(f):
+    with zipfile.ZipFile(f) as z:
+        assert z.testzip() is None
+        return {i.filename: z.read(i) for i in z.infolist()}
+
+
+def test_export_zip(tmp_path):
+    abc_path = tmp_path / commontest.ABC.path.name
+    shutil.copytree(commontest.ABC.path, abc_path)
+    (abc_path / 'image.png').write_bytes(b'\x89PNG' + os.urandom(64))
+    ref = shutil.make_archive(tmp_path / 'ref', 'zip', root_dir=tmp_path, base_dir=abc_path.name)
+
+    out = tmp_path / 'export' / 'abc.zip'
+    stats = export.export_zip(abc_path, out, jobs=2)
+    assert stats['reused'] == 0
+    assert stats['size'] == out.stat().st_size
+    assert read_zip(out) == read_zip(ref)
+    with zipfile.ZipFile(out) as z:
+        assert z.getinfo(f'{abc_path.name}/image.png').compress_type == zipfile.ZIP_STORED
+
+    # only changed files are recompressed
+    changed = next(abc_path.glob('symbols/*/drawings/*.csv'))
+    changed.write_text(changed.read_text() + '\n')
+    stats = export.export_zip(abc_path, out, jobs=2)
+    assert stats['reused'] == stats['files'] - 1
+    assert read_zip(out)[changed.relative_to(tmp_path).as_posix()] == changed.read_bytes()
+
+    # streaming into non-seekable output reusing previous export
+    class Stream(io.RawIOBase):
+        def __init__(self):
+            self.data = bytearray()
+
+        def writable(self):
+            return True
+
+        def write(self, b):
+            self.data += b
+            return len(b)
+
+    stream = Stream()
+    stats = export.export_zip(abc_path, stream, previous=out)
+    assert stats['reused'] == stats['files']
+    assert bytes(stream.data) == out.read_bytes()
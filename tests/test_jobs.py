@@ -0,0 +1,53 @@
+import threading
+import time
+
+from texnomagic.jobs import TexnoMagicJobs
+
+
+def test_jobs():
+    jobs = TexnoMagicJobs(workers=2, keep=2)
+    started = threading.Event()
+    go = threading.Event()
+    done = []
+
+    def slow(job, x):
+        job.update(progress=0.5, message='halfway')
+        started.set()
+        go.wait(5)
+        return x * 2
+
+    job = jobs.submit('slow', slow, 21, on_done=lambda j: done.append(j.id))
+    started.wait(5)
+    assert job.status == 'running'
+    assert job.as_dict()['progress'] == 0.5
+    assert job.message == 'halfway'
+    go.set()
+
+    def fail(job):
+        raise ValueError('nope')
+
+    failed = jobs.submit('fail', fail)
+    jobs.shutdown(wait=True)
+    assert job.status == 'done'
+    assert job.result == 42
+    assert job.progress == 1.0
+    assert done == [job.id]
+    assert failed.status == 'failed'
+    assert failed.error == 'nope'
+    assert jobs.get(job.id) is job
+    assert jobs.stats() == {'queued': 0, 'running': 0, 'done': 1, 'failed': 1}
+
+
+def test_jobs_forget():
+    jobs = TexnoMagicJobs(workers=1, keep=2)
+    submitted = [jobs.submit('job', lambda job: None) for _ in range(3)]
+    for _ in range(100):
+        if all(j.done for j in submitted):
+            break
+        time.sleep(0.01)
+    ids = [j.id for j in submitted]
+    jobs.submit('job', lambda job: None)
+    jobs.shutdown(wait=True)
+    # oldest finished jobs are forgotten
+    assert jobs.get(ids[0]) is None
+    assert jobs.get(ids[2]) is not None
@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+import pytest
+
+from texnomagic import common
+from texnomagic import ex
+from texnomagic import jsonio
+from texnomagic.model import TexnoMagicSymbolModelScore
+
+
+DATA = {
+    'array': np.arange(6, dtype=np.float64).reshape(3, 2),
+    'view': np.arange(12, dtype=np.float32).reshape(3, 4)[:, ::2],
+    'int': np.int64(7),
+    'score': TexnoMagicSymbolModelScore(0.5),
+    'list': [1, 'two', None],
+}
+
+EXPECTED = {
+    'array': [[0.0, 1.0], [2.0, 3.0], [4.0, 5.0]],
+    'view': [[0.0, 2.0], [4.0, 6.0], [8.0, 10.0]],
+    'int': 7,
+    'score': 0.5,
+    'list': [1, 'two', None],
+}
+
+
+@pytest.fixture(params=jsonio.available_backends())
+def backend(request):
+    old = jsonio.set_backend(request.param)
+    yield request.param
+    jsonio.set_backend(old)
+
+
+def test_jsonio_roundtrip(backend, tmp_path):
+    assert jsonio.loads(jsonio.dumpb(DATA)) == EXPECTED
+    assert jsonio.loads(jsonio.dumps(DATA)) == EXPECTED
+    pretty = jsonio.dumps(DATA, indent=True)
+    assert '\n  "array": [' in pretty
+    assert jsonio.loads(pretty) == EXPECTED
+
+    path = tmp_path / 'data.json'
+    jsonio.dump(DATA, path, indent=True)
+    assert jsonio.load(path) == EXPECTED
+
+
+def backends_dumpb(data, **kwargs):
+    outputs = []
+    for backend in jsonio.available_backends():
+        old = jsonio.set_backend(backend)
+        try:
+            outputs.append(jsonio.dumpb(data, **kwargs))
+        finally:
+            jsonio.set_backend(old)
+    return outputs
+
+
+def test_jsonio_backends_compatible():
+    # model files are the same regardless of backend
+    assert len(set(backends_dumpb(DATA, indent=True))) == 1
+    # including compact output and non-ASCII text
+    text = {'name': 'Žluťoučký kůň', 'score': 0.5}
+    outputs = backends_dumpb(text)
+    assert len(set(outputs)) == 1
+    assert outputs[0] == '{"name":"Žluťoučký kůň","score":0.5}'.encode('utf-8')
+
+    # float exponents differ but load the same
+    floats = [1e-05, 1e20, 1.5e-300]
+    for out in backends_dumpb(floats):
+        assert jsonio.loads(out) == floats
+
+
+def test_jsonio_indent(backend):
+    data = {'a': [1]}
+    assert jsonio.dumps(data, indent=4) == '{\n    "a": [\n        1\n    ]\n}'
+    assert common.pretty_dumps(data, format='json', indent=4) == jsonio.dumps(data, indent=4)
+    assert common.pretty_dumps(data, format='json') == jsonio.dumps(data, indent=True)
+
+
+def test_jsonio_invalid_backend():
+    with pytest.raises(ex.InvalidInput):
+        jsonio.set_backend('nope')
+
+
+def test_jsonio_numpy_encoder():
+    # compatibility encoder for standard json module
+    assert json.loads(json.dumps(DATA, cls=common.NumpyEncoder)) == EXPECTED
@@ -1,8 +1,14 @@
+import itertools
 from pathlib import Path
+import random
 
+from parsimonious.exceptions import ParseError
 import pytest
 
-from texnomagic.lang import TexnoMagicLanguage
+from texnomagic import common
+from texnomagic import lang
+from texnomagic.lang import TexnoMagicLanguage, parse_spells
+from texnomagic.spelltable import TexnoMagicSpellTable, get_spell_table
 
 
 BASE_PATH = Path(__file__).parents[2]
@@ -67,3 +73,152 @@ def test_shield(txm):
         }
     }
     assert spell == exp
+
+
+def test_cache():
+    txm = TexnoMagicLanguage(cache_size=2)
+    text = "big fire bolt"
+    spell = txm.parse(text)
+    # callers can't corrupt cached results
+    spell['effect'].append('ice')
+    spell['effect_mods']['size'] = 42
+    assert txm.parse(text) == txm.parse_uncached(text)
+    txm.parse("ice self")
+    txm.parse("fire self")
+    stats = txm.cache_stats()
+    assert stats['size'] == 2
+    assert stats['hits'] == 1
+    assert stats['misses'] == 3
+
+
+ELEMENTS = ['fire', 'ice', 'water', 'air', 'lightning', 'earth', 'life', 'death', 'magic']
+MODS = ['big', 'small', 'fast', 'slow', 'homing']
+SPELLS = ['bolt', 'ball', 'beam', 'cone', 'area', 'self', 'shield']
+ARGS = ['forward', 'enemy', 'friend', 'random', 'area', 'cone', 'self']
+SPELL_TOKENS = ELEMENTS + MODS + SPELLS + ARGS[:4] + ['firex', '']
+
+
+def parse_or_error(txm, text):
+    try:
+        return txm.parse(text)
+    except ParseError:
+        return 'ERROR'
+
+
+def random_spell(rng):
+    """
+    random (mostly) well-formed spell of arbitrary length
+    """
+    tokens = [rng.choice(MODS) for _ in range(rng.randint(0, 3))]
+    tokens += [rng.choice(ELEMENTS) for _ in range(rng.randint(1, 4))]
+    tokens += [rng.choice(MODS) for _ in range(rng.randint(0, 3))]
+    tokens.append(rng.choice(SPELLS))
+    if rng.random() < 0.6:
+        tokens.append(rng.choice(ARGS))
+    if rng.random() < 0.1:
+        tokens[rng.randrange(len(tokens))] = rng.choice(SPELL_TOKENS)
+    sep = rng.choice([' '] * 8 + ['  ', '\t'])
+    return sep.join(tokens)
+
+
+def test_parse_many():
+    texts = ['fire self', 'xx', 'ice shield'] * 3
+    txm = TexnoMagicLanguage()
+    r = list(txm.parse_many(texts))
+    assert [s['spell'] if s else None for s, _ in r] == ['self', None, 'shield'] * 3
+    assert [bool(e) for _, e in r] == [False, True, False] * 3
+    # multiprocessing keeps input order
+    assert list(parse_spells(texts, jobs=2, chunksize=2)) == r
+
+
+def test_parse_spells_streaming():
+    read = []
+
+    def texts():
+        # endless input
+        for text in itertools.cycle(['fire self', 'xx']):
+            read.append(text)
+            yield text
+
+    results = parse_spells(texts(), jobs=2, chunksize=4)
+    assert [s['spell'] if s else None for s, _ in itertools.islice(results, 6)] == ['self', None] * 3
+    # only a few chunks are read ahead
+    assert len(read) <= (2 * 2 + 1) * 4
+    results.close()
+
+    with pytest.raises(ValueError):
+        list(parse_spells(['fire self'], jobs=0))
+
+
+def test_spell_table(tmp_path):
+    table = TexnoMagicSpellTable(path=tmp_path / 'spell_table.json.gz')
+    table.build(max_tokens=3)
+    assert 'fire self' in table
+    assert 'big fire bolt' in table
+    assert 'big fire bolt forward' not in table
+    # table matches the reference parser
+    txm = TexnoMagicLanguage(cache_size=0)
+    for text in table.spells:
+        assert table.get(text) == txm.parse(text)
+
+    table.save()
+    loaded = TexnoMagicSpellTable(path=table.path)
+    assert loaded.load()
+    # tables aren't built on demand
+    assert get_spell_table(path=table.path, max_tokens=4) is None
+    assert get_spell_table(path=tmp_path / 'nope.json.gz') is None
+    assert loaded.max_tokens == 3
+    assert loaded.spells == table.spells
+    assert loaded.get('nope') is None
+
+    txm = TexnoMagicLanguage(table=loaded)
+    spell = txm.parse('fire self')
+    assert spell == {'spell': 'self', 'effect': ['fire'], 'effect_mods': []}
+    # returned spells are copies
+    spell['effect'].append('ice')
+    assert txm.parse('fire self')['effect'] == ['fire']
+    # fallback to parser
+    assert txm.parse('big fast fire bolt forward')['spell'] == 'bolt'
+    stats = txm.cache_stats()
+    assert stats['table_hits'] == 2
+    assert stats['misses'] == 1
+
+
+def test_fast_parser_equivalence():
+    """
+    differential test of fast parser against reference PEG parser
+    """
+    peg = TexnoMagicLanguage(cache_size=0, parser='peg')
+    fast = TexnoMagicLanguage(cache_size=0, parser='fast')
+    # all short token sequences
+    texts = []
+    for n in range(1, 4):
+        texts += [' '.join(t) for t in itertools.product(SPELL_TOKENS, repeat=n)]
+    # random longer spells
+    rng = random.Random(42)
+    texts += [random_spell(rng) for _ in range(5000)]
+    n_valid = 0
+    for text in texts:
+        exp = parse_or_error(peg, text)
+        assert parse_or_error(fast, text) == exp, text
+        n_valid += exp != 'ERROR'
+    assert n_valid > 2000
+
+
+def test_grammar_cache_trusted(tmp_path, monkeypatch):
+    monkeypatch.setattr(common, 'CACHE_PATH', tmp_path)
+    lang.load_grammar()
+    path = lang.grammar_cache_path()
+    assert path.exists()
+    assert lang.load_grammar()
+
+    # cache writable by others is never unpickled
+    loads = []
+    monkeypatch.setattr(lang.pickle, 'load', lambda f: loads.append(f))
+    path.chmod(0o666)
+    assert lang.load_grammar()
+    assert loads == []
+    # and it's replaced by a trusted one
+    assert path.stat().st_mode & 0o077 == 0
+    lang.load_grammar()
+    assert len(loads) == 1
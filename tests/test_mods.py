@@ -0,0 +1,200 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import io
+import json
+import shutil
+import threading
+from urllib.parse import urlparse, parse_qs
+import zipfile
+
+import pytest
+
+from texnomagic import mods
+
+
+N_MODS = 5
+
+
+def mod_zip(name, version):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w') as zipf:
+        zipf.writestr(f'{name}/texno_alphabet.json', json.dumps({'name': name, 'version': version}))
+    return out.getvalue()
+
+
+class ModIOHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for mod.io API serving mods list and mod files."""
+    version = 1
+    online = True
+    # requested mod files
+    downloads = []
+
+    def do_GET(self):
+        if not self.online:
+            # simulate unreachable server
+            self.close_connection = True
+            self.connection.close()
+            return
+        url = urlparse(self.path)
+        if url.path == '/mods':
+            q = parse_qs(url.query)
+            offset, limit = int(q['_offset'][0]), int(q['_limit'][0])
+            data = [self.mod_data(i) for i in range(N_MODS)][offset:offset + limit]
+            body = json.dumps({
+                'data': data,
+                'result_count': len(data),
+                'result_offset': offset,
+                'result_limit': limit,
+                'result_total': N_MODS,
+            }).encode('utf-8')
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        elif url.path.startswith('/files/'):
+            name = url.path[len('/files/'):-len('.zip')]
+            self.downloads.append(name)
+            if name == 'mod3':
+                # broken mod file
+                body = b'nope'
+            else:
+                body = mod_zip(name, self.version)
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def mod_data(self, i):
+        host, port = self.server.server_address
+        # only mod0 changes with version
+        version = self.version if i == 0 else 1
+        return {
+            'name': f'Mod {i}',
+            'name_id': f'mod{i}',
+            'modfile': {
+                'id': 100 * i + version,
+                'filehash': {'md5': hashlib.md5(mod_zip(f'mod{i}', version)).hexdigest()},
+                'filename': f'mod{i}.zip',
+                'download': {'binary_url': f'http://{host}:{port}/files/mod{i}.zip'},
+            },
+        }
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def modio():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ModIOHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f'http://{host}:{port}/mods'
+    server.shutdown()
+
+
+@pytest.fixture
+def index(tmp_path):
+    return mods.TexnoMagicModIndex(tmp_path / mods.MODS_INDEX_FILE)
+
+
+def test_mods_pagination(modio, index):
+    data = mods.get_online_mods_data(url=modio, page_size=2, index=index)
+    assert [m['name_id'] for m in data['data']] == [f'mod{i}' for i in range(N_MODS)]
+    assert len(index.pages) == 3
+
+
+def test_mods_index(modio, index):
+    data = index.fetch(url=modio, page_size=2)
+    assert index.n_not_modified == 0
+    # unchanged pages aren't transferred again
+    loaded = mods.TexnoMagicModIndex(index.path)
+    loaded.load()
+    assert loaded.fetch(url=modio, page_size=2) == data
+    assert loaded.n_not_modified == 3
+    # cached data are used when offline
+    ModIOHandler.online = False
+    try:
+        assert loaded.fetch(url=modio, page_size=2) == data
+        assert loaded.offline
+    finally:
+        ModIOHandler.online = True
+
+
+def test_mods_download(modio, tmp_path, index):
+    path = tmp_path / 'mods'
+    all_mods = mods.get_online_mods(url=modio, index=index)
+    results = dict(mods.download_mods(all_mods, path=path, jobs=3))
+    assert len(results) == N_MODS
+    failed = [m.name_id for m, e in results.items() if e]
+    assert failed == ['mod3']
+    names = sorted(p.name for p in path.iterdir())
+    # no leftover temporary files
+    assert names == ['mod0', 'mod1', 'mod2', 'mod4']
+
+    # existing mods are replaced
+    all_mods[1].download(path=path)
+    assert len(list(path.iterdir())) == 4
+
+    with pytest.raises(ValueError):
+        list(mods.download_mods(all_mods, path=path, jobs=0))
+
+
+def test_mods_sync(modio, tmp_path, index):
+    path = tmp_path / 'mods'
+    all_mods = [m for m in mods.get_online_mods(url=modio, index=index) if m.name_id != 'mod3']
+    results, unchanged = mods.sync_mods(all_mods, path=path, index=index)
+    assert len(results) == 4 and not unchanged
+    assert set(index.installed) == {'mod0', 'mod1', 'mod2', 'mod4'}
+
+    # only changed mods are downloaded
+    ModIOHandler.version = 2
+    ModIOHandler.downloads.clear()
+    try:
+        all_mods = [m for m in mods.get_online_mods(url=modio, index=index) if m.name_id != 'mod3']
+        results, unchanged = mods.sync_mods(all_mods, path=path, index=index)
+    finally:
+        ModIOHandler.version = 1
+    assert [m.name_id for m, e in results if not e] == ['mod0']
+    assert len(unchanged) == 3
+    assert ModIOHandler.downloads == ['mod0']
+    info = json.loads((path / 'mod0' / 'texno_alphabet.json').read_text())
+    assert info['version'] == 2
+
+    # removed mods are downloaded again
+    shutil.rmtree(path / 'mod1')
+    ModIOHandler.downloads.clear()
+    results, unchanged = mods.sync_mods(all_mods, path=path, index=index)
+    assert ModIOHandler.downloads == ['mod1']
+
+    # mods without known file hash aren't downloaded again
+    for mod in all_mods:
+        mod.md5 = None
+    results, unchanged = mods.sync_mods(all_mods, path=path, index=index)
+    assert not results and len(unchanged) == 4
+
+
+def test_mods_index_concurrent(modio, tmp_path, index):
+    all_mods = mods.get_online_mods(url=modio, index=index)
+    for mod in all_mods:
+        mod.paths = [tmp_path / mod.name_id]
+    threads = [threading.Thread(target=index.record_install, args=(m, m.md5)) for m in all_mods]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # no installed record is lost
+    loaded = mods.TexnoMagicModIndex(index.path)
+    loaded.load()
+    assert set(loaded.installed) == {m.name_id for m in all_mods}
@@ -1,10 +1,16 @@
+import base64
+import json
 import multiprocessing
 from time import sleep
 
 import pytest
 
+from texnomagic import __version__
 from texnomagic.client import TexnoMagicClient
+from texnomagic import common
+from texnomagic.limits import TexnoMagicLimits
 from texnomagic.server import serve
+from texnomagic.stream import STREAMS_MAX
 from texnomagic.jsonrpcserver import JSONRPCSERVER_AVAILABLE
 
 import commontest  # common testing code
@@ -18,7 +24,11 @@ if not JSONRPCSERVER_AVAILABLE:
 def start_server():
     p = multiprocessing.Process(
         target=serve,
-        kwargs={'abcs': commontest.ABCS})
+        kwargs={
+            'abcs': commontest.ABCS,
+            'memory_budget': 16 * 1024 * 1024,
+            'limits': TexnoMagicLimits(max_frame=64 * 1024, read_timeout=0.5, max_batch=4),
+        })
     p.start()
     # give the server some time to start
     sleep(0.2)
@@ -75,3 +85,183 @@ def test_req_recognize(client):
     result = reply['result']
     assert 'symbol' in result
     assert 'score' in result
+
+
+def test_req_stream(client):
+    reply = client.request('stream_open', {'abc': commontest.ABC.name, 'n': 3})
+    assert 'error' not in reply
+    stream = reply['result']
+
+    symbol = commontest.ABC.symbols[0]
+    curve = symbol.drawings[0].curves[0].tolist()
+    half = len(curve) // 2
+    reply = client.request('stream_add', {'stream': stream, 'points': curve[:half]})
+    assert 'error' not in reply
+    reply = client.request('stream_add', {'stream': stream, 'points': curve[half:]})
+    assert 'error' not in reply
+    assert len(reply['result']) <= 3
+
+    reply = client.request('stream_close', {'stream': stream})
+    assert 'error' not in reply
+    assert len(reply['result']) <= 3
+
+    reply = client.request('stream_add', {'stream': stream, 'points': curve})
+    assert 'error' in reply
+
+    # streams in use aren't dropped to open new ones
+    streams = []
+    for _ in range(STREAMS_MAX + 1):
+        reply = client.request('stream_open', {'abc': commontest.ABC.name})
+        if 'error' in reply:
+            break
+        streams.append(reply['result'])
+    assert len(streams) == STREAMS_MAX
+    assert len(set(streams)) == STREAMS_MAX
+    for stream in streams:
+        reply = client.request('stream_close', {'stream': stream})
+        assert 'error' not in reply
+
+
+def test_req_stats(client):
+    client.request('spell', ['fire self'])
+    client.request('spell', ['fire self'])
+    reply = client.request('stats')
+    assert 'error' not in reply
+    assert reply['result']['spell_cache']['hits'] >= 1
+    assert reply['result']['memory']['drawings']['budget'] == 16 * 1024 * 1024
+
+
+def test_req_spell_batch(client):
+    reply = client.request('spell_batch', [['fire self', 'xx', 'big ice bolt']])
+    assert 'error' not in reply
+    r = reply['result']
+    assert len(r) == 3
+    assert r[0]['result']['spell'] == 'self'
+    assert 'error' in r[1]
+    assert r[2]['result']['effect_mods'] == {'size': 2}
+
+    for texts in ['fire self', [1, 2], ['fire self'] * 5]:
+        reply = client.request('spell_batch', [texts])
+        assert reply['error']['code'] == -32602
+
+
+def test_req_thumbnail(client):
+    symbol = commontest.ABC.symbols[0]
+    params = {'abc': commontest.ABC.name, 'symbol': symbol.name, 'res': 32, 'format': 'raw'}
+    reply = client.request('thumbnail', dict(params, drawing=symbol.drawings[0].name))
+    assert 'error' not in reply
+    data = base64.b64decode(reply['result']['data'])
+    assert len(data) == 32 * 32
+    assert max(data) == 255
+
+    reply = client.request('thumbnail', params)
+    assert 'error' not in reply
+    assert len(base64.b64decode(reply['result']['data'])) == 32 * 32
+
+    reply = client.request('thumbnail', dict(params, drawing='nope.csv'))
+    assert 'error' in reply
+
+    for res in [0, -1, 100000]:
+        reply = client.request('thumbnail', dict(params, res=res))
+        assert 'error' in reply
+
+
+def test_req_model_preview(client):
+    symbol = commontest.ABC.symbols[0]
+    params = {'abc': commontest.ABC.name, 'symbol': symbol.name,
+              'image': True, 'res': 32, 'format': 'raw'}
+    reply = client.request('model_preview', params)
+    assert 'error' not in reply
+    result = reply['result']
+    assert result['type'] == 'gmm'
+    assert len(base64.b64decode(result['image']['data'])) == 32 * 32
+
+    for invalid in [{'res': 0}, {'res': 100000}, {'format': 'gif'}]:
+        reply = client.request('model_preview', dict(params, **invalid))
+        assert 'error' in reply
+
+
+def test_req_jobs(client):
+    reply = client.request('export_abc', {'abc': commontest.ABC.name})
+    assert 'error' not in reply
+    job = reply['result']['job']
+    for _ in range(100):
+        reply = client.request('job_status', {'job': job})
+        assert 'error' not in reply
+        if reply['result']['status'] in ('done', 'failed'):
+            break
+        sleep(0.05)
+    assert reply['result']['status'] == 'done'
+    reply = client.request('job_result', {'job': job})
+    assert reply['result'].endswith('.zip')
+
+    reply = client.request('job_status', {'job': 12345})
+    assert 'error' in reply
+
+
+def test_req_limits(client):
+    # batch too large
+    batch = [{'jsonrpc': '2.0', 'method': 'version', 'id': i} for i in range(5)]
+    body = json.dumps(batch).encode('utf-8')
+    client.sock.sendall(common.int2bytes(len(body)) + body)
+    reply = json.loads(client.recv(common.bytes2int(client.recv(4))))
+    assert reply['error']['code'] == -32600
+    # batch within limits
+    body = json.dumps(batch[:4]).encode('utf-8')
+    client.sock.sendall(common.int2bytes(len(body)) + body)
+    reply = json.loads(client.recv(common.bytes2int(client.recv(4))))
+    assert len(reply) == 4
+
+    # request too large
+    c = TexnoMagicClient()
+    c.connect()
+    c.sock.sendall(common.int2bytes(1024 * 1024))
+    reply = json.loads(c.recv(common.bytes2int(c.recv(4))))
+    assert reply['error']['code'] == -32600
+    assert reply['error']['data']['max'] == 64 * 1024
+    assert c.sock.recv(1) == b''
+    c.close()
+
+    # request split into many packets
+    c = TexnoMagicClient()
+    c.connect()
+    body = json.dumps({'jsonrpc': '2.0', 'method': 'version', 'id': 1}).encode('utf-8')
+    c.sock.sendall(common.int2bytes(len(body)))
+    for i in range(0, len(body), 7):
+        c.sock.sendall(body[i:i + 7])
+        sleep(0.01)
+    reply = json.loads(c.recv(common.bytes2int(c.recv(4))))
+    assert reply['result'] == __version__
+    c.close()
+
+    # slow request
+    c = TexnoMagicClient()
+    c.connect()
+    c.sock.sendall(common.int2bytes(100) + b'{"jsonrpc"')
+    c.sock.settimeout(5)
+    assert c.sock.recv(1) == b''
+    c.close()
+
+    reply = client.request('stats')
+    rejected = reply['result']['limits']['rejected']
+    assert rejected['batch'] >= 1
+    assert rejected['frame'] >= 1
+    assert rejected['timeout'] >= 1
+
+
+def test_limits_concurrency():
+    limits = TexnoMagicLimits(concurrency=1, queue_timeout=0.01, max_connections=1)
+    assert limits.connect()
+    assert not limits.connect()
+    assert limits.acquire()
+    assert not limits.acquire()
+    limits.release()
+    assert limits.acquire()
+    limits.release()
+    limits.disconnect()
+    assert limits.stats() == {
+        'connections': 0,
+        'active': 0,
+        'queued': 0,
+        'rejected': {'frame': 0, 'batch': 0, 'busy': 1, 'connections': 1, 'timeout': 0},
+    }
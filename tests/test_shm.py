@@ -0,0 +1,61 @@
+import multiprocessing
+import shutil
+import uuid
+
+import numpy as np
+
+from texnomagic.abcs import TexnoMagicAlphabets
+from texnomagic.shm import TexnoMagicModelStore
+
+import commontest  # common testing code
+
+
+def worker_scores(name, path, q):
+    abcs = TexnoMagicAlphabets({'test': path})
+    store = TexnoMagicModelStore(name)
+    store.refresh()
+    n = store.apply(abcs)
+    abc = abcs.abcs['test'][0]
+    drawing = abc.symbols[0].drawings[0]
+    q.put((store.generation, n, [float(s.model.score(drawing)) for s in abc.symbols]))
+    store.close()
+
+
+def test_shm_model_store(tmp_path):
+    shutil.copytree(commontest.ABC.path, tmp_path / 'abc')
+    abcs = TexnoMagicAlphabets({'test': tmp_path})
+    abc = abcs.abcs['test'][0]
+    abc.train_models()
+    drawing = abc.symbols[0].drawings[0]
+    scores = [float(s.model.score(drawing)) for s in abc.symbols]
+
+    name = f'texnomagic-test-{uuid.uuid4().hex[:8]}'
+    store = TexnoMagicModelStore(name)
+    try:
+        assert store.publish(abcs) == 1
+        assert store.stats()['models'] == len(abc.symbols)
+
+        # models are attached read-only in another process
+        q = multiprocessing.Queue()
+        p = multiprocessing.Process(target=worker_scores, args=(name, tmp_path, q))
+        p.start()
+        generation, n, worker_scores_ = q.get(timeout=30)
+        p.join()
+        assert generation == 1
+        assert n == len(abc.symbols)
+        assert np.allclose(worker_scores_, scores)
+
+        reader = TexnoMagicModelStore(name)
+        assert reader.refresh()
+        assert not reader.refresh()
+        model = reader.get_model(abc.path, abc.symbols[0].meaning)
+        assert not model.gmm.means_.flags.writeable
+        assert np.isclose(model.score(drawing), scores[0])
+
+        # new generation is swapped in
+        assert store.publish(abcs) == 2
+        assert reader.refresh()
+        assert reader.generation == 2
+        reader.close()
+    finally:
+        store.unlink()
@@ -0,0 +1,69 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from texnomagic.abc import TexnoMagicAlphabet
+from texnomagic.model import gmm_weighted_log_prob
+from texnomagic.stream import TexnoMagicRecognitionStream
+
+import commontest  # common testing code
+
+
+@pytest.fixture(scope="module")
+def abc(tmp_path_factory):
+    path = tmp_path_factory.mktemp('stream') / commontest.ABC.path.name
+    shutil.copytree(commontest.ABC.path, path)
+    abc = TexnoMagicAlphabet(path).load()
+    for symbol in abc.symbols:
+        symbol.train_model()
+    return abc
+
+
+def exact_scores(abc, stream):
+    return [(s.name, score) for s, score in abc.scores(stream.drawing()) if score > 0]
+
+
+def assert_scores_equal(scores, expected):
+    assert [name for name, _ in scores] == [name for name, _ in expected]
+    assert np.allclose([score for _, score in scores], [score for _, score in expected])
+
+
+def test_model_point_stats(abc):
+    # scoring statistics computed from GMM parameters match scikit-learn
+    model = abc.symbols[0].model
+    points = abc.symbols[1].drawings[0].points
+    wlp = gmm_weighted_log_prob(model.gmm, points)
+    assert np.allclose(np.logaddexp.reduce(wlp, axis=1), model.gmm.score_samples(points))
+    ll_sum, counts = model.point_stats(points)
+    assert np.isclose(ll_sum, model.gmm.score_samples(points).sum())
+    assert np.array_equal(counts, np.bincount(model.gmm.predict(points), minlength=model.n_gauss))
+
+
+def test_stream_exact(abc):
+    n = len(abc.symbols)
+    for symbol in abc.symbols[:3]:
+        curves = [c.tolist() for c in symbol.drawings[0].curves]
+        # rescore on any normalization change: provisional results are exact
+        stream = TexnoMagicRecognitionStream(abc, n=n, tolerance=0.0)
+        for curve in curves:
+            for i in range(0, len(curve), 7):
+                stream.add_points(curve[i:i + 7], new_curve=i == 0)
+                top = [(s.name, score) for s, score in stream.top()]
+                assert_scores_equal(top, exact_scores(abc, stream))
+        final = [(s.name, score) for s, score in stream.finish()]
+        assert_scores_equal(final, exact_scores(abc, stream))
+
+
+def test_stream_tolerance(abc):
+    n = len(abc.symbols)
+    symbol = abc.symbols[0]
+    stream = TexnoMagicRecognitionStream(abc, n=n)
+    for curve in symbol.drawings[0].curves:
+        stream.add_curve(curve.tolist())
+    # provisional results are close to exact ones, final results are exact
+    top = stream.top()
+    exact = exact_scores(abc, stream)
+    assert top[0][0].name == exact[0][0]
+    assert np.allclose([s for _, s in top], [s for _, s in exact], rtol=0.05)
+    assert_scores_equal([(s.name, score) for s, score in stream.finish()], exact)
@@ -5,6 +5,7 @@ import pytest
 from texnomagic.abc import TexnoMagicAlphabet
 from texnomagic.model import TexnoMagicSymbolModel
 from texnomagic import common
+from texnomagic import render
 
 import commontest  # common testing code
 
@@ -59,3 +60,29 @@ def test_symbol_model_recognize(abc):
             n_fail += 1
 
     assert n_fail < 10, f"too many recognition fails: {n_fail}"
+
+
+def test_symbol_shortlist(abc):
+    d = abc.symbols[0].random_drawing()
+    candidates = abc.shortlist(d, 2)
+    assert len(candidates) == min(2, commontest.N_SYMBOLS)
+    # shortlisting all symbols is equivalent to exhaustive scoring
+    assert abc.shortlist_recall(commontest.N_SYMBOLS) == 1.0
+    scores = abc.scores(d, shortlist=commontest.N_SYMBOLS)
+    assert scores == abc.scores(d)
+
+
+def test_symbol_model_preview(abc):
+    symbol = abc.symbols[0]
+    preview = symbol.model.get_preview()
+    assert len(preview['components']) == symbol.model.n_gauss
+    # preview is saved with model
+    model = TexnoMagicSymbolModel(path=symbol.model.path)
+    model.load()
+    assert model._preview == preview
+    assert model.compute_preview() == preview
+    assert len(model.preview_drawing(n=16).curves) == model.n_gauss
+
+    images = render.render_symbol_previews(abc.symbols[:2], res=64)
+    assert images.shape == (2, 64, 64)
+    assert images.max() == 255
@@ -0,0 +1,61 @@
+import numpy as np
+
+from texnomagic import render
+from texnomagic.drawing import TexnoMagicDrawing
+from texnomagic.thumbs import TexnoMagicThumbnailCache, encode_thumb
+
+
+def drawings(n=3):
+    return [TexnoMagicDrawing(curves=[[[0, 0], [1000, 1000 * i / n], [0, 1000]]])
+            for i in range(n)]
+
+
+def test_thumbs_cache(tmp_path):
+    cache = TexnoMagicThumbnailCache(path=tmp_path)
+    ds = drawings()
+    thumbs = cache.get(ds, res=32)
+    assert thumbs.shape == (3, 32, 32)
+    assert np.array_equal(thumbs, render.render_drawings(ds, res=32))
+    assert cache.misses == 3
+    # same content with different path is a hit
+    copy = TexnoMagicDrawing(curves=[c.tolist() for c in ds[0].curves])
+    assert np.array_equal(cache.get_one(copy, res=32), thumbs[0])
+    assert cache.hits == 1
+    # different resolution or line width is a miss
+    cache.get_one(copy, res=16)
+    cache.get_one(copy, res=32, line_width=5)
+    assert cache.misses == 5
+    assert cache.size == 3 * 32 * 32 + 16 * 16 + 32 * 32
+
+    # replaced thumbnails aren't counted twice
+    key = cache.key(copy, res=16)
+    cache._write(key, np.zeros((16, 16), dtype=np.uint8))
+    cache._write(key, np.zeros((16, 16), dtype=np.uint8))
+    assert cache.size == 3 * 32 * 32 + 16 * 16 + 32 * 32
+
+
+def test_thumbs_evict(tmp_path):
+    cache = TexnoMagicThumbnailCache(path=tmp_path, max_size=2 * 32 * 32)
+    evict = cache.evict
+    sizes = []
+
+    def evict_spy():
+        sizes.append(cache.size)
+        return evict()
+
+    cache.evict = evict_spy
+    cache.get(drawings(5), res=32)
+    assert cache.size <= cache.max_size
+    # evicted during the batch, never far over max size
+    assert len(sizes) >= 2
+    assert max(sizes) <= cache.max_size + 32 * 32
+    assert len(list(tmp_path.glob('*/*.raw'))) == 1
+    cache.clear()
+    assert cache.size == 0
+
+
+def test_thumbs_encode():
+    data = np.arange(64, dtype=np.uint8).reshape(8, 8)
+    assert encode_thumb(data, format='raw') == data.tobytes()
+    if render.PIL_AVAILABLE:
+        assert encode_thumb(data, format='png').startswith(b'\x89PNG')
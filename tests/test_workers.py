@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import shutil
+import signal
+from time import sleep
+
+import pytest
+
+from texnomagic.abcs import TexnoMagicAlphabets
+from texnomagic.client import TexnoMagicClient
+from texnomagic.server import serve
+from texnomagic.jsonrpcserver import JSONRPCSERVER_AVAILABLE
+
+import commontest  # common testing code
+
+
+if not JSONRPCSERVER_AVAILABLE:
+    pytest.skip("jsonrpcserver module not available", allow_module_level=True)
+if not hasattr(os, 'fork'):
+    pytest.skip("server workers require os.fork()", allow_module_level=True)
+
+
+PORT = 6970
+TRAIN_PORT = 6971
+
+
+@pytest.fixture(scope="module")
+def server():
+    p = multiprocessing.Process(
+        target=serve,
+        kwargs={'abcs': commontest.ABCS, 'port': PORT, 'workers': 2})
+    p.start()
+    # give the server some time to start
+    sleep(0.5)
+    yield p
+    p.terminate()
+    p.join()
+
+
+@pytest.fixture(scope="module")
+def train_server(tmp_path_factory):
+    # models are trained into a copy of test alphabet
+    path = tmp_path_factory.mktemp('workers')
+    shutil.copytree(commontest.ABC.path, path / commontest.ABC.path.name)
+    abcs = TexnoMagicAlphabets({'test': path})
+    abcs.load()
+    p = multiprocessing.Process(
+        target=serve,
+        kwargs={'abcs': abcs, 'port': TRAIN_PORT, 'workers': 2})
+    p.start()
+    sleep(0.5)
+    yield p
+    p.terminate()
+    p.join()
+
+
+def connect(port=PORT):
+    c = TexnoMagicClient(port=port)
+    c.connect()
+    return c
+
+
+def worker_stats(client):
+    reply = client.request('stats')
+    assert 'error' not in reply
+    return reply['result']['worker']
+
+
+def models_generation(client):
+    reply = client.request('stats')
+    assert 'error' not in reply
+    return reply['result']['models']['generation']
+
+
+def connect_worker(exclude, n=32, port=PORT):
+    """Connect to a worker other than excluded pids."""
+    for _ in range(n):
+        c = connect(port=port)
+        w = worker_stats(c)
+        if w['pid'] not in exclude:
+            return c, w
+        c.close()
+    raise AssertionError("failed to connect to another worker")
+
+
+def test_workers(server):
+    c1, w1 = connect_worker([])
+    c2, w2 = connect_worker([w1['pid']])
+    assert w1['reloads'] == w2['reloads'] == 0
+    assert models_generation(c1) == models_generation(c2) == 1
+
+    # reload is propagated to other workers
+    reply = c1.request('reload')
+    assert reply['result'] is True
+    assert worker_stats(c1)['reloads'] == 1
+    assert worker_stats(c2)['reloads'] == 1
+    # and models are published again by supervisor
+    sleep(0.5)
+    assert models_generation(c1) == models_generation(c2) == 2
+
+    # crashed worker is restarted with current alphabets
+    os.kill(w1['pid'], signal.SIGKILL)
+    c1.close()
+    sleep(1.5)
+    c3, w3 = connect_worker([w1['pid'], w2['pid']])
+    assert w3['reloads'] == 1
+    reply = c3.request('recognize', {
+        'abc': commontest.ABC.name,
+        'curves': [[[1, 1], [10, 10], [100, 100]]],
+    })
+    assert 'error' not in reply
+    c2.close()
+    c3.close()
+
+
+def test_workers_train(train_server):
+    c1, w1 = connect_worker([], port=TRAIN_PORT)
+    c2, w2 = connect_worker([w1['pid']], port=TRAIN_PORT)
+    params = {'abc': commontest.ABC.name, 'symbol': commontest.ABC.symbols[0].name}
+    # no model yet
+    assert c2.request('model_preview', params)['result']['components'] == []
+
+    reply = c1.request('train_symbol', params)
+    assert reply['result'] is True
+    # retrained model is used by other workers
+    sleep(0.5)
+    reply = c2.request('model_preview', params)
+    assert reply['result']['components']
+    reply = c2.request('stats')
+    assert reply['result']['models']['generation'] == 2
+    assert reply['result']['models']['models'] == 1
+    c1.close()
+    c2.close()
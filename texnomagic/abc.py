@@ -2,11 +2,17 @@ import json
 import os
 from pathlib import Path, PurePosixPath
 import random
-import shutil
+
+import numpy as np
 
 from texnomagic import common
+from texnomagic import descriptor
+from texnomagic import ex
+from texnomagic import export
+from texnomagic import store
 from texnomagic.symbol import TexnoMagicSymbol
-from texnomagic.drawing import TexnoMagicDrawing
+from texnomagic.drawing import TexnoMagicDrawing, check_preprocess, normalize_drawings, save_drawings
+from texnomagic.index import INDEX_FILE, TexnoMagicDrawingIndex, drawings_stamp
 
 
 INFO_FILE = 'texno_alphabet.json'
@@ -21,18 +27,30 @@ class TexnoMagicAlphabet:
     * `name`: arbitrary string
     * `path`: path to Alphabet dir
     * `symbols`: a set of Symbols
+    * `preprocess`: drawings preprocessing params used by Symbol models,
+      see [texnomagic.drawing.TexnoMagicDrawing.preprocessed][]
+    * `order`: optional custom order of Symbols (a list of meanings),
+      see [sort_symbols][texnomagic.abc.TexnoMagicAlphabet.sort_symbols]
+
+    Symbols are listed using alphabets `catalog` when available,
+    see [texnomagic.catalog.TexnoMagicCatalog][].
 
     This class provides convenient utilities for working with TexnoMagic Alphabets,
     see individual methods.
     """
-    def __init__(self, path=None, name=None):
+    def __init__(self, path=None, name=None, catalog=None):
         if path and path.name.lower() == INFO_FILE:
             # accept path to alphabet info file as well
             path = path.parent
 
         self.path = path
         self.name = name
+        self.catalog = catalog
+        self.preprocess = {}
+        self.order = []
         self._symbols = None
+        self._symbols_map = None
+        self._index = None
 
     @property
     def info_path(self) -> Path:
@@ -44,6 +62,11 @@ class TexnoMagicAlphabet:
         """Path to Alphabet `symbols` dir."""
         return self.path / 'symbols'
 
+    @property
+    def index_path(self) -> Path:
+        f"""Path to Alphabet `{INDEX_FILE}` drawings index file."""
+        return self.path / INDEX_FILE
+
     @property
     def handle(self) -> str:
         """Alphabet handle (lowercase string)."""
@@ -58,6 +81,35 @@ class TexnoMagicAlphabet:
             self.load_symbols()
         return self._symbols
 
+    @property
+    def symbols_map(self) -> dict[str, list[TexnoMagicSymbol]]:
+        """Symbols lookup map by name and meaning.
+
+        Built on-demand."""
+        if self._symbols_map is None:
+            self._symbols_map = common.lookup_map(self.symbols, lambda s: (s.name, s.meaning))
+        return self._symbols_map
+
+    @property
+    def index(self) -> TexnoMagicDrawingIndex:
+        """Alphabet drawings index for fast k-NN queries.
+
+        Lazy loaded on-demand from `index_path` or built in memory when missing
+        or out of date, see [build_index][texnomagic.abc.TexnoMagicAlphabet.build_index]."""
+        if self._index is None:
+            index = TexnoMagicDrawingIndex(self.index_path)
+            if not index.load(stamp=drawings_stamp(self)):
+                index.build(self)
+            self._index = index
+        return self._index
+
+    def build_index(self, save : bool = True) -> TexnoMagicDrawingIndex:
+        """(Re-)build Alphabet drawings index and optionally save it."""
+        self._index = TexnoMagicDrawingIndex(self.index_path).build(self)
+        if save:
+            self._index.save()
+        return self._index
+
     def load(self, path=None):
         f"""Load Alphabet metadata from info file `{INFO_FILE}`."""
         if path:
@@ -65,35 +117,54 @@ class TexnoMagicAlphabet:
 
         assert self.path
         info = json.load(self.info_path.open())
+        return self.load_info(info)
+
+    def load_info(self, info : dict, path=None):
+        """Load Alphabet metadata from info dict."""
+        if path:
+            self.path = path
 
         name = info.get('name')
         if not name:
             name = self.path.name
         self.name = name
+        self.preprocess = check_preprocess(info.get('preprocess'))
+        self.order = info.get('order', [])
 
         return self
 
     def load_symbols(self):
-        """Load Symbols from `symbols` dir."""
+        """Load Symbols from `symbols` dir.
+
+        Uses `catalog` to avoid reading unchanged Symbols when available,
+        catalog Symbols are already sorted."""
         self._symbols = []
-        for symbol_info_path in self.symbols_path.glob('*/texno_symbol.json'):
-            symbol = TexnoMagicSymbol()
-            symbol.load(symbol_info_path.parent)
-            self._symbols.append(symbol)
-        self.sort_symbols()
+        self._symbols_map = None
+        entries = self.catalog.symbols(self.path) if self.catalog else None
+        if entries is not None:
+            for entry in entries:
+                symbol = TexnoMagicSymbol()
+                symbol.load_info(
+                    entry['info'], path=self.symbols_path / entry['name'],
+                    n_drawings=entry['n_drawings'], has_model=entry['model'])
+                self._symbols.append(symbol)
+        else:
+            for symbol_info_path in self.symbols_path.glob('*/texno_symbol.json'):
+                symbol = TexnoMagicSymbol()
+                symbol.load(symbol_info_path.parent)
+                self._symbols.append(symbol)
+            self.sort_symbols()
 
     def sort_symbols(self):
-        """Sort symbols with common ordering."""
+        """Sort symbols with common ordering.
+
+        Symbols in custom `order` come first, then core symbols
+        (see `common.CORE_SYMBOLS_ORDER`), then the rest in original order."""
         if not self._symbols:
             return
-        known = []
-        for core_symbol in common.CORE_SYMBOLS_ORDER:
-            for symbol in self._symbols:
-                if symbol.meaning == core_symbol:
-                    known.append(symbol)
-                    self._symbols.remove(symbol)
-                    break
-        self._symbols = known + self._symbols
+        rank = common.symbols_rank(self.order)
+        n = len(rank)
+        self._symbols.sort(key=lambda s: rank.get(s.meaning, n))
 
     def save(self):
         """Save the Alphabet into path."""
@@ -101,6 +172,10 @@ class TexnoMagicAlphabet:
         info = {
             'name': self.name,
         }
+        if self.preprocess:
+            info['preprocess'] = self.preprocess
+        if self.order:
+            info['order'] = self.order
         return json.dump(info, self.info_path.open('w'))
 
     def save_new_symbol(self, symbol : TexnoMagicSymbol):
@@ -112,29 +187,52 @@ class TexnoMagicAlphabet:
 
         symbol.path = self.symbols_path / common.name2fn(symbol.name)
         symbol.save()
+        self._symbols_map = None
         return self._symbols.insert(0, symbol)
 
-    def export(self, out_path=None):
+    def export(self, out_path=None, jobs=export.EXPORT_JOBS, reuse=True, progress=None):
         """
         Export alphabet into a zipfile.
+
+        Files are compressed in parallel and entries of unchanged files
+        are reused from previously exported zipfile (unless `reuse=False`),
+        see [texnomagic.export.export_zip][].
+
+        Returns:
+            path to exported zipfile
         """
         if not out_path:
             out_path = common.EXPORT_PATH
 
-        ar_fn = self.path.name
-        out_fn = out_path / ar_fn
-        return shutil.make_archive(
-            out_fn, 'zip',
-            root_dir=self.path.parent,
-            base_dir=self.path.name,
+        out_fn = out_path / f'{self.path.name}.zip'
+        export.export_zip(
+            self.path, out_fn,
+            previous=None if reuse else False,
+            jobs=jobs,
+            progress=progress,
         )
+        return str(out_fn)
 
-    def normalize(self):
-        """Normalize all Symbols. Overwrites files.
+    def pack_drawings(self, symbols=None) -> store.TexnoMagicDrawingStore:
+        """Pack drawings of all (or selected) Symbols into a single columnar store.
 
-        See [texnomagic.drawing.TexnoMagicDrawing.normalize][]."""
-        for s in self.symbols:
-            s.normalize()
+        Reduces memory used by many loaded drawings,
+        see [texnomagic.store.pack_drawings][]."""
+        if symbols is None:
+            symbols = self.symbols
+        return store.pack_drawings(d for s in symbols for d in s.drawings)
+
+    def normalize(self) -> int:
+        """Normalize all Symbols. Overwrites changed files.
+
+        All drawings are normalized at once, see [texnomagic.drawing.normalize_drawings][].
+
+        Returns:
+            Number of rewritten drawings."""
+        drawings = [d for s in self.symbols for d in s.drawings if d.points.any()]
+        changed = normalize_drawings(drawings)
+        save_drawings(changed)
+        return len(changed)
 
     def train_models(self, all : bool = False):
         """Train symbol models with available drawings.
@@ -142,8 +240,15 @@ class TexnoMagicAlphabet:
         Train only missing models by default, use all to (re-)train all."""
         new, fail, old = [], [], []
         for symbol in self.symbols:
-            if all or not symbol.model.ready:
-                if symbol.model.train_symbol(symbol):
+            if all or not symbol.has_model:
+                # pack one symbol at a time, packed drawings aren't evicted
+                self.pack_drawings([symbol])
+                try:
+                    trained = symbol.train_model(preprocess=self.preprocess)
+                finally:
+                    for d in symbol.drawings:
+                        d.release(packed=True)
+                if trained:
                     symbol.model.save()
                     new.append(symbol)
                 else:
@@ -155,21 +260,83 @@ class TexnoMagicAlphabet:
     def calibrate(self):
         self.train_models(all=True)
 
-    def scores(self, drawing : TexnoMagicDrawing, reverse : bool = True) -> list[tuple[TexnoMagicSymbol, float]]:
+    def scores(self, drawing : TexnoMagicDrawing, reverse : bool = True, shortlist : int = 0) -> list[tuple[TexnoMagicSymbol, float]]:
         """
         Score a Drawing using all Symbol models.
 
         Args:
             drawing: a Symbol Drawing to score
             reverse: reverse sorting order
+            shortlist: only fully score this many candidate Symbols
+                selected by a cheap pre-filter (0 = score all), see
+                [shortlist][texnomagic.abc.TexnoMagicAlphabet.shortlist]
 
         Returns:
             A list of (symbol, score) tuples ordered by score.
         """
-        s = [(symbol, symbol.model.score(drawing)) for symbol in self.symbols]
+        if shortlist:
+            symbols = self.shortlist(drawing, shortlist)
+        else:
+            symbols = self.symbols
+        s = [(symbol, symbol.model.score(drawing)) for symbol in symbols]
         s = sorted(s, key=lambda x: x[1], reverse=reverse)
         return s
 
+    def shortlist(self, drawing : TexnoMagicDrawing, k : int) -> list[TexnoMagicSymbol]:
+        """
+        Select up to k candidate Symbols for a Drawing using a cheap pre-filter.
+
+        Drawing occupancy grid is compared to occupancy grids of Symbol models
+        (see [texnomagic.descriptor][]) which is much cheaper than full
+        model scoring.
+
+        Symbols without a ready model are never shortlisted.
+
+        Returns:
+            A list of up to k Symbols ordered by pre-filter similarity.
+        """
+        symbols = [s for s in self.symbols if s.model.ready]
+        if not symbols or k <= 0:
+            return []
+        grids = np.stack([s.model.grid for s in symbols])
+        if self.preprocess:
+            drawing = drawing.preprocessed(**self.preprocess)
+        grid = descriptor.occupancy_grid(drawing.points, drawing.points_range)
+        sim = descriptor.grid_similarity(grids, grid)
+        if k < len(symbols):
+            top = np.argpartition(-sim, k - 1)[:k]
+        else:
+            top = np.arange(len(symbols))
+        top = top[np.argsort(-sim[top], kind='stable')]
+        return [symbols[i] for i in top]
+
+    def shortlist_recall(self, k : int, n : int = 1) -> float:
+        """
+        Measure Recall@K of the [shortlist][texnomagic.abc.TexnoMagicAlphabet.shortlist]
+        pre-filter against exhaustive scoring using all Alphabet drawings.
+
+        Args:
+            k: shortlist size
+            n: number of top exhaustively scored Symbols which must be shortlisted
+
+        Returns:
+            Fraction of drawings with all top n Symbols present in the
+            shortlist (1.0 when there are no drawings).
+        """
+        hits = 0
+        total = 0
+        for symbol in self.symbols:
+            for drawing in symbol.drawings:
+                if len(drawing.points) == 0:
+                    continue
+                top = {s for s, score in self.scores(drawing)[:n] if score > 0}
+                if top <= set(self.shortlist(drawing, k)):
+                    hits += 1
+                total += 1
+        if not total:
+            return 1.0
+        return hits / total
+
     def recognize(self, drawing : TexnoMagicDrawing) -> tuple[TexnoMagicSymbol | None, float]:
         """
         Recognize a Drawing within Alphabet Symbols.
@@ -205,6 +372,8 @@ class TexnoMagicAlphabet:
                 log_warn(('warn', 'missing_model', symbol), -1)
             if not symbol.get_image_path().exists():
                 log_warn(('warn', 'missing_svg', symbol), -1)
+            # pack one symbol at a time, packed drawings aren't evicted
+            self.pack_drawings([symbol])
             for drawing in symbol.drawings:
                 scores = self.scores(drawing)
                 rsymbol, rscore = scores[0]
@@ -221,6 +390,8 @@ class TexnoMagicAlphabet:
                         if rsc > 0.8:
                             lvl = 'error'
                         log_warn((lvl, 'high_score', symbol, rsy), rsc)
+            for drawing in symbol.drawings:
+                drawing.release(packed=True)
 
         results = {}
         for (level, prob, *args), (n, score) in warns.items():
@@ -243,11 +414,17 @@ class TexnoMagicAlphabet:
         return results
 
     def get_symbol(self, name : str) -> TexnoMagicSymbol | None:
-        """Get Symbol by name or meaning."""
-        for s in self.symbols:
-            if s.name == name or s.meaning == name:
-                return s
-        return None
+        """Get Symbol by name or meaning.
+
+        Raises [AmbiguousSymbol][texnomagic.ex.AmbiguousSymbol]
+        when multiple Symbols match."""
+        symbols = self.symbols_map.get(name)
+        if not symbols:
+            return None
+        if len(symbols) > 1:
+            raise ex.AmbiguousSymbol(
+                "ambiguous symbol %s in %s: %s" % (name, self.name, ", ".join(map(str, symbols))))
+        return symbols[0]
 
     def random_symbol(self, exclude=None) -> TexnoMagicSymbol | None:
         """Get a random Symbol from the Alphabet."""
@@ -270,9 +447,9 @@ class TexnoMagicAlphabet:
             img_path = PurePosixPath().joinpath(*s.get_image_path().parts[-4:])
             stxt = (f"{htxt} {s}\n\n"
                     f"![{s}]({img_path})\n")
-            if len(s.drawings) > 0:
+            if s.n_drawings > 0:
                 d_path = PurePosixPath().joinpath(*s.drawings_path.parts[-3:])
-                stxt += f'\n{len(s.drawings)} [drawings]({d_path})\n'
+                stxt += f'\n{s.n_drawings} [drawings]({d_path})\n'
 
             txt_ref += f"* [{s}](#{s.name}-{s.meaning.lower()})\n"
             txt_body += stxt + '\n'
@@ -1,11 +1,16 @@
+from pathlib import Path
+
 from texnomagic import abc as abc_
+from texnomagic import catalog as catalog_
 from texnomagic import common
+from texnomagic import ex
 
 
 class TexnoMagicAlphabets:
     def __init__(self, paths=None):
         self.paths = paths or common.ALPHABETS_PATHS
         self._abcs = None
+        self._abcs_map = None
 
     @property
     def abcs(self):
@@ -13,26 +18,92 @@ class TexnoMagicAlphabets:
             self.load()
         return self._abcs
 
+    @property
+    def abcs_map(self):
+        """Alphabets lookup map by name and handle with (tag, abc) values.
+
+        Built on-demand."""
+        if self._abcs_map is None:
+            self._abcs_map = self.build_map()
+        return self._abcs_map
+
+    def build_map(self):
+        return common.lookup_map(
+            [(tag, abc) for tag, abcs in self.abcs.items() for abc in abcs],
+            lambda ta: (ta[1].name, ta[1].handle))
+
     def load(self):
-        self._abcs = {}
+        abcs = {}
         for tag, path in self.paths.items():
-            self._abcs[tag] = get_alphabets(path)
+            abcs[tag] = get_alphabets(path)
+        self._abcs = abcs
+        self._abcs_map = None
 
     def get_alphabet(self, name):
+        """
+        Get Alphabet by name or handle, optionally prefixed by tag (`tag:name`).
+
+        Raises [AmbiguousAlphabet][texnomagic.ex.AmbiguousAlphabet]
+        when multiple Alphabets match.
+        """
         tag, _, abc_name = name.rpartition(':')
-        for tag_, abcs in self.abcs.items():
-            if tag and tag != tag_:
-                continue
-            for abc in abcs:
-                if abc_name == abc.name or abc_name == abc.handle:
-                    return abc
+        matches = self.abcs_map.get(abc_name, [])
+        if tag:
+            matches = [(t, abc) for t, abc in matches if t == tag]
+        if not matches:
+            return None
+        if len(matches) > 1:
+            raise ex.AmbiguousAlphabet(
+                "ambiguous alphabet %s, use TAG:NAME to select one of: %s" % (
+                    name, ", ".join("%s:%s" % (t, abc.name) for t, abc in matches)))
+        return matches[0][1]
+
+    def get_path_tag(self, path):
+        """
+        Get tag of alphabets path containing Alphabet at path.
+
+        Returns:
+            tag or None when path isn't within alphabets paths.
+        """
+        path = Path(path)
+        for tag, tag_path in self.paths.items():
+            if path.parent == Path(tag_path):
+                return tag
         return None
 
+    def reload_alphabet(self, path):
+        """
+        Reload (or add/remove) a single Alphabet at path.
+
+        Alphabet lists are replaced rather than modified
+        so that concurrent readers always see a consistent list.
+
+        Returns:
+            reloaded Alphabet or None when path is no longer an Alphabet.
+        """
+        path = Path(path)
+        tag = self.get_path_tag(path)
+        if tag is None:
+            raise ValueError("alphabet path isn't within alphabets paths: %s" % path)
+
+        abc = None
+        if (path / abc_.INFO_FILE).exists():
+            abc = abc_.TexnoMagicAlphabet(catalog=catalog_.get_catalog(path.parent))
+            abc.load(path)
+        abcs = [a for a in self.abcs.get(tag, []) if a.path != path]
+        if abc:
+            abcs.append(abc)
+        self.abcs[tag] = abcs
+        # replace map rather than invalidate so readers never see a stale one
+        self._abcs_map = self.build_map()
+        return abc
+
     def save_new_alphabet(self, abc, tag='user'):
         assert abc.name
         abc.path = self.paths[tag] / common.name2fn(abc.name)
         abc.save()
         self.abcs[tag].insert(0, abc)
+        self._abcs_map = self.build_map()
         return abc
 
     def pretty(self):
@@ -48,10 +119,17 @@ class TexnoMagicAlphabets:
 
 
 def get_alphabets(paths=None):
-    paths = paths or common.ALPHABETS_PATHS
+    """
+    Get Alphabets in alphabets root path.
+
+    Alphabets are listed using root catalog to avoid rescanning unchanged
+    directories, see [texnomagic.catalog.TexnoMagicCatalog][].
+    """
+    paths = Path(paths or common.ALPHABETS_PATHS)
+    catalog = catalog_.get_catalog(paths)
     abcs = []
-    for abc_info_path in paths.glob(f'*/{abc_.INFO_FILE}'):
-        abc = abc_.TexnoMagicAlphabet()
-        abc.load(abc_info_path.parent)
+    for entry in catalog.alphabets():
+        abc = abc_.TexnoMagicAlphabet(catalog=catalog)
+        abc.load_info(entry['info'], path=paths / entry['name'])
         abcs.append(abc)
     return abcs
@@ -0,0 +1,270 @@
+"""
+TexnoMagic alphabets catalog
+
+Loading alphabets requires listing many directories and reading
+many small info files. Catalog stores everything needed to list
+Alphabets and their Symbols (including number of drawings and model status)
+in a single file per alphabets root.
+
+Catalog entries are validated cheaply using modification times (and sizes)
+of directories and info files so that only changed entries are rescanned:
+
+* alphabets root dir: Alphabet added/removed
+* Alphabet info file: Alphabet metadata changed
+* `symbols` dir: Symbol added/removed
+* Symbol dir, info file, `drawings` and `model` dirs:
+  Symbol metadata, drawings, or model changed
+
+Symbols are stored sorted (see `common.symbols_rank`) and only
+re-sorted when they change.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+from texnomagic import common
+
+
+# bump when entries change, older catalogs are rebuilt
+# 2: Alphabet entries have symbols 'order'
+CATALOG_VERSION = 2
+
+ABC_INFO_FILE = 'texno_alphabet.json'
+SYMBOL_INFO_FILE = 'texno_symbol.json'
+MODEL_INFO_FILE = 'texno_model.json'
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(root, path=None):
+    """Get (shared) catalog of alphabets root."""
+    root = Path(root)
+    with _catalogs_lock:
+        catalog = _catalogs.get(root)
+        if catalog is None or (path and catalog.path != path):
+            catalog = TexnoMagicCatalog(root, path=path)
+            _catalogs[root] = catalog
+    return catalog
+
+
+def catalog_path(root):
+    """Default catalog path of alphabets root."""
+    key = hashlib.sha1(str(Path(root).absolute()).encode('utf-8')).hexdigest()[:16]
+    return common.CATALOG_PATH / f'{key}.json'
+
+
+class TexnoMagicCatalog:
+    """
+    Catalog of Alphabets and Symbols in an alphabets root dir.
+
+    Use [alphabets][texnomagic.catalog.TexnoMagicCatalog.alphabets] and
+    [symbols][texnomagic.catalog.TexnoMagicCatalog.symbols] to get
+    validated catalog entries. Catalog is saved when it changes.
+    """
+    def __init__(self, root, path=None):
+        self.root = Path(root)
+        self.path = path or catalog_path(root)
+        self.data = None
+        # number of reused / rescanned entries
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def alphabets(self) -> list[dict]:
+        """
+        Get validated entries of all Alphabets in root.
+
+        Entry has Alphabet dir `name` and `info` from its info file.
+        """
+        with self._lock:
+            data = self._get_data()
+            stamp = stat_stamp(self.root)
+            if stamp is None:
+                return []
+            abcs = data['alphabets']
+            if stamp != data['stamp']:
+                # dirs without info file are remembered as well
+                # in case info file is written later
+                data['dirs'] = list_dirs(self.root)
+                data['stamp'] = stamp
+                self._dirty = True
+
+            entries = {}
+            for name in data['dirs']:
+                abc_path = self.root / name
+                info_stamp = stat_stamp(abc_path / ABC_INFO_FILE)
+                if info_stamp is None:
+                    if name in abcs:
+                        self._dirty = True
+                    continue
+                entry = abcs.get(name)
+                if entry and entry['stamp'] == info_stamp:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    self._dirty = True
+                    entry = {
+                        'name': name,
+                        'stamp': info_stamp,
+                        'info': read_info(abc_path / ABC_INFO_FILE),
+                        'symbols_stamp': None,
+                        'symbols_dirs': [],
+                        'symbols': {},
+                        'order': [],
+                    }
+                entries[name] = entry
+            data['alphabets'] = entries
+            self._save_if_dirty()
+            return list(entries.values())
+
+    def symbols(self, abc_path) -> list[dict] | None:
+        """
+        Get validated entries of all Symbols of Alphabet at abc_path.
+
+        Entry has Symbol dir `name`, `info` from its info file,
+        `n_drawings`, and `model` status.
+
+        Entries are sorted by Alphabet `order` and core symbols order.
+
+        Returns None when Alphabet isn't in catalog.
+        """
+        abc_path = Path(abc_path)
+        if abc_path.parent != self.root:
+            return None
+        with self._lock:
+            entry = self._get_data()['alphabets'].get(abc_path.name)
+            if entry is None:
+                return None
+            symbols_path = abc_path / 'symbols'
+            stamp = stat_stamp(symbols_path)
+            symbols = entry['symbols']
+            changed = False
+            if stamp != entry['symbols_stamp']:
+                entry['symbols_dirs'] = list_dirs(symbols_path) if stamp else []
+                entry['symbols_stamp'] = stamp
+                changed = True
+
+            entries = {}
+            for name in entry['symbols_dirs']:
+                symbol_path = symbols_path / name
+                symbol_stamp = [stat_stamp(symbol_path / p) for p in ('', SYMBOL_INFO_FILE, 'drawings', 'model')]
+                if symbol_stamp[1] is None:
+                    if name in symbols:
+                        changed = True
+                    continue
+                symbol = symbols.get(name)
+                if symbol and symbol['stamp'] == symbol_stamp:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    changed = True
+                    symbol = scan_symbol(symbol_path)
+                    symbol['stamp'] = symbol_stamp
+                entries[name] = symbol
+            if changed:
+                rank = common.symbols_rank(entry['info'].get('order'))
+                n = len(rank)
+                entry['order'] = sorted(entries, key=lambda s: rank.get(entries[s]['info'].get('meaning'), n))
+                self._dirty = True
+            entry['symbols'] = entries
+            self._save_if_dirty()
+            return [entries[name] for name in entry['order']]
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def save(self):
+        """Save catalog into its path.
+
+        [!] Overwrites existing data!
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # write atomically, catalog can be saved from multiple processes
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def load(self, path=None):
+        """Load catalog from path, start with an empty catalog if invalid."""
+        if path:
+            self.path = path
+        self.data = new_catalog_data(self.root)
+        try:
+            data = json.load(self.path.open())
+        except (OSError, ValueError):
+            return False
+        if data.get('version') != CATALOG_VERSION or data.get('root') != str(self.root):
+            return False
+        self.data = data
+        return True
+
+    def _get_data(self):
+        if self.data is None:
+            self.load()
+        return self.data
+
+    def _save_if_dirty(self):
+        if not self._dirty:
+            return
+        try:
+            self.save()
+        except OSError:
+            # catalog is only a cache
+            pass
+
+    def __repr__(self):
+        return '<TexnoMagicCatalog: %s @ %s>' % (self.root, self.path)
+
+
+def new_catalog_data(root):
+    return {
+        'version': CATALOG_VERSION,
+        'root': str(root),
+        'stamp': None,
+        'dirs': [],
+        'alphabets': {},
+    }
+
+
+def list_dirs(path) -> list[str]:
+    """List names of sub-directories sorted."""
+    return sorted(e.name for e in os.scandir(path) if e.is_dir())
+
+
+def scan_symbol(path) -> dict:
+    """Scan Symbol dir into catalog entry."""
+    drawings_path = path / 'drawings'
+    n_drawings = 0
+    if drawings_path.is_dir():
+        n_drawings = len(os.listdir(drawings_path))
+    return {
+        'name': path.name,
+        'info': read_info(path / SYMBOL_INFO_FILE),
+        'n_drawings': n_drawings,
+        'model': (path / 'model' / MODEL_INFO_FILE).is_file(),
+    }
+
+
+def read_info(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def stat_stamp(path) -> list | None:
+    """Cheap change stamp of a path: [mtime_ns, size] or None if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
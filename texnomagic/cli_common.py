@@ -18,10 +18,16 @@ def get_alphabet_or_fail(abc=None, auto_load=True):
     if abc:
         abcs = TexnoMagicAlphabets()
         abcs.load()
-        alphabet = abcs.get_alphabet(abc)
+        try:
+            alphabet = abcs.get_alphabet(abc)
+        except ex.AmbiguousAlphabet as e:
+            console.print(f"[yellow]Ambiguous TexnoMagic alphabet[/]: {e}")
+            raise
         if not alphabet:
             console.print(f"[yellow]TexnoMagic alphabet not found[/]: [cyan]{abc}[/]")
             raise ex.AlphabetNotFound(abc)
+        # already loaded from alphabets catalog
+        auto_load = False
     else:
         alphabet = find_alphabet_at_path()
         if not alphabet:
@@ -46,7 +52,11 @@ def get_symbol_or_fail(symbol=None, auto_load=True):
             console.print("\nPlease use ALPHABET/SYMBOL format.")
             raise ex.InvalidInput(symbol)
         _abc = get_alphabet_or_fail(abc_name)
-        _symbol = _abc.get_symbol(symbol_name)
+        try:
+            _symbol = _abc.get_symbol(symbol_name)
+        except ex.AmbiguousSymbol as e:
+            console.print(f"[yellow]Ambiguous TexnoMagic symbol[/]: {e}")
+            raise
         if not _symbol:
             console.print(f"[yellow]TexnoMagic symbol not found[/]: [green]{symbol}[/]")
             raise ex.SymbolNotFound(symbol)
@@ -54,12 +54,24 @@ class TexnoMagicClient:
         self.sock.sendall(payload)
 
         # RECEIVE response from server
-        head = self.sock.recv(4)
+        head = self.recv(4)
         # first 4 bytes is the length of the message
         size = common.bytes2int(head)
-        reply = str(self.sock.recv(size), "utf-8")
+        reply = str(self.recv(size), "utf-8")
         return json.loads(reply)
 
+    def recv(self, size):
+        """
+        receive exactly size bytes
+        """
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("connection closed by server")
+            data += chunk
+        return bytes(data)
+
     def close(self):
         """
         close the connection to TexnoMagic TCP server
@@ -1,9 +1,15 @@
+from pathlib import Path
+import sys
+import time
+
 import click
 
 from texnomagic.abcs import TexnoMagicAlphabets
 from texnomagic import console
 from texnomagic import common
 from texnomagic import cli_common
+from texnomagic import export as export_mod
+from texnomagic import render
 
 
 @click.group()
@@ -126,7 +132,8 @@ def normalize(abc):
     alphabet = cli_common.get_alphabet_or_fail(abc)
 
     console.print(f"[green]NORMALIZE[/] alphabet: {alphabet.pretty(path=True)}")
-    alphabet.normalize()
+    n = alphabet.normalize()
+    console.print(f"[green]NORMALIZED[/] [white]{n}[/] drawings (unchanged drawings skipped)")
 
 
 @abc.command()
@@ -149,6 +156,113 @@ def train(abc, all):
         console.print("[cyan]ORIG[/] %s symbol models: %s" % (len(old), ", ".join([s.meaning for s in old])))
 
 
+@abc.command()
+@click.argument('abc', required=False)
+@click.option('-k', '--neighbours', type=int, default=5, show_default=True,
+              help="Number of nearest neighbours for outliers detection.")
+@click.option('-d', '--duplicates', 'show_dups', is_flag=True,
+              help="List duplicate drawings.")
+@click.option('-o', '--outliers', 'show_outliers', is_flag=True,
+              help="List outlier drawings.")
+@click.option('--save/--no-save', default=True, show_default=True,
+              help="Save the index with alphabet.")
+def index(abc, neighbours, show_dups, show_outliers, save):
+    """
+    Build drawings index for alphabet.
+
+    Reports index build time, query latency, duplicate and outlier drawings.
+    """
+    alphabet = cli_common.get_alphabet_or_fail(abc)
+
+    console.print(f"[green]INDEX[/] alphabet drawings: {alphabet.pretty(path=True)}")
+    idx = alphabet.build_index(save=save)
+    console.print(f"[bold]build[/]: {len(idx)} drawings in {idx.build_time * 1000.0:.1f} ms")
+
+    drawings = [d for s in alphabet.symbols for d in s.drawings if len(d.points) > 0]
+    if drawings:
+        start = time.perf_counter()
+        for d in drawings:
+            idx.query(d, k=neighbours)
+        t_query = (time.perf_counter() - start) * 1000.0 / len(drawings)
+        console.print(f"[bold]query[/]: {t_query:.3f} ms")
+
+    dups = idx.duplicates()
+    outliers = idx.outliers(k=neighbours)
+    console.print(f"[bold]duplicates[/]: {len(dups)}, [bold]outliers[/]: {len(outliers)}")
+    if show_dups:
+        for d1, d2, dist in dups:
+            console.print(f"[yellow]DUPLICATE[/]: {d1} ~ {d2} ({dist:.4f})")
+    if show_outliers:
+        for meaning, d, ratio in outliers:
+            console.print(f"[yellow]OUTLIER[/]: {meaning}/{d} ({ratio:.0%} foreign neighbours)")
+    if save:
+        console.print(f"[green]SAVED[/] index: [white]{idx.path}[/]")
+
+
+@abc.command()
+@click.argument('abc', required=False)
+@click.option('-O', '--result-dir', type=Path, required=True,
+              help="Save preview images into specified dir.")
+@click.option('-r', '--resolution', default=256, show_default=True,
+              help='Desired image resolution.')
+@click.option('-j', '--jobs', type=click.IntRange(1), default=1, show_default=True,
+              help="Number of rendering processes.")
+def preview(abc, result_dir, resolution, jobs):
+    """
+    Render model previews of all alphabet symbols.
+
+    Preview shows model components over symbol drawings.
+    """
+    render.ensure_pil()
+    alphabet = cli_common.get_alphabet_or_fail(abc)
+
+    console.print(f"[green]PREVIEW[/] alphabet models: {alphabet.pretty(path=True)}")
+    images = render.render_symbol_previews(alphabet.symbols, res=resolution, jobs=jobs)
+    result_dir.mkdir(parents=True, exist_ok=True)
+    for symbol, data in zip(alphabet.symbols, images):
+        out_path = result_dir / f'{symbol.handle}.png'
+        render.Image.fromarray(data).save(out_path)
+        console.print(f"[green]SAVE PREVIEW IMAGE[/]: [bold]{out_path}[/]")
+
+
+@abc.command()
+@click.argument('abc', required=False)
+@click.option('-o', '--output',
+              help="Output zip path, use - to stream to stdout.  [default: alphabet in export dir]")
+@click.option('-j', '--jobs', type=int, default=export_mod.EXPORT_JOBS, show_default=True,
+              help="Number of compression threads.")
+@click.option('--reuse/--no-reuse', default=True, show_default=True,
+              help="Reuse unchanged entries from previous export.")
+def export(abc, output, jobs, reuse):
+    """
+    Export alphabet into a zip archive.
+
+    Files are compressed in parallel and only changed files are
+    recompressed when updating a previous export.
+    """
+    alphabet = cli_common.get_alphabet_or_fail(abc)
+
+    if output == '-':
+        # stream raw zip to stdout, no messages
+        export_mod.export_zip(alphabet.path, sys.stdout.buffer, jobs=jobs)
+        return
+
+    console.print(f"[green]EXPORT[/] alphabet: {alphabet.pretty(path=True)}")
+    if output:
+        out_path = Path(output)
+    else:
+        out_path = common.EXPORT_PATH / f'{alphabet.path.name}.zip'
+    start = time.perf_counter()
+    stats = export_mod.export_zip(
+        alphabet.path, out_path,
+        previous=None if reuse else False,
+        jobs=jobs)
+    t = time.perf_counter() - start
+    console.print(f"[bold]files[/]: {stats['files']} ({stats['reused']} reused, "
+                  f"{stats['compressed']} compressed, {stats['stored']} stored) in {t * 1000.0:.1f} ms")
+    console.print(f"[green]SAVED[/] export: [white]{out_path}[/] ({stats['size']} B)")
+
+
 @abc.command()
 @click.argument('abc', required=False)
 @click.option('-h', '--heading', type=int, default=3, show_default=True,
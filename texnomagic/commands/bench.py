@@ -0,0 +1,190 @@
+import gc
+import time
+import tracemalloc
+
+import click
+
+from texnomagic import console
+from texnomagic import cli_common
+from texnomagic.drawing import TexnoMagicDrawing
+from texnomagic import jsonio
+from texnomagic import store
+
+
+@click.group()
+@click.help_option('-h', '--help', help='Show command help.')
+def bench():
+    """
+    Benchmark TexnoMagic performance.
+    """
+
+
+def get_bench_drawings(alphabet):
+    """Get all non-empty drawings of an alphabet."""
+    return [d for s in alphabet.symbols for d in s.drawings if len(d.points) > 0]
+
+
+def time_per_drawing(fun, drawings):
+    """Return average fun(drawing) run time in ms."""
+    if not drawings:
+        return 0.0
+    start = time.perf_counter()
+    for d in drawings:
+        fun(d)
+    return (time.perf_counter() - start) * 1000.0 / len(drawings)
+
+
+@bench.command()
+@click.argument('abc', required=False)
+@click.option('-k', '--shortlist', 'ks', type=int, multiple=True,
+              default=[1, 3, 5, 10], show_default=True,
+              help="Shortlist size(s) to benchmark.")
+@click.option('-n', '--top', type=int, default=1, show_default=True,
+              help="Number of top exhaustive results required in shortlist.")
+def shortlist(abc, ks, top):
+    """
+    Benchmark shortlist pre-filter against exhaustive recognition.
+
+    Reports Recall@K and average latency per drawing
+    using all drawings of selected alphabet.
+    """
+    alphabet = cli_common.get_alphabet_or_fail(abc)
+    drawings = get_bench_drawings(alphabet)
+    console.print(f"[green]BENCH[/] shortlist on {len(drawings)} drawings: {alphabet.pretty()}")
+
+    t_all = time_per_drawing(lambda d: alphabet.scores(d), drawings)
+    console.print(f"[bold]exhaustive[/]: {t_all:.2f} ms")
+    for k in ks:
+        recall = alphabet.shortlist_recall(k, n=top)
+        t_k = time_per_drawing(lambda d: alphabet.scores(d, shortlist=k), drawings)
+        console.print(f"[bold]K={k}[/]: recall@{k} {recall:.3f}, {t_k:.2f} ms")
+
+
+@bench.command()
+@click.argument('abc', required=False)
+@click.option('-r', '--resample', type=float, multiple=True,
+              help="Resample spacing(s) to benchmark.")
+@click.option('-s', '--simplify', type=float, multiple=True,
+              help="Simplify epsilon(s) to benchmark.")
+def preprocess(abc, resample, simplify):
+    """
+    Benchmark drawings preprocessing latency vs accuracy.
+
+    Models are (re-)trained in memory for each preprocessing variant
+    (including no preprocessing) and used to recognize all drawings of
+    selected alphabet. Nothing is saved.
+    """
+    alphabet = cli_common.get_alphabet_or_fail(abc)
+    drawings = [(s, d) for s in alphabet.symbols for d in s.drawings if len(d.points) > 0]
+    console.print(f"[green]BENCH[/] preprocess on {len(drawings)} drawings: {alphabet.pretty()}")
+
+    variants = [{}]
+    variants += [{'resample': r} for r in resample]
+    variants += [{'simplify': e} for e in simplify]
+    variants += [{'resample': r, 'simplify': e} for r in resample for e in simplify]
+    for variant in variants:
+        start = time.perf_counter()
+        for symbol in alphabet.symbols:
+            symbol.train_model(preprocess=variant)
+        t_train = time.perf_counter() - start
+
+        n_ok = 0
+        start = time.perf_counter()
+        for symbol, d in drawings:
+            # clear preprocessed drawing cache to time preprocessing as well
+            d.clear_preprocessed()
+            rsymbol, _ = alphabet.recognize(d)
+            n_ok += rsymbol == symbol
+        t_rec = (time.perf_counter() - start) * 1000.0 / max(len(drawings), 1)
+        n_points = sum(len(d.preprocessed(**variant).points) for _, d in drawings)
+
+        name = ', '.join(f'{k} {v}' for k, v in variant.items()) or 'none'
+        accuracy = n_ok / max(len(drawings), 1)
+        avg_points = n_points / max(len(drawings), 1)
+        console.print(f"[bold]{name}[/]: accuracy {accuracy:.3f}, "
+                      f"{avg_points:.1f} points, {t_rec:.2f} ms, train {t_train:.2f} s")
+
+
+@bench.command()
+@click.argument('abc', required=False)
+def memory(abc):
+    """
+    Benchmark memory used by loaded drawings.
+
+    All drawings of selected alphabet are loaded as separate
+    drawings first and then packed into a columnar store.
+    Reports traced memory per drawing in both cases.
+    """
+    alphabet = cli_common.get_alphabet_or_fail(abc)
+    paths = [d.path for s in alphabet.symbols for d in s.drawings]
+    n = max(len(paths), 1)
+    console.print(f"[green]BENCH[/] memory on {len(paths)} drawings: {alphabet.pretty()}")
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        drawings = [TexnoMagicDrawing(p) for p in paths]
+        for d in drawings:
+            d.load_curves()
+        gc.collect()
+        m_separate, _ = tracemalloc.get_traced_memory()
+        n_points = sum(len(d.points) for d in drawings)
+        drawings_store = store.pack_drawings(drawings)
+        gc.collect()
+        m_packed, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    console.print(f"[bold]points[/]: {n_points} ({n_points * 16 / n:.0f} B per drawing)")
+    console.print(f"[bold]separate[/]: {m_separate / n:.0f} B per drawing")
+    console.print(f"[bold]packed[/]: {m_packed / n:.0f} B per drawing ({drawings_store.nbytes} B store)")
+
+
+@bench.command()
+@click.argument('abc', required=False)
+@click.option('-r', '--repeat', type=int, default=10, show_default=True,
+              help="Number of repetitions.")
+def json(abc, repeat):
+    """
+    Benchmark JSON backends.
+
+    Models of selected alphabet (trained in memory when missing) are
+    serialized the way they're saved into model files and loaded back.
+    RPC responses with recognition results and model previews
+    are serialized as well. Available JSON backends are compared.
+    """
+    alphabet = cli_common.get_alphabet_or_fail(abc)
+    infos = []
+    responses = []
+    for symbol in alphabet.symbols:
+        if not symbol.model.ready:
+            symbol.train_model(preprocess=alphabet.preprocess)
+        infos.append(symbol.model.get_info())
+        responses.append({'jsonrpc': '2.0', 'result': symbol.model.get_preview(), 'id': len(responses)})
+    for d in get_bench_drawings(alphabet):
+        result = [(s.name, score) for s, score in alphabet.scores(d)]
+        responses.append({'jsonrpc': '2.0', 'result': result, 'id': len(responses)})
+    console.print(f"[green]BENCH[/] json on {len(infos)} models and {len(responses)} RPC responses: "
+                  f"{alphabet.pretty()}")
+
+    def time_ms(fun, items):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for item in items:
+                fun(item)
+        return (time.perf_counter() - start) * 1000.0 / max(repeat * len(items), 1)
+
+    for backend in jsonio.available_backends():
+        old_backend = jsonio.set_backend(backend)
+        try:
+            t_save = time_ms(lambda i: jsonio.dumpb(i, indent=True), infos)
+            data = [jsonio.dumpb(i, indent=True) for i in infos]
+            t_load = time_ms(jsonio.loads, data)
+            t_rpc = time_ms(jsonio.dumpb, responses)
+        finally:
+            jsonio.set_backend(old_backend)
+        size = sum(len(d) for d in data) / max(len(data), 1)
+        console.print(f"[bold]{backend}[/]: model save {t_save:.3f} ms, load {t_load:.3f} ms "
+                      f"({size:.0f} B), RPC response {t_rpc:.3f} ms")
+
+
+TEXNOMAGIC_CLI_COMMANDS = [bench]
@@ -5,8 +5,10 @@ import click
 from texnomagic import abc as abc_mod
 from texnomagic import cli_common
 from texnomagic import console
+from texnomagic.drawing import normalize_drawings, save_drawings
 from texnomagic import ex
 from texnomagic import render as render_mod
+from texnomagic import thumbs
 
 
 @click.group()
@@ -57,33 +59,79 @@ def normalize(drawing):
     Normalize TexnoMagic drawing(s).
     """
     drawings = cli_common.parse_drawings_arg(drawing)
-    for d in drawings:
-        if d.points.any():
-            console.print(f"[green]NORMALIZING[/] drawing: {d.pretty()}")
-            d.normalize()
-            d.save()
+    changed = normalize_drawings([d for d in drawings if d.points.any()])
+    for d in changed:
+        console.print(f"[green]NORMALIZING[/] drawing: {d.pretty()}")
+    save_drawings(changed)
 
 
 @drawing.command()
-@click.argument('drawing', nargs=-1, required=True)
+@click.argument('drawing', nargs=-1)
+@click.option('-s', '--symbol',
+              help="Render all drawings of selected TexnoMagic symbol.")
+@click.option('-a', '--abc',
+              help="Render all drawings of selected TexnoMagic alphabet.")
 @click.option('-r', '--resolution',
               default=1000, show_default=True,
               help='Desired image resolution.')
+@click.option('-w', '--line-width', type=int,
+              help="Line width in pixels.  [default: 5% of resolution]")
+@click.option('-A', '--antialias', type=int,
+              default=render_mod.ANTIALIAS_DEFAULT, show_default=True,
+              help="Anti-aliasing sub-rows per pixel (1 = off).")
+@click.option('-j', '--jobs', type=click.IntRange(1), default=1, show_default=True,
+              help="Number of rendering processes.")
 @click.option('-O', '--result-dir', type=Path,
               help="Save image(s) into specified dir.")
-def render(drawing, resolution, result_dir):
+@click.option('--cache/--no-cache', default=True, show_default=True,
+              help="Use thumbnail cache.")
+def render(drawing, symbol, abc, resolution, line_width, antialias, jobs, result_dir, cache):
     """
     Render TexnoMagic drawing(s) into raster image(s) (PNG).
 
-    Display the image by default, use -O/--result-dir to save instead.
+    Select drawing CSV files as arguments or render all drawings of
+    a symbol (-s/--symbol) or an alphabet (-a/--abc).
+
+    Display the image by default, use -O/--result-dir to save instead
+    (required for symbols and alphabets).
+
+    Drawings are rendered in batch using NumPy (see `render_drawings`)
+    and cached in thumbnail cache unless --no-cache is used.
     """
-    drawings = cli_common.parse_drawings_arg(drawing)
-    if result_dir:
-        result_dir.mkdir(parents=True, exist_ok=True)
-    for d in drawings:
-        img = render_mod.render_drawing(d, res=resolution)
-        if result_dir:
-            out_path = result_dir / f'{d.path.stem}.png'
+    render_mod.ensure_pil()
+    if abc:
+        alphabet = cli_common.get_alphabet_or_fail(abc)
+        symbols = alphabet.symbols
+    elif symbol:
+        symbols = [cli_common.get_symbol_or_fail(symbol)]
+    elif drawing:
+        symbols = []
+        drawings = cli_common.parse_drawings_arg(drawing)
+    else:
+        raise click.UsageError("Pass DRAWING(s) or use -s/--symbol or -a/--abc.")
+
+    if symbols:
+        if not result_dir:
+            raise click.UsageError("Use -O/--result-dir to save images of symbols and alphabets.")
+        # alphabet symbols are rendered into their own subdirectories
+        drawings = [d for s in symbols for d in s.drawings]
+        out_dirs = [result_dir / s.handle if abc else result_dir
+                    for s in symbols for _ in s.drawings]
+    else:
+        out_dirs = [result_dir] * len(drawings)
+
+    console.print(f"[green]RENDERING[/] {len(drawings)} drawings")
+    if cache:
+        images = thumbs.TexnoMagicThumbnailCache().get(
+            drawings, res=resolution, line_width=line_width, antialias=antialias, jobs=jobs)
+    else:
+        images = render_mod.render_drawings(
+            drawings, res=resolution, line_width=line_width, antialias=antialias, jobs=jobs)
+    for d, out_dir, data in zip(drawings, out_dirs, images):
+        img = render_mod.Image.fromarray(data)
+        if out_dir:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            out_path = out_dir / f'{d.path.stem}.png'
             console.print(f"[green]SAVE DRAWING IMAGE[/]: [bold]{out_path}[/]")
             img.save(out_path)
         else:
@@ -108,11 +156,13 @@ def render(drawing, resolution, result_dir):
               help="Reverse sorting of drawings.  [default: score descending]")
 @click.option('-R', '--reverse-symbols', is_flag=True,
               help="Reverse sorting of symbols. (in alphabet mode)  [default: score descending]")
+@click.option('-k', '--shortlist', type=int, default=0,
+              help="Only score this many pre-filtered candidate symbols. (in alphabet mode)  [default: all]")
 @click.option('--norm/--no-norm', default=True, show_default=True,
               help='Normalize drawing before recognition.')
 @click.option('--rating/--no-rating', default=True, show_default=True,
               help="Show written rating alongside score.")
-def recognize(drawing, abc, symbol, min_score, max_score, max_drawings, max_symbols, reverse_drawings, reverse_symbols, norm, rating):
+def recognize(drawing, abc, symbol, min_score, max_score, max_drawings, max_symbols, reverse_drawings, reverse_symbols, shortlist, norm, rating):
     """
     Recognize selected drawings.
 
@@ -155,7 +205,7 @@ def recognize(drawing, abc, symbol, min_score, max_score, max_drawings, max_symb
         for d in drawings:
             symbol_scores = []
             # filter within <min_score; max_score>
-            for s, score in rabc.scores(d, reverse=not reverse_symbols):
+            for s, score in rabc.scores(d, reverse=not reverse_symbols, shortlist=shortlist):
                 if score < min_score or score > max_score:
                     continue
                 symbol_scores.append((s, score))
@@ -25,6 +25,8 @@ def list(format):
     List online Words of Power mods from wop.mod.io.
     """
     mods_ = mods.get_online_mods()
+    if mods.get_mod_index().offline:
+        console.log("[yellow]OFFLINE[/]: using cached mods list")
     if format == 'text':
         for m in mods_:
             console.print(f"[bold cyan]{m.name}[/]: {m.profile_url}")
@@ -37,30 +39,69 @@ def list(format):
 @click.argument('mod', nargs=-1)
 @click.option('-a', '--all', is_flag=True,
               help="Download ALL mods.  [default: only selected]")
-def download(mod, all):
+@click.option('-j', '--jobs', type=click.IntRange(1), default=mods.DOWNLOAD_JOBS, show_default=True,
+              help="Number of concurrent downloads.")
+def download(mod, all, jobs):
     """
     Download Words of Power mods from wop.mod.io.
     """
-    def do_dl(mod_):
-        console.log(f"[yellow]DOWNLOADING MOD[/]: [bold cyan]{mod_.name}[/] from {mod_.profile_url}")
-        mod_.download()
-        console.log(f"[green]DOWNLOADED MOD[/]: [bold cyan]{mod_.name}[/] from {mod_.profile_url}")
-
     all_mods = mods.get_online_mods()
     if all:
         # all mods
-        for mod in all_mods:
-            do_dl(mod)
+        selected = all_mods
+    else:
+        # selected mods
+        selected = []
+        for mod_id in mod:
+            for m in all_mods:
+                if m.name_id == mod_id or m.name == mod_id:
+                    selected.append(m)
+                    break
+            else:
+                console.log(f"[red]Mod not found[/] - [yellow]skipping[/]: {mod_id}")
+
+    for m in selected:
+        console.log(f"[yellow]DOWNLOADING MOD[/]: [bold cyan]{m.name}[/] from {m.profile_url}")
+    results = mods.download_mods(selected, jobs=jobs, index=mods.get_mod_index())
+    print_download_results(results)
+
+
+@mod.command()
+@click.argument('mod', nargs=-1)
+@click.option('-a', '--all', is_flag=True,
+              help="Sync ALL online mods.  [default: installed or selected]")
+@click.option('-j', '--jobs', type=click.IntRange(1), default=mods.DOWNLOAD_JOBS, show_default=True,
+              help="Number of concurrent downloads.")
+def sync(mod, all, jobs):
+    """
+    Download changed Words of Power mods from wop.mod.io.
+
+    Only mods whose modfile changed since installation are downloaded.
+    """
+    index = mods.get_mod_index()
+    all_mods = mods.get_online_mods(index=index)
+    if index.offline:
+        console.log("[red]OFFLINE[/]: unable to sync mods")
         return
+    if all:
+        selected = all_mods
+    elif mod:
+        selected = [m for m in all_mods if m.name_id in mod or m.name in mod]
+    else:
+        selected = [m for m in all_mods if m.name_id in index.installed]
+
+    results, unchanged = mods.sync_mods(selected, jobs=jobs, index=index)
+    for m in unchanged:
+        console.log(f"[cyan]UNCHANGED MOD[/]: [bold cyan]{m.name}[/]")
+    print_download_results(results)
+
 
-    # selected mods
-    for mod_id in mod:
-        for m in all_mods:
-            if all or m.name_id == mod_id or m.name == mod_id:
-                do_dl(m)
-                break
+def print_download_results(results):
+    for m, error in results:
+        if error:
+            console.log(f"[red]FAILED MOD DOWNLOAD[/]: [bold cyan]{m.name}[/]: {error}")
         else:
-            console.log(f"[red]Mod not found[/] - [yellow]skipping[/]: {mod_id}")
+            console.log(f"[green]DOWNLOADED MOD[/]: [bold cyan]{m.name}[/] from {m.profile_url}")
 
 
 TEXNOMAGIC_CLI_COMMANDS = [mod]
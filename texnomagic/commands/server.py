@@ -1,15 +1,55 @@
 import click
 
 
+from texnomagic import lang
+from texnomagic import limits as limits_
 from texnomagic import server as server_
 
+
 @click.command()
 @click.argument('port', type=int, nargs=1, default=server_.DEFAULT_PORT)
-def server(port):
+@click.option('-p', '--spell-parser',
+              default=lang.SPELL_PARSER_DEFAULT, show_default=True,
+              type=click.Choice(lang.SPELL_PARSERS),
+              help="Spell parser")
+@click.option('-t', '--spell-table', type=int, default=0, show_default=True,
+              help="Use precomputed table of spells up to N tokens long "
+                   "built by `texnomagic spell table` (0 = disabled).")
+@click.option('-m', '--memory-budget', type=int, default=0, show_default=True,
+              help="Memory budget of loaded drawings in MB (0 = unlimited).")
+@click.option('-w', '--workers', type=int, default=0, show_default=True,
+              help="Serve using N pre-forked worker processes (0 = single process).")
+@click.option('--max-frame', type=click.IntRange(1), default=limits_.MAX_FRAME // 1024, show_default=True,
+              help="Maximum request size in kB.")
+@click.option('--max-batch', type=click.IntRange(1), default=limits_.MAX_BATCH, show_default=True,
+              help="Maximum number of requests in a batch.")
+@click.option('--max-connections', type=click.IntRange(1), default=limits_.MAX_CONNECTIONS, show_default=True,
+              help="Maximum number of open connections (per worker).")
+@click.option('--queue-timeout', type=float, default=limits_.QUEUE_TIMEOUT, show_default=True,
+              help="Maximum time in seconds a request waits for processing.")
+@click.option('--idle-timeout', type=float, default=limits_.IDLE_TIMEOUT, show_default=True,
+              help="Close connections idle for given time in seconds (0 = never).")
+@click.option('--read-timeout', type=float, default=limits_.READ_TIMEOUT, show_default=True,
+              help="Maximum time in seconds to read a request (0 = unlimited).")
+def server(port, spell_parser, spell_table, memory_budget, workers,
+           max_frame, max_batch, max_connections, queue_timeout,
+           idle_timeout, read_timeout):
     """
     Start TexnoMagic TCP server on PORT.
+
+    Requests are processed one at a time in each process,
+    use -w/--workers to process requests in parallel.
     """
-    server_.serve(port=port)
+    limits = limits_.TexnoMagicLimits(
+        max_frame=max_frame * 1024,
+        idle_timeout=idle_timeout,
+        read_timeout=read_timeout,
+        max_batch=max_batch,
+        max_connections=max_connections,
+        queue_timeout=queue_timeout)
+    server_.serve(port=port, spell_parser=spell_parser, spell_table=spell_table,
+                  memory_budget=memory_budget * 1024 * 1024, workers=workers,
+                  limits=limits)
 
 
 TEXNOMAGIC_CLI_COMMANDS = [server]
@@ -1,9 +1,13 @@
+from collections import deque
+
 import click
 from rich.syntax import Syntax
 
 from texnomagic import common
 from texnomagic import console
+from texnomagic import jsonio
 from texnomagic import lang
+from texnomagic import spelltable
 
 
 @click.group(name='spell')
@@ -15,18 +19,35 @@ def spell():
 
 
 @spell.command()
-@click.argument('spell', nargs=-1, required=True)
+@click.argument('spell', nargs=-1)
 @click.option('-f', '--format',
               default=common.DUMP_FORMAT_DEFAULT, show_default=True,
               type=click.Choice(common.DUMP_FORMATS),
               help="Output format")
+@click.option('-p', '--parser',
+              default=lang.SPELL_PARSER_DEFAULT, show_default=True,
+              type=click.Choice(lang.SPELL_PARSERS),
+              help="Spell parser")
+@click.option('-F', '--file', 'spells_file', type=click.File('r'),
+              help="Parse newline-delimited spells from file (- for stdin).")
+@click.option('-j', '--jobs', type=click.IntRange(1), default=1, show_default=True,
+              help="Number of parser processes. (in file mode)")
 @click.help_option('-h', '--help', help='Show command help.')
-def parse(spell, format):
+def parse(spell, format, parser, spells_file, jobs):
     """
     Parse a TexnoMagic Spell string.
+
+    Use -F/--file to parse newline-delimited spells from a file instead.
+    Results are printed as JSON lines in that case, one per input line.
     """
+    if spells_file:
+        return parse_file(spells_file, parser=parser, jobs=jobs)
+
+    if not spell:
+        raise click.UsageError("Pass a SPELL or use -F/--file.")
+
     text = " ".join(spell)
-    txlang = lang.TexnoMagicLanguage()
+    txlang = lang.TexnoMagicLanguage(parser=parser)
     try:
         out = txlang.parse(text)
     except Exception as e:
@@ -36,6 +57,32 @@ def parse(spell, format):
     common.pretty_print(out, format=format)
 
 
+def parse_file(spells_file, parser=lang.SPELL_PARSER_DEFAULT, jobs=1):
+    """
+    Parse newline-delimited spells from file and print results as JSON lines.
+    """
+    # line numbers of spells being parsed, bounded by parse_spells read-ahead
+    lines = deque()
+
+    def iter_spells():
+        # stream lines from file, skipping empty ones
+        for i, line in enumerate(spells_file, start=1):
+            text = line.rstrip('\r\n')
+            if text:
+                lines.append((i, text))
+                yield text
+
+    results = lang.parse_spells(iter_spells(), jobs=jobs, parser=parser)
+    for spell_, error in results:
+        i, text = lines.popleft()
+        r = {'line': i, 'spell': text}
+        if error:
+            r['error'] = error
+        else:
+            r['result'] = spell_
+        print(jsonio.dumps(r))
+
+
 @spell.command()
 @click.option('--ln/--no-ln', default=True, show_default=True,
               help="Show line numbers.")
@@ -50,4 +97,28 @@ def grammar(ln):
     console.print(syntax)
 
 
+@spell.command()
+@click.option('-n', '--max-tokens', type=int,
+              default=spelltable.SPELL_TABLE_MAX_TOKENS, show_default=True,
+              help="Maximal number of tokens (words) of spells in the table.")
+@click.option('--save/--no-save', default=True, show_default=True,
+              help="Save the table for use by server.")
+@click.help_option('-h', '--help', help='Show command help.')
+def table(max_tokens, save):
+    """
+    Build precomputed table of all TexnoMagic Spells.
+
+    All valid spells up to max tokens long are parsed and stored
+    for O(1) lookups (see `texnomagic server --spell-table`).
+    """
+    txtable = spelltable.TexnoMagicSpellTable(path=spelltable.SPELL_TABLE_PATH)
+    txtable.build(max_tokens=max_tokens)
+    console.print(f"[green]BUILT[/] spell table: {len(txtable)} spells, "
+                  f"{len(txtable.results)} unique results in {txtable.build_time:.2f} s")
+    if save:
+        txtable.save()
+        size = txtable.path.stat().st_size / 1024
+        console.print(f"[green]SAVED[/] spell table: {txtable.path} ({size:.0f} kB)")
+
+
 TEXNOMAGIC_CLI_COMMANDS = [spell]
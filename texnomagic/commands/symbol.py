@@ -132,7 +132,8 @@ def normalize(symbol):
     """
     _symbol = cli_common.get_symbol_or_fail(symbol)
     console.print(f"[green]NORMALIZING[/] symbol: {_symbol.pretty(drawings=True)}")
-    _symbol.normalize()
+    n = _symbol.normalize()
+    console.print(f"[green]NORMALIZED[/] [white]{n}[/] drawings (unchanged drawings skipped)")
 
 
 TEXNOMAGIC_CLI_COMMANDS = [symbol]
@@ -1,7 +1,6 @@
 import json
 import yaml
 import toml
-import numpy as np
 import os
 from pathlib import Path
 import re
@@ -9,6 +8,7 @@ import re
 from rich.syntax import Syntax
 
 from texnomagic import console
+from texnomagic import jsonio
 
 
 DUMP_FORMATS = ['toml', 'yaml', 'json']
@@ -44,6 +44,9 @@ DATA_PATH = get_data_path()
 USER_DATA_PATH = DATA_PATH / 'user'
 MODS_DATA_PATH = DATA_PATH / 'mods'
 EXPORT_PATH = DATA_PATH / 'export'
+THUMBS_PATH = DATA_PATH / 'thumbs'
+CACHE_PATH = DATA_PATH / 'cache'
+CATALOG_PATH = DATA_PATH / 'catalog'
 
 ALPHABETS_DIR = 'alphabets'
 ALPHABETS_PATHS = {
@@ -87,13 +90,14 @@ CORE_SYMBOLS_ORDER = [
     'slow',
     'homing',
 ]
+# precomputed ranks of core symbols by meaning
+CORE_SYMBOLS_RANK = {meaning: i for i, meaning in enumerate(CORE_SYMBOLS_ORDER)}
 
 
 class NumpyEncoder(json.JSONEncoder):
+    """JSON encoder of NumPy types, prefer [texnomagic.jsonio][]."""
     def default(self, obj):
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return json.JSONEncoder.default(self, obj)
+        return jsonio.default(obj)
 
 
 def int2bytes(x):
@@ -104,13 +108,49 @@ def bytes2int(b):
     return int.from_bytes(b, byteorder="little")
 
 
+def lookup_map(items, keys) -> dict:
+    """
+    Build a lookup map of items by multiple keys.
+
+    Args:
+        items: items to map
+        keys: function returning keys of an item
+
+    Returns:
+        a dict with a list of (unique) items for each key
+    """
+    m = {}
+    for item in items:
+        for key in set(keys(item)):
+            m.setdefault(key, []).append(item)
+    return m
+
+
+def symbols_rank(order=None) -> dict:
+    """
+    Get symbols rank map by meaning.
+
+    Custom `order` of meanings comes first followed by core symbols order
+    (`CORE_SYMBOLS_ORDER`). Unranked symbols should be sorted last.
+    """
+    if not order:
+        return CORE_SYMBOLS_RANK
+    rank = {}
+    for meaning in order:
+        rank.setdefault(meaning, len(rank))
+    n = len(rank)
+    for meaning, i in CORE_SYMBOLS_RANK.items():
+        rank.setdefault(meaning, n + i)
+    return rank
+
+
 def pretty_dumps(data, format=DUMP_FORMAT_DEFAULT, indent=2):
     if format == 'toml':
         return toml.dumps(data)
     if format == 'yaml':
         return yaml.safe_dump(data, indent=indent, sort_keys=False)
     else:
-        return json.dumps(data, indent=indent, sort_keys=False)
+        return jsonio.dumps(data, indent=indent)
 
 
 def pretty_print(data, format=DUMP_FORMAT_DEFAULT, **kwargs):
@@ -0,0 +1,80 @@
+"""
+TexnoMagic Drawing descriptors
+
+Cheap fixed-length descriptors of Drawings and Symbol models used to
+shortlist candidate Symbols before (expensive) full model scoring
+and for nearest-neighbour search over Drawings.
+"""
+import numpy as np
+
+from texnomagic.drawing import normalize_points, resample_polyline
+
+
+POINTS_RANGE = 1000.0
+GRID_SIZE = 8
+SEQUENCE_POINTS = 32
+# model density is sampled GRID_SUBSAMPLE x GRID_SUBSAMPLE times per grid cell
+GRID_SUBSAMPLE = 4
+
+
+def occupancy_grid(points : np.array, points_range : float = POINTS_RANGE, size : int = GRID_SIZE) -> np.array:
+    """
+    Coarse occupancy grid of (normalized) Drawing points.
+
+    Returns:
+        Flat array of `size * size` cell frequencies summing to 1
+        (all zeros for empty input).
+    """
+    if len(points) == 0:
+        return np.zeros(size * size)
+    grid, _, _ = np.histogram2d(
+        points[:, 0], points[:, 1],
+        bins=size, range=[[0, points_range], [0, points_range]])
+    grid = grid.ravel()
+    return grid / grid.sum()
+
+
+def model_grid(gmm, points_range : float = POINTS_RANGE, size : int = GRID_SIZE) -> np.array:
+    """
+    Coarse occupancy grid of a GMM symbol model.
+
+    Model density is integrated over each grid cell numerically so the result
+    is directly comparable to [occupancy_grid][texnomagic.descriptor.occupancy_grid].
+    """
+    n = size * GRID_SUBSAMPLE
+    step = points_range / n
+    c = (np.arange(n) + 0.5) * step
+    xx, yy = np.meshgrid(c, c, indexing='ij')
+    samples = np.column_stack((xx.ravel(), yy.ravel()))
+    density = np.exp(gmm.score_samples(samples)).reshape(n, n)
+    # sum sub-samples into grid cells
+    grid = density.reshape(size, GRID_SUBSAMPLE, size, GRID_SUBSAMPLE).sum(axis=(1, 3))
+    grid = grid.ravel()
+    total = grid.sum()
+    if total <= 0:
+        return np.full(size * size, 1.0 / (size * size))
+    return grid / total
+
+
+def grid_similarity(grids : np.array, grid : np.array) -> np.array:
+    """
+    Bhattacharyya coefficient between each row of `grids` and `grid`.
+
+    Returns values in <0, 1> range, 1 meaning identical distributions.
+    """
+    return np.sqrt(grids) @ np.sqrt(grid)
+
+
+def point_sequence(points : np.array, points_range : float = POINTS_RANGE, n : int = SEQUENCE_POINTS) -> np.array:
+    """
+    Normalized Drawing points resampled into n points along their arc length.
+
+    Curves are joined in drawing order.
+
+    Returns:
+        Flat array of `2 * n` coordinates in <0, 1> range.
+    """
+    if len(points) == 0:
+        return np.zeros(2 * n)
+    points = normalize_points(points, points_range)
+    return resample_polyline(points, n).ravel() / points_range
@@ -1,9 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
 import csv
+import hashlib
 import itertools
 import math
 import numpy as np
 import numpy.typing as npt
 
+from texnomagic import ex
+from texnomagic import memory
+
+
+# params of TexnoMagicDrawing.preprocessed
+PREPROCESS_PARAMS = ['resample', 'simplify']
+
 
 class TexnoMagicDrawing:
     """TexnoMagic Drawing is a set of 2D curves defined by points.
@@ -23,9 +32,22 @@ class TexnoMagicDrawing:
 
     `self.path` is a path of Drawing data CSV file.
 
+    Points of many Drawings can be packed into a columnar
+    [store][texnomagic.store.TexnoMagicDrawingStore] in which case
+    the Drawing is only a view into the store.
+
+    Points loaded from file can be released when memory budget is
+    exceeded and reloaded on next access, see [texnomagic.memory][].
+
     This class provides convenient utilities for working with Drawings,
     see individual methods.
     """
+    __slots__ = (
+        'path', 'points_range',
+        '_curves', '_points', '_file_size', '_preprocessed',
+        '_store', '_store_index',
+        '__weakref__',
+    )
 
     def __init__(self, path=None, curves=None, points_range=1000.0):
         self.path = path
@@ -33,6 +55,9 @@ class TexnoMagicDrawing:
         self._curves = None
         self._points = None
         self._file_size = None
+        self._preprocessed = None
+        self._store = None
+        self._store_index = None
         if curves:
             self.set_curves(curves)
 
@@ -41,18 +66,36 @@ class TexnoMagicDrawing:
         """Individual curves (lists of points).
 
         Lazy loaded on-demand."""
-        if self._curves is None:
-            self.load_curves()
-        return self._curves
+        curves = self._curves
+        if curves is None:
+            if self._store is not None:
+                return self._store.drawing_curves(self._store_index)
+            # loaded curves may already be evicted by another thread
+            return self.load_curves()[1]
+        tracker = memory.tracker
+        if tracker is not None:
+            tracker.touch(self)
+        return curves
 
     @property
     def points(self) -> np.array:
         """All points from all curves.
 
         Lazy loaded on-demand."""
-        if self._points is None:
-            self.load_curves()
-        return self._points
+        points = self._points
+        if points is None:
+            if self._store is not None:
+                return self._store.drawing_points(self._store_index)
+            return self.load_curves()[0]
+        tracker = memory.tracker
+        if tracker is not None:
+            tracker.touch(self)
+        return points
+
+    @property
+    def loaded(self) -> bool:
+        """Are Drawing points loaded (or packed in a store)?"""
+        return self._points is not None or self._store is not None
 
     @property
     def name(self) -> str | None:
@@ -72,21 +115,82 @@ class TexnoMagicDrawing:
             self._file_size = self.path.stat().st_size
         return self._file_size
 
+    def content_hash(self) -> str:
+        """Hash of Drawing content (curves and points range).
+
+        Drawings with identical curves have identical hash regardless of path."""
+        h = hashlib.sha1()
+        h.update(np.float64(self.points_range).tobytes())
+        h.update(np.array([len(c) for c in self.curves], dtype=np.int64).tobytes())
+        h.update(np.ascontiguousarray(self.points, dtype=np.float64).tobytes())
+        return h.hexdigest()
+
     def set_curves(self, curves):
         """Assign curves.
 
         Converts to a single numpy.array points with curves being views
-        into the array for fast processing."""
+        into the array for fast processing.
+
+        Detaches the Drawing from its store (if any).
+
+        Returns:
+            assigned (points, curves) tuple"""
+        self._changed()
+        self._store = None
+        self._store_index = None
         # keep all points in single continuous numpy array
-        self._points = np.array(list(itertools.chain(*curves)), dtype=np.float64)
-        self._curves = []
+        points = np.array(list(itertools.chain(*curves)), dtype=np.float64)
+        views = []
         i = 0
         for curve in curves:
             n = len(curve)
             # curves are numpy views into main points array
-            cview = self._points[i:i+n]
-            self._curves.append(cview)
+            views.append(points[i:i+n])
             i += n
+        self._points = points
+        self._curves = views
+        return points, views
+
+    def attach_store(self, store, index : int):
+        """Turn the Drawing into a view of index-th Drawing in store.
+
+        See [texnomagic.store.pack_drawings][]."""
+        self._changed()
+        self._store = store
+        self._store_index = index
+        self._points = None
+        self._curves = None
+
+    def release(self, packed=False):
+        """Release points loaded from file, they are reloaded on next access.
+
+        Drawings packed in a store are only released when `packed`
+        (in-place changes of their points are lost)."""
+        if not self.path or (self._store is not None and not packed):
+            return
+        self._store = None
+        self._store_index = None
+        self._points = None
+        self._curves = None
+        self._preprocessed = None
+
+    def _changed(self):
+        """Drop cached data and stop tracking memory of modified drawing."""
+        self._preprocessed = None
+        tracker = memory.tracker
+        if tracker is not None:
+            tracker.forget(self)
+
+    def __getstate__(self):
+        state = {k: getattr(self, k) for k in self.__slots__ if k != '__weakref__'}
+        if self._store is not None:
+            # only pickle own points, not the whole store
+            state.update(_points=self.points, _curves=self.curves, _store=None, _store_index=None)
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
 
     def load(self, path=None):
         # this is only kept for consistence with symbol and abc
@@ -95,7 +199,10 @@ class TexnoMagicDrawing:
         return self
 
     def load_curves(self):
-        """Load Drawing curves from file."""
+        """Load Drawing curves from file.
+
+        Returns:
+            loaded (points, curves) tuple"""
         curves = []
         curve = []
         with self.path.open('r') as f:
@@ -109,7 +216,11 @@ class TexnoMagicDrawing:
                 point = list(map(float, row[:2]))
                 curve.append(point)
         curves.append(curve)
-        self.set_curves(curves)
+        points, curves = self.set_curves(curves)
+        tracker = memory.tracker
+        if tracker is not None:
+            tracker.touch(self, points.nbytes)
+        return points, curves
 
     def save(self):
         """Save drawing to CSV file specified by self.path."""
@@ -131,17 +242,66 @@ class TexnoMagicDrawing:
 
         See also [curves_fit_area][texnomagic.drawing.TexnoMagicDrawing.curves_fit_area].
         """
-        if len(self.points) == 0:
+        points = self.points
+        if len(points) == 0:
             return
 
-        # move to [0,0]
-        self._points -= np.min(self.points, axis=0)
-        # normalize
-        k = self.points_range / np.max((np.max(np.max(self._points, axis=0)), 0.2))
-        self._points *= k
-        # center
-        offset = (self.points_range - np.max(self._points, axis=0)) / 2
-        self._points += offset
+        points[:] = normalize_points(points, self.points_range)
+        self._changed()
+
+    def resample(self, spacing : float):
+        """
+        Resample curves in-place into points equally spaced along their arc length.
+
+        Removes (near) duplicate points produced by high-rate input devices.
+
+        Args:
+            spacing: desired distance between points
+        """
+        curves = []
+        for curve in self.curves:
+            if len(curve) < 2:
+                curves.append(curve)
+                continue
+            length = np.sum(np.linalg.norm(np.diff(curve, axis=0), axis=1))
+            n = max(math.ceil(length / spacing) + 1, 2)
+            curves.append(resample_polyline(curve, n))
+        self.set_curves(curves)
+
+    def simplify(self, epsilon : float):
+        """
+        Simplify curves in-place using Ramer-Douglas-Peucker algorithm.
+
+        Args:
+            epsilon: maximal distance of removed points from simplified curve
+        """
+        self.set_curves([simplify_polyline(c, epsilon) for c in self.curves])
+
+    def preprocessed(self, resample : float | None = None, simplify : float | None = None) -> 'TexnoMagicDrawing':
+        """
+        Return a preprocessed copy of the Drawing.
+
+        See [resample][texnomagic.drawing.TexnoMagicDrawing.resample]
+        and [simplify][texnomagic.drawing.TexnoMagicDrawing.simplify].
+
+        Last result is cached so that scoring a Drawing using many models
+        with the same preprocessing only preprocesses once.
+        """
+        key = (resample, simplify)
+        if self._preprocessed is not None and self._preprocessed[0] == key:
+            return self._preprocessed[1]
+        d = TexnoMagicDrawing(path=self.path, points_range=self.points_range)
+        d.set_curves([c.copy() for c in self.curves])
+        if resample:
+            d.resample(resample)
+        if simplify:
+            d.simplify(simplify)
+        self._preprocessed = (key, d)
+        return d
+
+    def clear_preprocessed(self):
+        """Drop cached preprocessed copy of the Drawing."""
+        self._preprocessed = None
 
     def curves_fit_area(self, pos : tuple[float, float] | npt.ArrayLike, size : tuple[float, float] | npt.ArrayLike) -> list[npt.ArrayLike]:
         """
@@ -181,7 +341,9 @@ class TexnoMagicDrawing:
 
         Useful for compatibility with systems that use different Y axis sign.
         """
-        self._points[:,1] = self.points_range - self._points[:,1]
+        points = self.points
+        points[:,1] = self.points_range - points[:,1]
+        self._changed()
 
     def delete(self):
         """Delete the Drawing file."""
@@ -201,11 +363,156 @@ class TexnoMagicDrawing:
         return s
 
     def __str__(self) -> str:
-        if self._curves is None:
+        if not self.loaded:
             info = "curves not loaded"
         else:
-            info = f"{len(self._points)} points, {len(self._curves)} curves"
+            info = f"{len(self.points)} points, {len(self.curves)} curves"
         return f"{self.name}: {info}"
 
     def __repr__(self) -> str:
         return '<TexnoMagicSymbol %s>' % self.__str__()
+
+
+def normalize_points(points : np.array, points_range : float = 1000.0) -> np.array:
+    """
+    Return points normalized into <0, points_range> range.
+
+    See [TexnoMagicDrawing.normalize][texnomagic.drawing.TexnoMagicDrawing.normalize].
+    """
+    # move to [0,0]
+    points = points - np.min(points, axis=0)
+    # normalize
+    k = points_range / np.max((np.max(np.max(points, axis=0)), 0.2))
+    points *= k
+    # center
+    offset = (points_range - np.max(points, axis=0)) / 2
+    points += offset
+    return points
+
+
+def check_preprocess(preprocess : dict | None) -> dict:
+    """
+    Check drawings preprocessing params.
+
+    See [texnomagic.drawing.TexnoMagicDrawing.preprocessed][].
+
+    Raises:
+        ex.InvalidInput: on unknown param or invalid value
+    """
+    if not preprocess:
+        return {}
+    if not isinstance(preprocess, dict):
+        raise ex.InvalidInput("invalid preprocess params: %s" % preprocess)
+    for key, value in preprocess.items():
+        if key not in PREPROCESS_PARAMS:
+            raise ex.InvalidInput("invalid preprocess param: %s (valid: %s)" % (
+                key, ', '.join(PREPROCESS_PARAMS)))
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+            raise ex.InvalidInput("invalid preprocess %s value: %s" % (key, value))
+    return preprocess
+
+
+def normalize_drawings(drawings : list[TexnoMagicDrawing], atol : float = 1e-6) -> list[TexnoMagicDrawing]:
+    """
+    Normalize many Drawings in-place at once.
+
+    All points are processed in a single concatenated buffer using
+    per-drawing segment offsets (`np.minimum.reduceat` and friends) which is
+    equivalent to calling
+    [TexnoMagicDrawing.normalize][texnomagic.drawing.TexnoMagicDrawing.normalize]
+    on each Drawing, only much faster for many Drawings.
+
+    Args:
+        drawings: Drawings to normalize
+        atol: maximal point difference of unchanged Drawings
+
+    Returns:
+        A list of Drawings changed by normalization.
+    """
+    drawings = [d for d in drawings if len(d.points) > 0]
+    if not drawings:
+        return []
+    sizes = np.array([len(d.points) for d in drawings])
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    points = np.concatenate([d.points for d in drawings])
+    points_range = np.array([d.points_range for d in drawings])
+
+    # move to [0,0]
+    mins = np.minimum.reduceat(points, offsets, axis=0)
+    norm = points - np.repeat(mins, sizes, axis=0)
+    # normalize
+    maxs = np.maximum.reduceat(norm, offsets, axis=0)
+    k = points_range / np.maximum(np.max(maxs, axis=1), 0.2)
+    norm *= np.repeat(k, sizes)[:, None]
+    # center
+    offset = (points_range[:, None] - maxs * k[:, None]) / 2
+    norm += np.repeat(offset, sizes, axis=0)
+
+    diff = np.maximum.reduceat(np.max(np.abs(norm - points), axis=1), offsets)
+    changed = []
+    for d, i, n, dd in zip(drawings, offsets, sizes, diff):
+        if dd > atol:
+            d.points[:] = norm[i:i+n]
+            d._changed()
+            changed.append(d)
+    return changed
+
+
+def save_drawings(drawings : list[TexnoMagicDrawing], jobs : int | None = None):
+    """
+    Save many Drawings in parallel.
+
+    Args:
+        drawings: Drawings to save
+        jobs: number of parallel writers (default: `ThreadPoolExecutor` default)
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        # consume results to propagate exceptions
+        list(pool.map(TexnoMagicDrawing.save, drawings))
+
+
+def resample_polyline(points : np.array, n : int) -> np.array:
+    """
+    Resample a polyline into n points equally spaced along its arc length.
+    """
+    if len(points) == 0:
+        return np.zeros((n, 2))
+    seg = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    dist = np.concatenate(([0.0], np.cumsum(seg)))
+    if dist[-1] <= 0:
+        return np.repeat(points[:1], n, axis=0)
+    t = np.linspace(0.0, dist[-1], n)
+    return np.column_stack([np.interp(t, dist, points[:, i]) for i in range(points.shape[1])])
+
+
+def simplify_polyline(points : np.array, epsilon : float) -> np.array:
+    """
+    Simplify a polyline using Ramer-Douglas-Peucker algorithm.
+
+    Distances of all points in a segment are computed at once using NumPy.
+    """
+    n = len(points)
+    if n < 3:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a = points[first]
+        ab = points[last] - a
+        ap = points[first + 1:last] - a
+        norm = np.hypot(*ab)
+        if norm > 0:
+            dist = np.abs(ab[0] * ap[:, 1] - ab[1] * ap[:, 0]) / norm
+        else:
+            dist = np.hypot(ap[:, 0], ap[:, 1])
+        i = np.argmax(dist)
+        if dist[i] > epsilon:
+            mid = first + 1 + i
+            keep[mid] = True
+            stack.append((first, mid))
+            stack.append((mid, last))
+    return points[keep]
@@ -18,6 +18,14 @@ class InvalidInput(TexnoMagicException):
     returncode = 11
 
 
+class AmbiguousAlphabet(TexnoMagicException):
+    returncode = 12
+
+
+class AmbiguousSymbol(TexnoMagicException):
+    returncode = 13
+
+
 class NotFound(TexnoMagicException):
     returncode = 30
 
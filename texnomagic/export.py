@@ -0,0 +1,304 @@
+"""
+TexnoMagic alphabet export
+
+Directories are exported into zip archives compatible with
+`shutil.make_archive` but faster:
+
+* files are compressed in parallel (`zlib` releases the GIL)
+* compressed entries of unchanged files are copied from previous archive
+  without recompression (see `export_zip` `previous` argument)
+* already compressed assets (PNG images) are stored uncompressed
+
+Each entry is compressed in memory before it's written so sizes and CRC
+are known in advance and the archive can be streamed into a non-seekable
+output such as stdout or a socket.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import struct
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+
+
+EXPORT_JOBS = 4
+EXPORT_LEVEL = 6
+# files with these extensions are already compressed
+STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gz', '.zip'}
+
+ZIP_VERSION = 20
+# created by UNIX (for file permissions in external attributes)
+ZIP_CREATE_SYSTEM = 3
+ZIP_FLAG_ENCRYPTED = 0x1
+ZIP_FLAG_UTF8 = 0x800
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+LOCAL_HEADER_SIG = 0x04034b50
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+CENTRAL_HEADER_SIG = 0x02014b50
+END_RECORD = struct.Struct('<IHHHHIIH')
+END_RECORD_SIG = 0x06054b50
+
+
+class TexnoMagicZipWriter:
+    """
+    Minimal zip writer of precompressed entries.
+
+    Only needs `write()` on output file so it works with pipes and sockets.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        self.entries = []
+
+    def add(self, name, raw, crc, size, method, date_time, mode):
+        """Add an entry with `raw` (compressed) data."""
+        if self.offset + len(raw) > ZIP_MAX_SIZE or size > ZIP_MAX_SIZE:
+            raise ValueError("zip64 archives aren't supported: %s" % name)
+        name_bytes, flags = encode_name(name)
+        dos_time, dos_date = dos_date_time(date_time)
+        header = LOCAL_HEADER.pack(
+            LOCAL_HEADER_SIG, ZIP_VERSION, flags, method, dos_time, dos_date,
+            crc, len(raw), size, len(name_bytes), 0)
+        self.entries.append((
+            name_bytes, flags, method, dos_time, dos_date,
+            crc, len(raw), size, mode, self.offset))
+        self._write(header)
+        self._write(name_bytes)
+        self._write(raw)
+
+    def close(self):
+        """Write central directory."""
+        cd_offset = self.offset
+        for name_bytes, flags, method, dos_time, dos_date, crc, csize, size, mode, offset in self.entries:
+            attrs = (mode & 0xFFFF) << 16
+            if name_bytes.endswith(b'/'):
+                # MS-DOS directory flag
+                attrs |= 0x10
+            self._write(CENTRAL_HEADER.pack(
+                CENTRAL_HEADER_SIG, ZIP_CREATE_SYSTEM << 8 | ZIP_VERSION, ZIP_VERSION,
+                flags, method, dos_time, dos_date, crc, csize, size,
+                len(name_bytes), 0, 0, 0, 0, attrs, offset))
+            self._write(name_bytes)
+        n = len(self.entries)
+        self._write(END_RECORD.pack(
+            END_RECORD_SIG, 0, 0, n, n, self.offset - cd_offset, cd_offset, 0))
+        self.f.flush()
+
+    def _write(self, data):
+        self.f.write(data)
+        self.offset += len(data)
+
+
+class PreviousZip:
+    """
+    Previous archive to copy compressed entries from.
+    """
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path)
+        self.infos = {i.filename: i for i in self.zip.infolist()}
+        self.f = open(path, 'rb')
+        self._lock = threading.Lock()
+
+    def get(self, name, size, date_time, method):
+        """Get matching entry info or None."""
+        info = self.infos.get(name)
+        if (not info
+                or info.file_size != size
+                or info.date_time != date_time
+                or info.flag_bits & ZIP_FLAG_ENCRYPTED
+                or info.compress_type not in (zipfile.ZIP_STORED, method)):
+            return None
+        return info
+
+    def read_raw(self, info):
+        """Read raw (compressed) data of an entry."""
+        with self._lock:
+            self.f.seek(info.header_offset)
+            header = self.f.read(LOCAL_HEADER.size)
+            fields = LOCAL_HEADER.unpack(header)
+            if fields[0] != LOCAL_HEADER_SIG:
+                raise zipfile.BadZipFile("bad local header: %s" % info.filename)
+            self.f.seek(fields[-2] + fields[-1], os.SEEK_CUR)
+            return self.f.read(info.compress_size)
+
+    def close(self):
+        self.f.close()
+        self.zip.close()
+
+
+def export_zip(
+        path,
+        out,
+        previous=None,
+        jobs=EXPORT_JOBS,
+        level=EXPORT_LEVEL,
+        store_exts=STORED_EXTENSIONS,
+        verify=True,
+        progress=None):
+    """
+    Export directory at path into a zip archive.
+
+    Archive contains the directory itself (like `shutil.make_archive`
+    with `base_dir`).
+
+    Args:
+        out: output zip path or a binary file-like object (or a socket)
+            to stream the archive into
+        previous: previous archive to reuse unchanged entries from,
+            defaults to existing archive at `out` path
+        jobs: number of compression threads
+        verify: check CRC of unchanged files (size and mtime match)
+            before reusing, otherwise size and mtime are trusted
+        progress: optional progress(fraction) callback
+
+    Returns:
+        export stats dict: number of `files`, `reused`, `compressed`,
+        and `stored` entries and archive `size` in bytes
+    """
+    path = Path(path)
+    entries = list(iter_entries(path))
+    stats = {'files': 0, 'reused': 0, 'compressed': 0, 'stored': 0, 'size': 0}
+
+    tmp = None
+    if isinstance(out, (str, Path)):
+        out = Path(out)
+        if previous is None and out.exists():
+            previous = out
+        out.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=out.parent, prefix='.export-', suffix='.zip')
+        f = os.fdopen(fd, 'wb')
+    elif hasattr(out, 'sendall'):
+        f = out.makefile('wb')
+    else:
+        f = out
+
+    prev = None
+    if previous:
+        try:
+            prev = PreviousZip(previous)
+        except (OSError, zipfile.BadZipFile):
+            prev = None
+
+    def pack(entry):
+        return pack_entry(entry, prev=prev, level=level, store_exts=store_exts, verify=verify)
+
+    try:
+        writer = TexnoMagicZipWriter(f)
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            # bounded window of pending entries keeps memory in check
+            todo = iter(entries)
+            pending = deque(pool.submit(pack, e) for _, e in zip(range(4 * max(jobs, 1)), todo))
+            done = 0
+            while pending:
+                name, raw, crc, size, method, date_time, mode, how = pending.popleft().result()
+                entry = next(todo, None)
+                if entry:
+                    pending.append(pool.submit(pack, entry))
+                writer.add(name, raw, crc, size, method, date_time, mode)
+                if how:
+                    stats['files'] += 1
+                    stats[how] += 1
+                done += 1
+                if progress:
+                    progress(done / len(entries))
+        writer.close()
+        stats['size'] = writer.offset
+    except BaseException:
+        if tmp:
+            f.close()
+            os.unlink(tmp)
+        raise
+    finally:
+        if prev:
+            prev.close()
+    if tmp:
+        f.close()
+        os.replace(tmp, out)
+    elif f is not out:
+        f.close()
+    return stats
+
+
+def iter_entries(path):
+    """
+    Yield (arcname, path) of all entries to export in a stable order.
+    """
+    base = path.parent
+    yield path.name + '/', path
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        root = Path(root)
+        for name in sorted(files):
+            p = root / name
+            yield p.relative_to(base).as_posix(), p
+        for name in dirs:
+            p = root / name
+            yield p.relative_to(base).as_posix() + '/', p
+
+
+def pack_entry(entry, prev=None, level=EXPORT_LEVEL, store_exts=STORED_EXTENSIONS, verify=True):
+    """
+    Compress a single entry or reuse it from previous archive.
+
+    Returns:
+        (name, raw, crc, size, method, date_time, mode, how) tuple
+        where `how` is 'reused', 'compressed', 'stored', or None for dirs
+    """
+    name, path = entry
+    st = path.stat()
+    date_time = zip_date_time(st.st_mtime)
+    if name.endswith('/'):
+        return name, b'', 0, 0, zipfile.ZIP_STORED, date_time, st.st_mode, None
+
+    if path.suffix.lower() in store_exts:
+        method = zipfile.ZIP_STORED
+    else:
+        method = zipfile.ZIP_DEFLATED
+
+    data = None
+    info = prev and prev.get(name, st.st_size, date_time, method)
+    if info and verify:
+        data = path.read_bytes()
+        if zlib.crc32(data) != info.CRC:
+            info = None
+    if info:
+        raw = prev.read_raw(info)
+        return name, raw, info.CRC, info.file_size, info.compress_type, date_time, st.st_mode, 'reused'
+
+    if data is None:
+        data = path.read_bytes()
+    crc = zlib.crc32(data)
+    if method == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        raw = compressor.compress(data) + compressor.flush()
+        if len(raw) < len(data):
+            return name, raw, crc, len(data), method, date_time, st.st_mode, 'compressed'
+    return name, data, crc, len(data), zipfile.ZIP_STORED, date_time, st.st_mode, 'stored'
+
+
+def zip_date_time(mtime):
+    """Convert mtime into zip (local) date time tuple with 2 s resolution."""
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec - t.tm_sec % 2)
+
+
+def dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_time, dos_date
+
+
+def encode_name(name):
+    try:
+        return name.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return name.encode('utf-8'), ZIP_FLAG_UTF8
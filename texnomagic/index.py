@@ -0,0 +1,260 @@
+"""
+TexnoMagic Alphabet Drawings index
+
+Fixed-length descriptors of all Alphabet Drawings
+(see [texnomagic.descriptor.point_sequence][]) stored with the Alphabet
+and queryable using vectorized k-nearest-neighbours search.
+
+Saved index stores a stamp of indexed Drawings files
+(see [drawings_stamp][texnomagic.index.drawings_stamp]) and it's only
+loaded when Drawings didn't change since.
+
+This provides a fast secondary recognizer as well as duplicate
+and outlier Drawings detection.
+"""
+import hashlib
+import time
+
+import numpy as np
+
+from texnomagic import descriptor
+from texnomagic.catalog import stat_stamp
+
+
+INDEX_FILE = 'texno_index.npz'
+
+# number of rows processed at once in all-pairs queries
+CHUNK_SIZE = 1024
+
+
+class TexnoMagicDrawingIndex:
+    """
+    Index of Alphabet Drawings descriptors for k-NN queries.
+
+    Index has:
+
+    * `path`: path to index file
+    * `descriptors`: 2D array of Drawing descriptors (one per row)
+    * `symbols`: Symbol meaning for each row
+    * `drawings`: Drawing file name for each row
+    * `stamp`: stamp of indexed Drawings files
+
+    Distances are root mean square distances of corresponding resampled
+    points relative to points range (`0.01` = 1% of Drawing size).
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.descriptors = np.zeros((0, 2 * descriptor.SEQUENCE_POINTS))
+        self.symbols = np.array([], dtype=str)
+        self.drawings = np.array([], dtype=str)
+        self.stamp = ''
+        self.build_time = None
+
+    def __len__(self):
+        return len(self.descriptors)
+
+    @property
+    def n_points(self) -> int:
+        """Number of resampled points per descriptor."""
+        return self.descriptors.shape[1] // 2
+
+    def build(self, abc):
+        """Build index from all Alphabet Drawings."""
+        start = time.perf_counter()
+        descs, symbols, drawings = [], [], []
+        for symbol in abc.symbols:
+            for drawing in symbol.drawings:
+                if len(drawing.points) == 0:
+                    continue
+                descs.append(descriptor.point_sequence(drawing.points, drawing.points_range))
+                symbols.append(symbol.meaning)
+                drawings.append(drawing.name)
+        if descs:
+            self.descriptors = np.stack(descs)
+        else:
+            self.descriptors = np.zeros((0, 2 * descriptor.SEQUENCE_POINTS))
+        self.symbols = np.array(symbols, dtype=str)
+        self.drawings = np.array(drawings, dtype=str)
+        self.stamp = drawings_stamp(abc)
+        self.build_time = time.perf_counter() - start
+        return self
+
+    def save(self):
+        """Save index into its path.
+
+        [!] Overwrites existing data!
+        """
+        with self.path.open('wb') as f:
+            np.savez(f,
+                     descriptors=self.descriptors,
+                     symbols=self.symbols,
+                     drawings=self.drawings,
+                     stamp=np.array(self.stamp))
+
+    def load(self, path=None, stamp=None):
+        """
+        Load index from path.
+
+        When `stamp` is supplied, index is only loaded when it matches
+        stamp of the saved index (see [drawings_stamp][texnomagic.index.drawings_stamp]).
+
+        Returns:
+            True when index was loaded.
+        """
+        if path:
+            self.path = path
+        if not self.path.exists():
+            return False
+        with np.load(self.path) as data:
+            # indexes saved by older versions have no stamp
+            saved_stamp = str(data['stamp']) if 'stamp' in data else ''
+            if stamp is not None and saved_stamp != stamp:
+                return False
+            self.descriptors = data['descriptors']
+            self.symbols = data['symbols']
+            self.drawings = data['drawings']
+            self.stamp = saved_stamp
+        return True
+
+    def distances(self, descs : np.array) -> np.array:
+        """
+        Distances between rows of descs and all indexed descriptors.
+
+        Returns:
+            2D array of shape (len(descs), len(index)).
+        """
+        d2 = (np.sum(descs ** 2, axis=1)[:, None]
+              + np.sum(self.descriptors ** 2, axis=1)[None, :]
+              - 2.0 * descs @ self.descriptors.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2 / self.n_points)
+
+    def query(self, drawing, k : int = 5) -> tuple[np.array, np.array]:
+        """
+        Find k nearest indexed Drawings.
+
+        Returns:
+            (indices, distances) arrays sorted by distance.
+        """
+        if not len(self):
+            return np.array([], dtype=int), np.array([])
+        desc = descriptor.point_sequence(drawing.points, drawing.points_range, n=self.n_points)
+        dist = self.distances(desc[None, :])[0]
+        k = min(k, len(dist))
+        idx = np.argpartition(dist, k - 1)[:k]
+        idx = idx[np.argsort(dist[idx], kind='stable')]
+        return idx, dist[idx]
+
+    def knn(self, drawing, k : int = 5) -> list[tuple[str, str, float]]:
+        """
+        Find k nearest indexed Drawings.
+
+        Returns:
+            A list of (symbol meaning, drawing name, distance) tuples.
+        """
+        idx, dist = self.query(drawing, k=k)
+        return [(str(self.symbols[i]), str(self.drawings[i]), float(d))
+                for i, d in zip(idx, dist)]
+
+    def recognize(self, drawing, k : int = 5) -> list[tuple[str, float]]:
+        """
+        Recognize a Drawing by distance-weighted vote of k nearest Drawings.
+
+        Returns:
+            A list of (symbol meaning, score) tuples ordered by score,
+            scores are in <0, 1> range and sum to 1.
+        """
+        idx, dist = self.query(drawing, k=k)
+        if not len(idx):
+            return []
+        weights = 1.0 / (dist + 1e-3)
+        votes = {}
+        for i, w in zip(idx, weights):
+            meaning = str(self.symbols[i])
+            votes[meaning] = votes.get(meaning, 0.0) + w
+        total = weights.sum()
+        r = [(m, float(w / total)) for m, w in votes.items()]
+        return sorted(r, key=lambda x: x[1], reverse=True)
+
+    def self_knn(self, k : int = 5) -> tuple[np.array, np.array]:
+        """
+        Find k nearest neighbours of every indexed Drawing (excluding itself).
+
+        Processed in chunks to bound memory use.
+
+        Returns:
+            (indices, distances) 2D arrays of shape (len(index), k).
+        """
+        n = len(self)
+        k = min(k, n - 1)
+        if k <= 0:
+            return np.zeros((n, 0), dtype=int), np.zeros((n, 0))
+        all_idx = np.empty((n, k), dtype=int)
+        all_dist = np.empty((n, k))
+        for start in range(0, n, CHUNK_SIZE):
+            stop = min(start + CHUNK_SIZE, n)
+            dist = self.distances(self.descriptors[start:stop])
+            # exclude self
+            rows = np.arange(stop - start)
+            dist[rows, rows + start] = np.inf
+            idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            d = np.take_along_axis(dist, idx, axis=1)
+            order = np.argsort(d, axis=1, kind='stable')
+            all_idx[start:stop] = np.take_along_axis(idx, order, axis=1)
+            all_dist[start:stop] = np.take_along_axis(d, order, axis=1)
+        return all_idx, all_dist
+
+    def duplicates(self, threshold : float = 0.005) -> list[tuple[str, str, float]]:
+        """
+        Find (near) duplicate Drawings.
+
+        Args:
+            threshold: maximum distance of duplicates
+
+        Returns:
+            A list of (drawing name, drawing name, distance) tuples.
+        """
+        idx, dist = self.self_knn(k=1)
+        dups = []
+        for i, (j, d) in enumerate(zip(idx[:, 0], dist[:, 0])):
+            if i < j and d <= threshold:
+                dups.append((str(self.drawings[i]), str(self.drawings[j]), float(d)))
+        return dups
+
+    def outliers(self, k : int = 5, min_ratio : float = 0.5) -> list[tuple[str, str, float]]:
+        """
+        Find outlier Drawings - Drawings whose nearest neighbours mostly
+        belong to other Symbols.
+
+        Args:
+            k: number of nearest neighbours to consider
+            min_ratio: minimal ratio of foreign neighbours to report
+
+        Returns:
+            A list of (symbol meaning, drawing name, foreign ratio)
+            tuples ordered by foreign ratio.
+        """
+        idx, _ = self.self_knn(k=k)
+        if not idx.shape[1]:
+            return []
+        foreign = (self.symbols[idx] != self.symbols[:, None]).mean(axis=1)
+        r = [(str(self.symbols[i]), str(self.drawings[i]), float(foreign[i]))
+             for i in np.flatnonzero(foreign >= min_ratio)]
+        return sorted(r, key=lambda x: x[2], reverse=True)
+
+    def __repr__(self):
+        return '<TexnoMagicDrawingIndex: %d drawings @ %s>' % (len(self), self.path)
+
+
+def drawings_stamp(abc) -> str:
+    """
+    Stamp of all Alphabet Drawings files.
+
+    Changes when Drawings are added, removed, or modified.
+    """
+    h = hashlib.sha1()
+    for symbol in abc.symbols:
+        for drawing in symbol.drawings:
+            stamp = stat_stamp(drawing.path) if drawing.path else None
+            h.update(repr((symbol.meaning, drawing.name, stamp)).encode('utf-8'))
+    return h.hexdigest()
@@ -0,0 +1,126 @@
+"""
+TexnoMagic background jobs
+
+Slow operations (network I/O, compression) are run in a worker pool
+so that they don't block the server. Each job has an id which can be used
+to query its status, progress, and result.
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import logging
+import threading
+import time
+
+
+JOBS_WORKERS = 2
+# maximum number of finished jobs remembered
+JOBS_KEEP = 256
+
+JOB_STATUSES = ['queued', 'running', 'done', 'failed']
+
+
+class TexnoMagicJob:
+    """
+    A background job.
+
+    Job function receives the job as first argument and can report
+    its progress using [update][texnomagic.jobs.TexnoMagicJob.update].
+    """
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def update(self, progress=None, message=None):
+        """Report job progress in <0, 1> range and/or a status message."""
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def as_dict(self):
+        d = {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+        }
+        if self.error:
+            d['error'] = self.error
+        return d
+
+    def __repr__(self):
+        return '<TexnoMagicJob %s: %s (%s)>' % (self.id, self.name, self.status)
+
+
+class TexnoMagicJobs:
+    """
+    Background jobs running in a thread pool.
+    """
+    def __init__(self, workers=JOBS_WORKERS, keep=JOBS_KEEP):
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='texnomagic-job')
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, fun, *args, on_done=None, **kwargs) -> TexnoMagicJob:
+        """
+        Run fun(job, *args, **kwargs) in background.
+
+        Optional on_done(job) is called in the worker after job succeeds.
+        """
+        with self._lock:
+            job = TexnoMagicJob(next(self._ids), name)
+            self._jobs[job.id] = job
+            self._forget_finished()
+        self._pool.submit(self._run, job, fun, args, kwargs, on_done)
+        return job
+
+    def get(self, id) -> TexnoMagicJob | None:
+        return self._jobs.get(int(id))
+
+    def stats(self) -> dict:
+        """Return number of jobs in each status."""
+        jobs = list(self._jobs.values())
+        return {status: sum(j.status == status for j in jobs) for status in JOB_STATUSES}
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job, fun, args, kwargs, on_done):
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            job.result = fun(job, *args, **kwargs)
+            if on_done:
+                on_done(job)
+        except Exception as e:
+            logging.warning("JOB FAILED: %s: %s", job, e)
+            job.error = str(e) or e.__class__.__name__
+            job.status = 'failed'
+        else:
+            job.progress = 1.0
+            job.status = 'done'
+        job.finished = time.time()
+
+    def _forget_finished(self):
+        # oldest finished jobs are forgotten first
+        n = len(self._jobs) - self.keep
+        if n <= 0:
+            return
+        for id in [j.id for j in self._jobs.values() if j.done][:n]:
+            del self._jobs[id]
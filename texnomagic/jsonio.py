@@ -0,0 +1,122 @@
+"""
+TexnoMagic JSON serialization
+
+JSON is used for RPC requests and responses as well as for model files
+which contain large NumPy arrays.
+
+Fast [orjson](https://github.com/ijl/orjson) backend with native NumPy
+arrays support is used when available, standard `json` module is used
+otherwise. Use [set_backend][texnomagic.jsonio.set_backend] to select
+backend explicitly.
+
+Both backends produce compact (or 2-space indented) UTF-8 JSON which
+loads to the same data but the output isn't byte-identical:
+
+* float exponents differ: `1e-05` (json) vs `0.00001` (orjson)
+* NaN and infinity are `NaN`/`Infinity` (json) vs `null` (orjson)
+"""
+import json
+
+import numpy as np
+
+from texnomagic import ex
+
+
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
+
+JSON_BACKENDS = ['orjson', 'json']
+
+backend = 'orjson' if ORJSON_AVAILABLE else 'json'
+
+
+def set_backend(name : str) -> str:
+    """
+    Select JSON backend (one of JSON_BACKENDS).
+
+    Returns:
+        previous backend
+    """
+    global backend
+    if name not in JSON_BACKENDS:
+        raise ex.InvalidInput("invalid JSON backend: %s" % name)
+    if name == 'orjson' and not ORJSON_AVAILABLE:
+        raise ex.ModuleNotAvailable('orjson')
+    old = backend
+    backend = name
+    return old
+
+
+def available_backends() -> list[str]:
+    return [b for b in JSON_BACKENDS if b != 'orjson' or ORJSON_AVAILABLE]
+
+
+def default(obj):
+    """Serialize types unsupported by backends."""
+    if isinstance(obj, np.ndarray):
+        # orjson only supports C-contiguous arrays of some dtypes natively
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, float):
+        # float subclasses such as TexnoMagicSymbolModelScore
+        return float(obj)
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+
+def dumpb(data, indent=False) -> bytes:
+    """
+    Serialize data to JSON bytes.
+
+    Use `indent=True` to indent by 2 spaces or number of spaces
+    (only 2 is supported by orjson, json is used for others).
+    """
+    indent = 2 if indent is True else indent
+    if backend == 'orjson' and indent in (None, 0, 2):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=default, option=option)
+    return json_dumps(data, indent=indent).encode('utf-8')
+
+
+def dumps(data, indent=False) -> str:
+    """Serialize data to JSON string, see [dumpb][texnomagic.jsonio.dumpb]."""
+    if backend == 'orjson':
+        return dumpb(data, indent=indent).decode('utf-8')
+    return json_dumps(data, indent=indent)
+
+
+def json_dumps(data, indent=False) -> str:
+    """Serialize data using standard json module formatted like orjson."""
+    indent = 2 if indent is True else indent
+    if indent:
+        return json.dumps(data, default=default, ensure_ascii=False, indent=indent)
+    return json.dumps(data, default=default, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(data):
+    """Deserialize JSON str or bytes."""
+    if backend == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump(data, path, indent=False):
+    """Serialize data to JSON file at path.
+
+    [!] Overwrites existing data!
+    """
+    with open(path, 'wb') as f:
+        f.write(dumpb(data, indent=indent))
+
+
+def load(path):
+    """Deserialize JSON file at path."""
+    with open(path, 'rb') as f:
+        return loads(f.read())
@@ -13,7 +13,7 @@ def ensure_jsonrpcserver():
 
 
 try:
-    from jsonrpcserver import dispatch, method, Success
+    from jsonrpcserver import dispatch, method, Success, InvalidParams
     JSONRPCSERVER_AVAILABLE = True
 except ImportError:
     from texnomagic import ex
@@ -27,3 +27,6 @@ except ImportError:
     class Success:
         def __init__(self, *_args, **_kwargs):
             jsonrpcserver_not_available()
+
+    def InvalidParams(*_args, **_kwargs):
+        jsonrpcserver_not_available()
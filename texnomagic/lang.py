@@ -1,9 +1,32 @@
 """
 TexnoMagic Language grammar and parsing
 """
+from collections import OrderedDict, deque
+import hashlib
+import itertools
+import multiprocessing
+import os
+import pickle
+import stat
+import tempfile
+
+import parsimonious.grammar
+from parsimonious.exceptions import ParseError
 from parsimonious.grammar import Grammar
 from parsimonious.nodes import NodeVisitor
 
+from texnomagic import common
+
+
+# maximum number of parsed spells remembered by TexnoMagicLanguage
+SPELL_CACHE_SIZE = 1024
+
+# available spell parsers:
+# peg: parsimonious PEG parser using TEXNOMAGIC_GRAMMAR (reference)
+# fast: hand-rolled FastSpellParser equivalent to peg
+SPELL_PARSERS = ['peg', 'fast']
+SPELL_PARSER_DEFAULT = 'peg'
+
 
 # Parsing Expression Grammar (PEG) for TexnoMagic Language
 TEXNOMAGIC_GRAMMAR = """# TexnoMagic PEG Grammar
@@ -54,18 +77,219 @@ ws = " "+
 
 
 class TexnoMagicLanguage:
-    def __init__(self):
-        self.grammar = Grammar(TEXNOMAGIC_GRAMMAR)
+    """
+    TexnoMagic Language parser.
+
+    Parsed spells are remembered in a bounded LRU cache (`cache_size`,
+    0 disables caching) because spell texts tend to be very repetitive.
+    Copies of cached results are returned so callers can't corrupt the cache.
+
+    Select spell `parser` from `SPELL_PARSERS`.
+
+    Optional precomputed spell `table` (see [texnomagic.spelltable][])
+    is checked first and the parser is only used for spells not in the table.
+    """
+    def __init__(self, cache_size=SPELL_CACHE_SIZE, parser=SPELL_PARSER_DEFAULT, table=None):
+        if parser not in SPELL_PARSERS:
+            raise ValueError("invalid spell parser: %s" % parser)
+        self.parser = parser
+        if parser == 'fast':
+            self.grammar = None
+            self.fast_parser = FastSpellParser()
+        else:
+            self.grammar = get_grammar()
+            self.fast_parser = None
+        self.table = table
+        self.table_hits = 0
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
 
     def parse(self, text):
         """
         use this to parse TexnoMagic spell into its data representation
         """
+        if self.table is not None:
+            spell = self.table.get(text)
+            if spell is not None:
+                self.table_hits += 1
+                return spell
+
+        if self.cache_size:
+            spell = self._cache.get(text)
+            if spell is not None:
+                self.cache_hits += 1
+                self._cache.move_to_end(text)
+                return copy_spell(spell)
+            self.cache_misses += 1
+
+        spell = self.parse_uncached(text)
+
+        if self.cache_size:
+            self._cache[text] = copy_spell(spell)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return spell
+
+    def parse_uncached(self, text):
+        """
+        parse TexnoMagic spell bypassing the cache
+        """
+        if self.fast_parser:
+            return self.fast_parser.parse(text)
         tree = self.grammar.parse(text)
         v = TexnoVisitor()
         output = v.visit(tree)
         return output
 
+    def parse_many(self, texts):
+        """
+        Parse many spells, yield a (spell, error) tuple for each text.
+
+        Error is `None` for valid spells and spell is `None` on error.
+        """
+        for text in texts:
+            try:
+                yield self.parse(text), None
+            except ParseError as e:
+                yield None, str(e)
+
+    def cache_stats(self) -> dict:
+        """Return spell cache statistics."""
+        n = self.cache_hits + self.cache_misses
+        return {
+            'size': len(self._cache),
+            'max_size': self.cache_size,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': self.cache_hits / n if n else 0.0,
+            'table_size': len(self.table) if self.table is not None else 0,
+            'table_hits': self.table_hits,
+        }
+
+
+def parse_spells(texts, jobs=1, parser=SPELL_PARSER_DEFAULT, chunksize=256):
+    """
+    Parse many spells, optionally using multiple processes.
+
+    Results are yielded in input order as they become available
+    so huge inputs can be streamed: only up to `2 * jobs` chunks of
+    `chunksize` texts are read ahead.
+
+    See [TexnoMagicLanguage.parse_many][texnomagic.lang.TexnoMagicLanguage.parse_many].
+    """
+    if jobs < 1:
+        raise ValueError("invalid number of jobs: %s" % jobs)
+    if jobs == 1:
+        yield from TexnoMagicLanguage(parser=parser).parse_many(texts)
+        return
+    texts = iter(texts)
+    with multiprocessing.Pool(jobs, initializer=_init_parse_worker, initargs=(parser,)) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * jobs:
+                chunk = list(itertools.islice(texts, chunksize))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(_parse_worker, (chunk,)))
+            if not pending:
+                return
+            yield from pending.popleft().get()
+
+
+_worker_lang = None
+
+
+def _init_parse_worker(parser):
+    global _worker_lang
+    _worker_lang = TexnoMagicLanguage(parser=parser)
+
+
+def _parse_worker(texts):
+    return list(_worker_lang.parse_many(texts))
+
+
+_grammar = None
+
+
+def get_grammar() -> Grammar:
+    """
+    Get compiled TexnoMagic grammar.
+
+    Grammar is only compiled once per process and it's also cached on disk
+    (pickled) to make loading of TexnoMagic Language effectively free.
+    """
+    global _grammar
+    if _grammar is None:
+        _grammar = load_grammar()
+    return _grammar
+
+
+def grammar_cache_path():
+    """Path to pickled grammar cache file.
+
+    Unique for grammar text and installed parsimonious module."""
+    # cheaper than looking up parsimonious version in package metadata
+    version = os.stat(parsimonious.grammar.__file__).st_mtime_ns
+    key = "%s\n%s" % (version, TEXNOMAGIC_GRAMMAR)
+    h = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return common.CACHE_PATH / f'grammar-{h}.pickle'
+
+
+def load_grammar() -> Grammar:
+    """
+    Load pickled TexnoMagic grammar from cache or compile it and cache it.
+
+    Cache file is ignored (and replaced) unless it's trusted,
+    see [is_trusted_file][texnomagic.lang.is_trusted_file].
+    """
+    path = grammar_cache_path()
+    try:
+        with path.open('rb') as f:
+            # unpickling can execute code, only trust cache written by current user
+            if is_trusted_file(f):
+                grammar = pickle.load(f)
+                if isinstance(grammar, Grammar):
+                    return grammar
+    except Exception:
+        # missing or invalid cache
+        pass
+
+    grammar = Grammar(TEXNOMAGIC_GRAMMAR)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write atomically to avoid partial cache files from concurrent processes
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(grammar, f)
+        os.replace(tmp, path)
+    except OSError:
+        # cache is optional
+        pass
+    return grammar
+
+
+def is_trusted_file(f) -> bool:
+    """
+    Check that open file is owned by current user
+    and it isn't writable by group or others.
+    """
+    st = os.fstat(f.fileno())
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def copy_spell(spell):
+    """
+    Return a copy of parsed spell.
+
+    Faster than copy.deepcopy() for known (shallow) structure of spells.
+    """
+    return {k: v.copy() if isinstance(v, (dict, list)) else v
+            for k, v in spell.items()}
+
 
 class TexnoVisitor(NodeVisitor):
     def visit_element(self, node, vc):
@@ -208,3 +432,138 @@ def merge_mods(mods):
             else:
                 merged[key] = val
     return merged
+
+
+ELEMENTS = {'fire', 'ice', 'water', 'air', 'lightning', 'earth', 'life', 'death', 'magic'}
+MODS_SIZE = {'big': 2, 'small': 0.5}
+MODS_SPEED = {'fast': 2, 'slow': 0.5}
+DIRECTIONS = {'forward', 'enemy', 'friend', 'random'}
+SHIELD_SHAPES = {'area', 'cone', 'self'}
+BOLTLIKE_SPELLS = ['bolt', 'ball', 'beam']
+
+
+def size_mod(token):
+    v = MODS_SIZE.get(token)
+    return {'size': v} if v else None
+
+
+def speed_mod(token):
+    v = MODS_SPEED.get(token)
+    return {'speed': v} if v else None
+
+
+def effect_mod(token):
+    return size_mod(token) or speed_mod(token)
+
+
+def bolt_mod(token):
+    if token == 'homing':
+        return {'homing': 1}
+    return effect_mod(token)
+
+
+class SpellParseError(ParseError):
+    """Spell text doesn't match TexnoMagic grammar."""
+    def __str__(self):
+        return "Invalid spell at '%s' (column %s)." % (
+            self.text[self.pos:self.pos + 20], self.column())
+
+
+class FastSpellParser:
+    """
+    Hand-rolled spell parser equivalent to `TEXNOMAGIC_GRAMMAR` with `TexnoVisitor`.
+
+    The grammar is a simple language of keywords separated by spaces
+    so a tokenizer followed by a greedy state machine mirroring the PEG rules
+    (ordered choice, greedy repetition, complete match) produces exactly the
+    same results much faster.
+
+    Raises `SpellParseError` (a parsimonious `ParseError`) on invalid spells.
+    """
+    def parse(self, text):
+        tokens, positions = self.tokenize(text)
+        n = len(tokens)
+
+        def fail(i):
+            pos = positions[i] if i < n else len(text)
+            raise SpellParseError(text, pos)
+
+        def repeat(i, match):
+            # greedy (match ws)* - a match must be followed by another token
+            mods = []
+            while i + 1 < n:
+                m = match(tokens[i])
+                if not m:
+                    break
+                mods.append(m)
+                i += 1
+            return mods, i
+
+        def direction(i):
+            # (ws direction)?
+            if i < n and tokens[i] in DIRECTIONS:
+                return tokens[i], i + 1
+            return 'default', i
+
+        spell, end = None, 0
+        # modable_effect is shared by all spells but blink
+        effect_mods, i = repeat(0, effect_mod)
+        effect, i = repeat(i, lambda t: t if t in ELEMENTS else None)
+        if effect:
+            mfx = {
+                'effect': effect,
+                'effect_mods': merge_mods(effect_mods),
+            }
+            bolt_mods, j = repeat(i, bolt_mod)
+            area_mods, k = repeat(i, size_mod)
+            kw_bolt = tokens[j] if j < n else None
+            kw_area = tokens[k] if k < n else None
+            kw = tokens[i] if i < n else None
+            if kw_bolt in BOLTLIKE_SPELLS:
+                spell = {'spell': kw_bolt, **mfx, 'spell_mods': merge_mods(bolt_mods)}
+                spell['direction'], end = direction(j + 1)
+            elif kw_area == 'area':
+                spell = {'spell': 'area', **mfx, 'spell_mods': merge_mods(area_mods)}
+                end = k + 1
+            elif kw_area == 'cone':
+                spell = {'spell': 'cone', **mfx, 'spell_mods': merge_mods(area_mods)}
+                spell['direction'], end = direction(k + 1)
+            elif kw == 'self':
+                spell = {'spell': 'self', **mfx}
+                end = i + 1
+            elif kw == 'shield':
+                shape, end = 'self', i + 1
+                if end < n and tokens[end] in SHIELD_SHAPES:
+                    shape, end = tokens[end], end + 1
+                spell = {'spell': 'shield', 'shape': shape, **mfx}
+        if spell is None:
+            if n >= 2 and tokens[0] == 'air' and tokens[1] == 'lightning':
+                spell = {'spell': 'blink'}
+                spell['direction'], end = direction(2)
+            else:
+                fail(i)
+        if end < n:
+            # spell matched but didn't consume all the text
+            fail(end)
+        return spell
+
+    def tokenize(self, text):
+        """
+        Split spell text into tokens separated by spaces.
+
+        Returns:
+            (tokens, positions) lists.
+        """
+        if not text or text[0] == ' ':
+            raise SpellParseError(text, 0)
+        if text[-1] == ' ':
+            raise SpellParseError(text, len(text.rstrip(' ')))
+        tokens = []
+        positions = []
+        pos = 0
+        for token in text.split(' '):
+            if token:
+                tokens.append(token)
+                positions.append(pos)
+            pos += len(token) + 1
+        return tokens, positions
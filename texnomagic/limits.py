@@ -0,0 +1,120 @@
+"""
+TexnoMagic server limits
+
+Protect the server from bad, slow, or too many clients:
+
+* `max_frame`: maximum size of a request in bytes
+* `idle_timeout`: maximum time in seconds to wait for the next request
+* `read_timeout`: maximum time in seconds to read a started request
+* `max_batch`: maximum number of requests in a single JSON-RPC batch
+* `max_connections`: maximum number of open connections
+* `concurrency`: maximum number of requests processed at once,
+  other requests are queued for up to `queue_timeout` seconds;
+  request handlers share state which isn't thread-safe
+  (spell cache, recognition streams, thumbnails, mods index)
+  so only use 1 (default) with [texnomagic.requests][]
+
+Rejected requests receive a JSON-RPC error response and rejections are
+counted in [stats][texnomagic.limits.TexnoMagicLimits.stats].
+"""
+import threading
+
+from texnomagic import jsonio
+
+
+MAX_FRAME = 16 * 1024 * 1024
+IDLE_TIMEOUT = 300.0
+READ_TIMEOUT = 30.0
+MAX_BATCH = 64
+MAX_CONNECTIONS = 64
+# requests processed concurrently, request handlers aren't thread-safe
+CONCURRENCY = 1
+QUEUE_TIMEOUT = 10.0
+
+# JSON-RPC error codes
+ERROR_INVALID_REQUEST = -32600
+ERROR_SERVER_BUSY = -32000
+
+REJECT_REASONS = ['frame', 'batch', 'busy', 'connections', 'timeout']
+
+
+class TexnoMagicLimits:
+    """
+    Server limits and rejection counters.
+    """
+    def __init__(self,
+                 max_frame=MAX_FRAME,
+                 idle_timeout=IDLE_TIMEOUT,
+                 read_timeout=READ_TIMEOUT,
+                 max_batch=MAX_BATCH,
+                 max_connections=MAX_CONNECTIONS,
+                 concurrency=CONCURRENCY,
+                 queue_timeout=QUEUE_TIMEOUT):
+        self.max_frame = max_frame
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self.max_batch = max_batch
+        self.max_connections = max_connections
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.connections = 0
+        self.active = 0
+        self.queued = 0
+        self.rejected = {reason: 0 for reason in REJECT_REASONS}
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+
+    def connect(self) -> bool:
+        """Open a new connection unless there are too many."""
+        with self._lock:
+            if self.connections >= self.max_connections:
+                self.rejected['connections'] += 1
+                return False
+            self.connections += 1
+            return True
+
+    def disconnect(self):
+        with self._lock:
+            self.connections -= 1
+
+    def acquire(self) -> bool:
+        """Wait for a free request processing slot, False on `queue_timeout`."""
+        with self._lock:
+            self.queued += 1
+        ok = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.queued -= 1
+            if ok:
+                self.active += 1
+            else:
+                self.rejected['busy'] += 1
+        return ok
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def reject(self, reason):
+        with self._lock:
+            self.rejected[reason] += 1
+
+    def stats(self) -> dict:
+        return {
+            'connections': self.connections,
+            'active': self.active,
+            'queued': self.queued,
+            'rejected': dict(self.rejected),
+        }
+
+    def __repr__(self):
+        return '<TexnoMagicLimits: %d connections, %d active, %d queued>' % (
+            self.connections, self.active, self.queued)
+
+
+def error_response(code, message, data=None, id=None) -> str:
+    """JSON-RPC error response."""
+    error = {'code': code, 'message': message}
+    if data is not None:
+        error['data'] = data
+    return jsonio.dumps({'jsonrpc': '2.0', 'error': error, 'id': id})
@@ -0,0 +1,135 @@
+"""
+TexnoMagic drawings memory budget
+
+Drawings points are lazily loaded from files but never released by default.
+A long-running process can enable a memory budget using
+[set_memory_budget][texnomagic.memory.set_memory_budget] in which case
+points of drawings loaded from files are tracked and least recently used
+drawings are evicted when the budget is exceeded.
+
+Evicted drawings transparently reload their points on next access.
+Only unmodified drawings loaded from files are tracked so no changes are lost.
+"""
+from collections import OrderedDict, deque
+import os
+import threading
+import weakref
+
+
+# tracker of the current memory budget, None = unlimited (no tracking)
+tracker = None
+
+
+class TexnoMagicDrawingsMemory:
+    """
+    LRU tracker of loaded drawings points with a memory budget in bytes.
+    """
+    def __init__(self, budget):
+        self.budget = budget
+        # resident bytes of tracked drawings points
+        self.resident = 0
+        self.evictions = 0
+        self._drawings = OrderedDict()
+        # (key, ref) of garbage collected drawings to forget
+        self._dead = deque()
+        self._lock = threading.Lock()
+
+    def touch(self, drawing, nbytes=None):
+        """
+        Mark drawing as recently used.
+
+        Drawings are tracked when `nbytes` of loaded points are supplied,
+        this may evict least recently used drawings to fit the budget.
+        """
+        key = id(drawing)
+        evicted = []
+        with self._lock:
+            self._forget_dead()
+            if key in self._drawings:
+                self._drawings.move_to_end(key)
+                return
+            if nbytes is None:
+                return
+            ref = weakref.ref(drawing, lambda r, key=key: self._forget_ref(key, r))
+            self._drawings[key] = (ref, nbytes)
+            self.resident += nbytes
+            # keep at least the newly loaded drawing
+            while self.resident > self.budget and len(self._drawings) > 1:
+                _, (old_ref, old_nbytes) = self._drawings.popitem(last=False)
+                self.resident -= old_nbytes
+                self.evictions += 1
+                evicted.append(old_ref)
+        for old_ref in evicted:
+            d = old_ref()
+            if d is not None:
+                d.release()
+
+    def forget(self, drawing):
+        """Stop tracking drawing (modified drawings mustn't be evicted)."""
+        with self._lock:
+            self._forget_dead()
+            item = self._drawings.pop(id(drawing), None)
+            if item:
+                self.resident -= item[1]
+
+    def _forget_ref(self, key, ref):
+        # drawing was garbage collected, this can run anywhere GC runs
+        # including code holding the lock so only queue it without locking
+        self._dead.append((key, ref))
+
+    def _forget_dead(self):
+        # call with lock held
+        while self._dead:
+            key, ref = self._dead.popleft()
+            item = self._drawings.get(key)
+            if item and item[0] is ref:
+                del self._drawings[key]
+                self.resident -= item[1]
+
+    def __len__(self):
+        with self._lock:
+            self._forget_dead()
+            return len(self._drawings)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._forget_dead()
+        return {
+            'budget': self.budget,
+            'resident': self.resident,
+            'drawings': len(self._drawings),
+            'evictions': self.evictions,
+        }
+
+    def __repr__(self):
+        return '<TexnoMagicDrawingsMemory: %d / %d B in %d drawings>' % (
+            self.resident, self.budget, len(self._drawings))
+
+
+def set_memory_budget(budget : int | None) -> TexnoMagicDrawingsMemory | None:
+    """
+    Set memory budget of loaded drawings points in bytes.
+
+    Use 0 or None to disable the budget (and tracking).
+    Only drawings loaded afterwards are tracked.
+    """
+    global tracker
+    tracker = TexnoMagicDrawingsMemory(budget) if budget else None
+    return tracker
+
+
+def process_rss() -> int | None:
+    """Resident set size of current process in bytes when available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+def memory_stats() -> dict:
+    """Memory stats including drawings memory budget when enabled."""
+    s = {'rss': process_rss()}
+    if tracker is not None:
+        s['drawings'] = tracker.stats()
+    return s
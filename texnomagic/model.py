@@ -1,6 +1,5 @@
 from collections import Counter
 import numpy as np
-import json
 
 from sklearn import mixture
 
@@ -8,7 +7,9 @@ from sklearn import mixture
 # hidden import for PyInstaller
 import sklearn.utils._weight_vector  # noqa
 
-from texnomagic.common import NumpyEncoder
+from texnomagic import descriptor
+from texnomagic import jsonio
+from texnomagic.drawing import TexnoMagicDrawing, check_preprocess
 
 
 SYMBOL_SCORE_THRESHOLDS = [
@@ -71,6 +72,12 @@ class TexnoMagicSymbolModel:
     should be implemented using TexnoMagicAlphabetModel equivalent.
     """
 
+    __slots__ = (
+        'path', 'ready', 'gmm', 'n_gauss', 'score_avg', 'labels_avg',
+        'preprocess', '_grid', '_preview',
+        '__weakref__',
+    )
+
     def __init__(self, path=None):
         self.path = path
         self.ready = False
@@ -78,6 +85,10 @@ class TexnoMagicSymbolModel:
         self.n_gauss = 10
         self.score_avg = 0
         self.labels_avg = []
+        # drawing preprocessing params, see TexnoMagicDrawing.preprocessed
+        self.preprocess = {}
+        self._grid = None
+        self._preview = None
 
     @property
     def info_path(self):
@@ -85,11 +96,41 @@ class TexnoMagicSymbolModel:
             return self.path / 'texno_model.json'
         return None
 
+    @property
+    def grid(self):
+        """
+        Coarse occupancy grid descriptor of the model.
+
+        Used for cheap candidate shortlisting, see
+        [texnomagic.descriptor.model_grid][].
+
+        Computed on-demand and cached, `None` when model isn't ready.
+        """
+        if self._grid is None and self.ready:
+            self._grid = descriptor.model_grid(self.gmm)
+        return self._grid
+
+    def prepare(self, drawing):
+        """
+        Return drawing preprocessed as required by the model.
+
+        The same preprocessing is applied in training and scoring,
+        see [texnomagic.drawing.TexnoMagicDrawing.preprocessed][].
+        """
+        if self.preprocess:
+            return drawing.preprocessed(**self.preprocess)
+        return drawing
+
     def train_symbol(self, symbol):
         """
         Train symbol model from its drawings.
         """
-        points = symbol.get_all_drawing_points()
+        drawings = [self.prepare(d) for d in symbol.drawings]
+        if self.preprocess:
+            pp = [d.points for d in drawings if len(d.points) > 0]
+            points = np.concatenate(pp) if pp else np.array([])
+        else:
+            points = symbol.get_all_drawing_points()
         n_points = len(points)
         if n_points < 2 * self.n_gauss:
             # insufficient data
@@ -101,7 +142,7 @@ class TexnoMagicSymbolModel:
         # aggregate average scores per label and per drawing
         score_sum = 0.0
         label_sums = np.zeros(self.gmm.n_components)
-        for d in symbol.drawings:
+        for d in drawings:
             score_sum += self.gmm.score(d.points)
             labels = self.gmm.predict(d.points)
             labels_counts = count_labels(labels, self.gmm.n_components)
@@ -109,7 +150,7 @@ class TexnoMagicSymbolModel:
         # average scores per label (component)
         self.labels_avg = label_sums / label_sums.sum()
         # average score per drawing (for score normalization)
-        self.score_avg = score_sum / len(symbol.drawings)
+        self.score_avg = score_sum / len(drawings)
 
         self.ready = True
         return True
@@ -120,6 +161,8 @@ class TexnoMagicSymbolModel:
         """
         # thanks scikit-learn <3
         self.gmm = mixture.GaussianMixture(n_components=self.n_gauss)
+        self._grid = None
+        self._preview = None
         if data is None:
             return
         self.gmm.fit(data)
@@ -139,17 +182,50 @@ class TexnoMagicSymbolModel:
         if not self.ready:
             return -1
 
-        # Compute the average log-likelihood of each drawing point.
-        log_score = self.gmm.score(drawing.points)
-        # Predict the component labels for drawing each drawing point.
-        labels = self.gmm.predict(drawing.points)
+        drawing = self.prepare(drawing)
+        ll_sum, label_counts = self.point_stats(drawing.points)
+        return self.stats_score(ll_sum, label_counts)
+
+    def point_stats(self, points):
+        """
+        Compute additive scoring statistics of points.
+
+        Statistics of a drawing are sums of statistics of its parts which
+        allows incremental scoring, see
+        [stats_score][texnomagic.model.TexnoMagicSymbolModel.stats_score].
+
+        Returns:
+            (log-likelihood sum, label counts per component) tuple.
+        """
+        if len(points) == 0:
+            return 0.0, np.zeros(self.n_gauss)
+        # weighted log probabilities give both log-likelihood and labels
+        # at once, public score_samples() + predict() are ~4x slower
+        wlp = gmm_weighted_log_prob(self.gmm, points)
+        # log-likelihood of each point
+        ll = np.logaddexp.reduce(wlp, axis=1)
+        # predicted component label of each point
+        labels = np.argmax(wlp, axis=1)
+        return ll.sum(), np.bincount(labels, minlength=self.n_gauss)
+
+    def stats_score(self, ll_sum, label_counts):
+        """
+        Get a model score from scoring statistics.
+
+        See [point_stats][texnomagic.model.TexnoMagicSymbolModel.point_stats].
+        """
+        n = label_counts.sum()
+        if not self.ready or n == 0:
+            return -1
+        # average log-likelihood of each drawing point
+        log_score = ll_sum / n
 
         # "Normalize" the negative log-likelyhood from GMM model
         # into <0; INF> using score average.
         score = self.score_avg / log_score
 
-        label_counts = count_labels(labels, self.n_gauss)
-        label_diff = sum(abs(label_counts - self.labels_avg))
+        label_counts = label_counts / n
+        label_diff = np.sum(np.abs(label_counts - self.labels_avg))
         label_k = max(1 - label_diff, 0.3)
         score *= label_k
 
@@ -158,12 +234,23 @@ class TexnoMagicSymbolModel:
     def get_preview(self):
         """
         Return data for drawing a model preview.
+
+        Computed once per model and saved with it.
+        """
+        if self._preview is None:
+            self._preview = self.compute_preview()
+        return self._preview
+
+    def compute_preview(self):
+        """
+        Compute model preview data: an ellipse for each GMM component.
+
+        Components are `[center, size, angle, weight]` lists.
         """
         p = {
             'type': 'gmm',
             'components': []
         }
-        comps = []
         if not self.gmm or not hasattr(self.gmm, 'means_'):
             return p
 
@@ -171,20 +258,31 @@ class TexnoMagicSymbolModel:
         covs = self.gmm.covariances_
         weights = self.gmm.weights_
         # draw covariances for each Gaussian
-        for i, cov in enumerate(covs):
-            # eigenvectors are magic
-            v, w = np.linalg.eigh(cov)
-            u = w[0] / np.linalg.norm(w[0])
-            angle = np.arctan2(u[1], u[0])
-            angle = 180 * angle / np.pi  # convert to degrees
-            size = 2. * np.sqrt(2.) * np.sqrt(v)
-            center = means[i, :2]
-            weight = weights[i]
-            comp = [center.tolist(), size.tolist(), angle, weight]
-            comps.append(comp)
-        p['components'] = comps
+        # eigenvectors are magic (all components at once)
+        v, w = np.linalg.eigh(covs)
+        u = w[:, 0] / np.linalg.norm(w[:, 0], axis=1)[:, None]
+        angles = np.degrees(np.arctan2(u[:, 1], u[:, 0]))
+        sizes = 2. * np.sqrt(2.) * np.sqrt(v)
+        p['components'] = [
+            [center.tolist(), size.tolist(), float(angle), float(weight)]
+            for center, size, angle, weight in zip(means[:, :2], sizes, angles, weights)]
         return p
 
+    def preview_drawing(self, n=32):
+        """
+        Return model preview as a Drawing of component ellipses.
+
+        Each ellipse is a closed curve of n points.
+        """
+        curves = []
+        t = np.linspace(0, 2 * np.pi, n + 1)
+        for center, size, angle, _ in self.get_preview()['components']:
+            a = np.radians(angle)
+            rot = np.array([[np.cos(a), -np.sin(a)], [np.sin(a), np.cos(a)]])
+            ellipse = np.column_stack((np.cos(t), np.sin(t))) * (np.array(size) / 2)
+            curves.append((ellipse @ rot.T + center).tolist())
+        return TexnoMagicDrawing(curves=curves)
+
     def save(self):
         """
         Save symbol to its path.
@@ -192,14 +290,23 @@ class TexnoMagicSymbolModel:
         [!] Overwrites existing data!
         """
         self.path.mkdir(parents=True, exist_ok=True)
+        return jsonio.dump(self.get_info(), self.info_path, indent=True)
+
+    def get_info(self):
+        """
+        Return model info as saved into model file (including NumPy arrays).
+        """
         info = {
             'model_type': 'gmm',
             'n_gauss': self.n_gauss,
             'score_avg': self.score_avg,
             'labels_avg': self.labels_avg,
-            'params': self.gmm._get_parameters()
+            'params': self.gmm._get_parameters(),
+            'preview': self.get_preview(),
         }
-        return json.dump(info, self.info_path.open('w'), cls=NumpyEncoder, indent=2)
+        if self.preprocess:
+            info['preprocess'] = self.preprocess
+        return info
 
     def load(self, path=None):
         """
@@ -214,25 +321,50 @@ class TexnoMagicSymbolModel:
         if not self.info_path.exists():
             return False
 
-        info = json.load(self.info_path.open())
-        self.n_gauss = info['n_gauss']
-        self.score_avg = info['score_avg']
-        self.labels_avg = np.array(info['labels_avg'])
+        info = jsonio.load(self.info_path)
+        self.set_params(
+            [np.array(p) for p in info['params']],
+            score_avg=info['score_avg'],
+            labels_avg=np.array(info['labels_avg']),
+            preprocess=info.get('preprocess', {}))
+        # missing in models saved by older versions, computed on-demand
+        self._preview = info.get('preview')
+        return True
+
+    def set_params(self, params, score_avg, labels_avg, preprocess=None):
+        """
+        Set trained model parameters.
+
+        Args:
+            params: GMM parameters arrays (weights, means, covariances,
+                precisions Cholesky), these can be read-only views
+                (see [texnomagic.shm][])
+            score_avg: average score per drawing
+            labels_avg: average scores per label (component)
+            preprocess: drawing preprocessing params
+        """
+        self.n_gauss = len(params[0])
+        self.score_avg = score_avg
+        self.labels_avg = labels_avg
+        self.preprocess = check_preprocess(preprocess)
         self.gmm = mixture.GaussianMixture(n_components=self.n_gauss)
-        params = [np.array(p) for p in info['params']]
         self.gmm._set_parameters(params)
+        self._grid = None
+        self._preview = None
         self.ready = True
-        return True
 
     def as_dict(self, relative_to=None):
         path = self.path
         if relative_to:
             path = path.relative_to(relative_to)
-        return {
+        d = {
             'model_type': 'GMM',
             'n_gauss': self.n_gauss,
             'score_avg': self.score_avg,
         }
+        if self.preprocess:
+            d['preprocess'] = self.preprocess
+        return d
 
     def pretty(self):
         return (f"[magenta]GMM[/] model (n_gauss: {self.n_gauss}, "
@@ -262,3 +394,24 @@ def count_labels(labels, n, normalize=True):
     if normalize:
         counts = counts / counts.sum()
     return counts
+
+
+def gmm_weighted_log_prob(gmm, points):
+    """
+    Weighted log probabilities of points for each GMM component.
+
+    Computed from public parameters of a fitted GaussianMixture
+    with `full` covariances.
+
+    Returns:
+        array of shape (n_points, n_components)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    prec_chol = gmm.precisions_cholesky_
+    n_features = points.shape[1]
+    # log determinant of precision Cholesky factors
+    log_det = np.log(np.diagonal(prec_chol, axis1=1, axis2=2)).sum(axis=1)
+    # Mahalanobis distances of points from component means
+    y = np.einsum('nd,kde->nke', points, prec_chol) - np.einsum('kd,kde->ke', gmm.means_, prec_chol)
+    log_prob = -0.5 * (n_features * np.log(2 * np.pi) + np.sum(y ** 2, axis=2))
+    return log_prob + log_det + np.log(gmm.weights_)
@@ -2,12 +2,28 @@
 TexnoMagic / Words of Power mods interface
 
 Use this to parse/download TexnoMagic alphabets as mods from https://wop.mod.io
+
+Mod.io API URL and key can be overridden in all functions
+(`url`, `api_key`) in order to use a different server.
+
+Mods list is cached locally in a mods index (see `TexnoMagicModIndex`)
+and revalidated using conditional requests (ETag / If-Modified-Since)
+so unchanged pages aren't transferred again and cached list is used
+when offline. The index also records installed mods versions.
 """
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 import json
-import requests
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
 import zipfile
 
+import requests
+from requests.adapters import HTTPAdapter
+
 from texnomagic import common
 
 
@@ -15,19 +31,207 @@ MODIO_API_KEY = "2071808b470b7abc78fc289e5d3396d1"
 MODIO_GAME_ID = 1986
 MODIO_API_URL = "https://g-%s.modapi.io/v1" % MODIO_GAME_ID
 MODIO_MODS_URL = "%s/games/%s/mods" % (MODIO_API_URL, MODIO_GAME_ID)
+# maximum number of results per API page
+MODIO_PAGE_SIZE = 100
+
+# number of concurrent downloads
+DOWNLOAD_JOBS = 4
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# (connect, read) timeout in seconds
+DOWNLOAD_TIMEOUT = (10, 60)
+
+MODS_INDEX_FILE = 'texno_mods.json'
+
+
+_session = None
+
+
+def get_session() -> requests.Session:
+    """
+    Get shared HTTP session with connection pool for concurrent downloads.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=DOWNLOAD_JOBS, pool_maxsize=DOWNLOAD_JOBS)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
 
 
-def get_online_mods():
-    mods_data = get_online_mods_data()
+def get_online_mods(url=None, api_key=MODIO_API_KEY, index=None):
+    mods_data = get_online_mods_data(url=url, api_key=api_key, index=index)
     return data2mods(mods_data)
 
 
-def get_online_mods_data():
-    params = {
-        'api_key': MODIO_API_KEY
-    }
-    r = requests.get(MODIO_MODS_URL, params=params)
-    return json.loads(r.text)
+def get_online_mods_data(url=None, api_key=MODIO_API_KEY, page_size=MODIO_PAGE_SIZE, index=None):
+    """
+    Get data of all online mods following API pagination.
+
+    Pages are revalidated against mods `index` cache (default: `get_mod_index()`).
+    """
+    if index is None:
+        index = get_mod_index()
+    return {'data': index.fetch(url=url, api_key=api_key, page_size=page_size)}
+
+
+_mod_index = None
+_mod_index_lock = threading.Lock()
+
+
+def get_mod_index():
+    """Get default mods index cache stored in mods data path."""
+    global _mod_index
+    with _mod_index_lock:
+        if _mod_index is None:
+            index = TexnoMagicModIndex(common.MODS_DATA_PATH / MODS_INDEX_FILE)
+            index.load()
+            _mod_index = index
+    return _mod_index
+
+
+class TexnoMagicModIndex:
+    """
+    Local cache of online mods list and a record of installed mods.
+
+    Index has:
+
+    * `pages`: cached API pages with their `etag` and `last_modified`
+    * `installed`: installed modfile info for each mod `name_id`
+    * `offline`: `True` when cached list was used because server was unreachable
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.url = None
+        self.pages = {}
+        self.installed = {}
+        self.offline = False
+        # number of pages revalidated without transfer by last fetch()
+        self.n_not_modified = 0
+        # index is shared by concurrent download jobs
+        self._lock = threading.RLock()
+
+    def fetch(self, url=None, api_key=MODIO_API_KEY, page_size=MODIO_PAGE_SIZE) -> list:
+        """
+        Fetch data of all online mods, only transferring changed pages.
+
+        Falls back to cached data when server is unreachable.
+        """
+        with self._lock:
+            url = url or MODIO_MODS_URL
+            if url != self.url:
+                self.url = url
+                self.pages = {}
+            session = get_session()
+            pages = {}
+            data = []
+            offset = 0
+            self.n_not_modified = 0
+            try:
+                while True:
+                    key = f'{offset}:{page_size}'
+                    cached = self.pages.get(key)
+                    headers = {}
+                    if cached and cached.get('etag'):
+                        headers['If-None-Match'] = cached['etag']
+                    if cached and cached.get('last_modified'):
+                        headers['If-Modified-Since'] = cached['last_modified']
+                    params = {
+                        'api_key': api_key,
+                        '_offset': offset,
+                        '_limit': page_size,
+                    }
+                    r = session.get(url, params=params, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+                    if r.status_code == 304 and cached:
+                        page = cached['page']
+                        self.n_not_modified += 1
+                    else:
+                        r.raise_for_status()
+                        page = r.json()
+                    pages[key] = {
+                        'etag': r.headers.get('ETag') or (cached or {}).get('etag'),
+                        'last_modified': r.headers.get('Last-Modified') or (cached or {}).get('last_modified'),
+                        'page': page,
+                    }
+                    page_data = page.get('data', [])
+                    data += page_data
+                    offset += len(page_data)
+                    if not page_data or offset >= page.get('result_total', 0):
+                        break
+            except (requests.ConnectionError, requests.Timeout):
+                if not self.pages:
+                    raise
+                self.offline = True
+                return self.cached_data()
+            self.offline = False
+            self.pages = pages
+            self.save()
+            return data
+
+    def cached_data(self) -> list:
+        """Return cached data of all online mods."""
+        with self._lock:
+            pages = sorted(self.pages.items(), key=lambda p: int(p[0].split(':')[0]))
+        return [m for _, p in pages for m in p['page'].get('data', [])]
+
+    def is_installed(self, mod) -> bool:
+        """Is current version of mod installed and still present on disk?"""
+        info = self.installed.get(mod.name_id)
+        if not info or info.get('modfile_id') != mod.modfile_id:
+            return False
+        # servers don't always provide file hash
+        if mod.md5 and info.get('md5') != mod.md5:
+            return False
+        paths = info.get('paths')
+        return bool(paths) and all(Path(p).exists() for p in paths)
+
+    def record_install(self, mod, md5):
+        """Record installed mod version."""
+        with self._lock:
+            self.installed[mod.name_id] = {
+                'modfile_id': mod.modfile_id,
+                'version': mod.version,
+                'filename': mod.filename,
+                'md5': mod.md5 or md5,
+                'paths': [str(p) for p in mod.paths],
+            }
+            self.save()
+
+    def save(self):
+        """Save index into its path.
+
+        [!] Overwrites existing data!
+        """
+        if not self.path:
+            return
+        with self._lock:
+            info = {
+                'url': self.url,
+                'pages': self.pages,
+                'installed': self.installed,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # write atomically, index can be saved from multiple processes
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(info, f, indent=2)
+            os.replace(tmp, self.path)
+
+    def load(self, path=None):
+        """Load index from path."""
+        with self._lock:
+            if path:
+                self.path = path
+            if not self.path.exists():
+                return False
+            info = json.load(self.path.open())
+            self.url = info.get('url')
+            self.pages = info.get('pages', {})
+            self.installed = info.get('installed', {})
+            return True
+
+    def __repr__(self):
+        return '<TexnoMagicModIndex: %d installed @ %s>' % (len(self.installed), self.path)
 
 
 def data2mods(data):
@@ -38,11 +242,87 @@ def data2mods(data):
     return mods
 
 
+def download_mods(mods, path=None, jobs=DOWNLOAD_JOBS, index=None):
+    """
+    Download mods concurrently.
+
+    Installed versions are recorded in mods `index` when supplied.
+
+    Yields:
+        (mod, error) tuples as downloads finish, error is None on success.
+    """
+    if jobs < 1:
+        raise ValueError("invalid number of jobs: %s" % jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(m.download, path): m for m in mods}
+        for future in as_completed(futures):
+            mod = futures[future]
+            error = future.exception()
+            if not error and index is not None:
+                index.record_install(mod, future.result())
+            yield mod, error
+
+
+def sync_mods(mods, path=None, jobs=DOWNLOAD_JOBS, index=None):
+    """
+    Download only mods whose modfile changed since they were installed.
+
+    Returns:
+        (results, unchanged) tuple: a list of `download_mods` results
+        and a list of unchanged mods.
+    """
+    if index is None:
+        index = get_mod_index()
+    changed, unchanged = [], []
+    for mod in mods:
+        (unchanged if index.is_installed(mod) else changed).append(mod)
+    results = list(download_mods(changed, path=path, jobs=jobs, index=index))
+    return results, unchanged
+
+
+def extract_zip(zip_path, path):
+    """
+    Extract zip file into path atomically.
+
+    Archive is extracted into a temporary directory first and then each
+    top-level entry is moved into place, replacing existing entries.
+
+    Returns:
+        a list of extracted top-level paths
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=path, prefix='.extract-'))
+    paths = []
+    try:
+        with zipfile.ZipFile(zip_path) as zipf:
+            zipf.extractall(tmp_dir)
+        for entry in tmp_dir.iterdir():
+            dest = path / entry.name
+            old = None
+            if dest.is_dir() and not dest.is_symlink():
+                # move old version away first, directories can't be replaced
+                old = tmp_dir / f'.old-{entry.name}'
+                os.replace(dest, old)
+            os.replace(entry, dest)
+            paths.append(dest)
+            if old:
+                shutil.rmtree(old)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return paths
+
+
 class WoPOnlineMod:
     data = {}
     name = None
     name_id = None
     filename = None
+    modfile_id = None
+    version = None
+    md5 = None
+    # top-level paths extracted by last download()
+    paths = []
     profile_url = None
     binary_url = None
     logo_url = None
@@ -57,17 +337,49 @@ class WoPOnlineMod:
         self.profile_url = data.get('profile_url')
         modfile = data.get('modfile', {})
         self.filename = modfile.get('filename')
+        self.modfile_id = modfile.get('id')
+        self.version = modfile.get('version')
+        self.md5 = modfile.get('filehash', {}).get('md5')
         self.binary_url = modfile.get('download', {}).get('binary_url')
         self.logo_url = data.get('logo', {}).get('thumb_320x180')
         self.data = data
 
-    def download(self, path=None):
+    def download(self, path=None, progress=None):
+        """
+        Download mod and extract it into path.
+
+        Mod file is streamed into a temporary file in chunks
+        and extracted atomically, see `extract_zip`.
+
+        Optional progress(fraction) callback is called as data arrive.
+
+        Returns:
+            MD5 hash of mod file (verified when known)
+        """
         if not path:
             path = common.ALPHABETS_PATHS['mods']
-        br = requests.get(self.binary_url)
-        filebytes = BytesIO(br.content)
-        zipf = zipfile.ZipFile(filebytes)
-        zipf.extractall(path)
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path, prefix='.download-', suffix='.zip')
+        md5 = hashlib.md5()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with get_session().get(self.binary_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                    r.raise_for_status()
+                    size = int(r.headers.get('Content-Length') or 0)
+                    n = 0
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        md5.update(chunk)
+                        f.write(chunk)
+                        n += len(chunk)
+                        if progress and size:
+                            progress(n / size)
+            if self.md5 and md5.hexdigest() != self.md5:
+                raise ValueError("mod file hash mismatch: %s" % self.filename)
+            self.paths = extract_zip(tmp, path)
+        finally:
+            os.unlink(tmp)
+        return md5.hexdigest()
 
     def as_dict(self):
         return {
@@ -75,6 +387,7 @@ class WoPOnlineMod:
             'name_id': self.name_id,
             'profile_url': self.profile_url,
             'filename': self.filename,
+            'version': self.version,
             'binary_url': self.binary_url,
         }
 
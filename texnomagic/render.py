@@ -1,5 +1,8 @@
+from concurrent.futures import ProcessPoolExecutor
 import math
 
+import numpy as np
+
 from texnomagic import console
 from texnomagic import ex
 
@@ -18,6 +21,16 @@ def ensure_pil():
         raise ex.ModuleNotAvailable('PIL')
 
 
+# default number of sub-rows per pixel row used for anti-aliasing
+ANTIALIAS_DEFAULT = 4
+# maximal number of pixels rasterized at once by render_drawings
+RENDER_BATCH_PIXELS = 1 << 22
+
+
+def default_line_width(res):
+    return max(round(res / 20.0), 1)
+
+
 def render_drawing(drawing, res=1000, line_width=None, image=None) -> Image:
     """
     Render TexnoMagicDrawing into a PIL.Image (raster).
@@ -27,7 +40,7 @@ def render_drawing(drawing, res=1000, line_width=None, image=None) -> Image:
     if not image:
         image = Image.new("L", (res, res), 0)
     if not line_width:
-        line_width = max(round(res / 20.0), 1)
+        line_width = default_line_width(res)
 
     draw = ImageDraw.Draw(image)
 
@@ -47,3 +60,254 @@ def render_drawing(drawing, res=1000, line_width=None, image=None) -> Image:
             x_p, y_p = x, y
 
     return image
+
+
+def render_drawings(drawings, res=1000, line_width=None, antialias=ANTIALIAS_DEFAULT, jobs=1) -> np.ndarray:
+    """
+    Render many TexnoMagicDrawings into a stack of grayscale rasters.
+
+    Same geometry as [render_drawing][texnomagic.render.render_drawing]
+    but rasterized using NumPy without PIL: each line segment is a capsule
+    (round caps) and its horizontal spans on each pixel (sub-)row are computed
+    analytically for all segments at once.
+
+    Args:
+        res: resolution (width and height) of each raster
+        line_width: line width in pixels (default: 5% of res)
+        antialias: number of sub-rows per pixel row (1 = no anti-aliasing),
+            horizontal coverage is computed exactly
+        jobs: number of rendering processes
+
+    Returns:
+        uint8 array of shape (len(drawings), res, res), rows are Y
+    """
+    if jobs < 1:
+        raise ValueError("invalid number of jobs: %s" % jobs)
+    if not line_width:
+        line_width = default_line_width(res)
+    antialias = max(int(antialias), 1)
+    curves = [[np.asarray(c, dtype=np.float64).reshape(-1, 2)
+               for c in d.curves_fit_area([0.05 * res, 0.05 * res], [0.9 * res, 0.9 * res])]
+              for d in drawings]
+
+    if jobs == 1 or len(curves) < 2:
+        return rasterize_curves(curves, res, line_width, antialias)
+
+    chunk_size = math.ceil(len(curves) / jobs)
+    chunks = [curves[i:i + chunk_size] for i in range(0, len(curves), chunk_size)]
+    stack = np.zeros((len(curves), res, res), dtype=np.uint8)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(rasterize_curves, chunks,
+                           [res] * len(chunks), [line_width] * len(chunks), [antialias] * len(chunks))
+        start = 0
+        for imgs in results:
+            stack[start:start + len(imgs)] = imgs
+            start += len(imgs)
+    return stack
+
+
+def rasterize_curves(curves, res, line_width, antialias=ANTIALIAS_DEFAULT) -> np.ndarray:
+    """
+    Rasterize lists of curves (in pixel coordinates) into a stack of rasters.
+
+    See [render_drawings][texnomagic.render.render_drawings].
+    """
+    ss = antialias
+    r = line_width / 2.0
+    n_sub = res * ss
+
+    # line segments of all curves of all images
+    seg_a, seg_b, seg_img = [], [], []
+    for i, img_curves in enumerate(curves):
+        for curve in img_curves:
+            if len(curve) == 0:
+                continue
+            if len(curve) == 1:
+                # single point - zero length segment
+                curve = np.concatenate((curve, curve))
+            seg_a.append(curve[:-1])
+            seg_b.append(curve[1:])
+            seg_img.append(np.full(len(curve) - 1, i))
+
+    stack = np.zeros((len(curves), res, res), dtype=np.uint8)
+    if not seg_a:
+        return stack
+    a = np.concatenate(seg_a)
+    b = np.concatenate(seg_b)
+    img = np.concatenate(seg_img)
+
+    # (segment, sub-row) pairs covering each segment capsule,
+    # there are ss sub-rows per pixel row sampled at their centers
+    k0 = np.ceil((np.minimum(a[:, 1], b[:, 1]) - r) * ss - 0.5)
+    k1 = np.floor((np.maximum(a[:, 1], b[:, 1]) + r) * ss - 0.5)
+    k0 = np.maximum(k0, 0).astype(np.int64)
+    k1 = np.minimum(k1, n_sub - 1).astype(np.int64)
+    n_rows = np.maximum(k1 - k0 + 1, 0)
+    seg = np.repeat(np.arange(len(a)), n_rows)
+    sub = np.arange(len(seg)) - np.repeat(np.cumsum(n_rows) - n_rows, n_rows) + k0[seg]
+    lo, hi = capsule_spans(a[seg], b[seg], r, (sub + 0.5) / ss)
+    lo = np.maximum(lo, 0.0)
+    hi = np.minimum(hi, float(res))
+    ok = lo < hi
+    lo, hi, sub, img = lo[ok], hi[ok], sub[ok], img[seg[ok]]
+    if not len(lo):
+        return stack
+
+    # merge overlapping spans on each sub-row so that coverage isn't counted twice
+    key = img * n_sub + sub
+    # sort by sub-row and span start (composite key is exact in float64)
+    order = np.argsort(key * (res + 1.0) + lo)
+    lo, hi, key = lo[order], hi[order], key[order]
+    group = np.cumsum(np.r_[True, key[1:] != key[:-1]])
+    # offset groups so that running maximum doesn't leak between them
+    shift = group * (res + 1.0)
+    hi_max = np.maximum.accumulate(hi + shift) - shift
+    new = np.r_[True, (key[1:] != key[:-1]) | (lo[1:] > hi_max[:-1])]
+    starts = np.flatnonzero(new)
+    lo, key = lo[starts], key[starts]
+    hi = np.maximum.reduceat(hi, starts)
+    img, row = key // n_sub, (key % n_sub) // ss
+
+    # each span covers full pixels (runs) and partially covers its end pixels
+    w = 1.0 / ss
+    if ss == 1:
+        # no anti-aliasing: pixels with centers within span
+        run0 = np.ceil(lo - 0.5).astype(np.int64)
+        run1 = np.floor(hi - 0.5).astype(np.int64) + 1
+        part_pos = part_w = np.zeros(0)
+        part_img = part_row = np.zeros(0, dtype=np.int64)
+    else:
+        fl = np.floor(lo).astype(np.int64)
+        fh = np.minimum(np.floor(hi).astype(np.int64), res - 1)
+        same = fl == fh
+        run0 = fl + 1
+        run1 = np.where(same, run0, fh)
+        part_img = np.concatenate((img, img[~same]))
+        part_row = np.concatenate((row, row[~same]))
+        part_pos = np.concatenate((fl, fh[~same]))
+        part_w = np.concatenate((
+            np.where(same, hi - lo, fl + 1 - lo) * w,
+            (hi - fh)[~same] * w))
+
+    # accumulate coverage of a group of images at a time to bound memory
+    images_step = max(1, RENDER_BATCH_PIXELS // (res * (res + 1)))
+    for start in range(0, len(curves), images_step):
+        stop = min(start + images_step, len(curves))
+        n = stop - start
+        sel = (img >= start) & (img < stop) & (run0 < run1)
+        base = ((img[sel] - start) * res + row[sel]) * (res + 1)
+        n_diff = n * res * (res + 1)
+        diff = (np.bincount(base + run0[sel], minlength=n_diff)
+                - np.bincount(base + run1[sel], minlength=n_diff)).astype(np.int32)
+        runs = np.cumsum(diff.reshape(n, res, res + 1)[:, :, :res], axis=2, dtype=np.int32)
+        if ss == 1:
+            stack[start:stop] = (runs > 0).view(np.uint8) * np.uint8(255)
+            continue
+        cov = runs.astype(np.float32)
+        cov *= 255.0 * w
+        sel = (part_img >= start) & (part_img < stop)
+        if sel.any():
+            pos = ((part_img[sel] - start) * res + part_row[sel]) * res + part_pos[sel]
+            part = np.bincount(pos, weights=part_w[sel] * 255.0, minlength=n * res * res)
+            cov += part.reshape(n, res, res).astype(np.float32)
+        cov += 0.5
+        np.clip(cov, 0.0, 255.0, out=cov)
+        stack[start:stop] = cov
+    return stack
+
+
+def capsule_spans(a, b, r, y):
+    """
+    Horizontal spans of capsules (segments a-b with radius r) at rows y.
+
+    Capsule is convex so its intersection with a row is a single span: the
+    union of spans of both end discs and the rectangle around the segment.
+
+    Returns:
+        (x_lo, x_hi) arrays, empty spans have x_lo > x_hi.
+    """
+    lo = np.full(len(y), np.inf)
+    hi = np.full(len(y), -np.inf)
+
+    # end discs
+    for p in (a, b):
+        h2 = r * r - (y - p[:, 1]) ** 2
+        h = np.sqrt(np.maximum(h2, 0.0))
+        hit = h2 >= 0
+        lo = np.where(hit, np.minimum(lo, p[:, 0] - h), lo)
+        hi = np.where(hit, np.maximum(hi, p[:, 0] + h), hi)
+
+    # rectangle: 0 <= (p - a).u <= length and -r <= (p - a).n <= r
+    d = b - a
+    length = np.hypot(d[:, 0], d[:, 1])
+    nz = length > 0
+    safe = np.where(nz, length, 1.0)
+    ux, uy = d[:, 0] / safe, d[:, 1] / safe
+    dy = y - a[:, 1]
+    # along: (x - ax) * ux + dy * uy in [0, length]
+    r_lo, r_hi = linear_span(ux, dy * uy - a[:, 0] * ux, 0.0, length)
+    # across: -(x - ax) * uy + dy * ux in [-r, r]
+    c_lo, c_hi = linear_span(-uy, dy * ux + a[:, 0] * uy, -r, r)
+    r_lo, r_hi = np.maximum(r_lo, c_lo), np.minimum(r_hi, c_hi)
+    hit = nz & (r_lo <= r_hi)
+    lo = np.where(hit, np.minimum(lo, r_lo), lo)
+    hi = np.where(hit, np.maximum(hi, r_hi), hi)
+    return lo, hi
+
+
+def linear_span(k, q, v_min, v_max):
+    """
+    Span of x where v_min <= k * x + q <= v_max (element-wise).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x0 = (v_min - q) / k
+        x1 = (v_max - q) / k
+    lo = np.where(k > 0, x0, x1)
+    hi = np.where(k > 0, x1, x0)
+    # constant: everything or nothing
+    inside = (q >= v_min) & (q <= v_max)
+    zero = k == 0
+    lo = np.where(zero, np.where(inside, -np.inf, np.inf), lo)
+    hi = np.where(zero, np.where(inside, np.inf, -np.inf), hi)
+    return lo, hi
+
+
+def render_symbol_previews(symbols, res=256, line_width=None,
+                           antialias=ANTIALIAS_DEFAULT, jobs=1) -> np.ndarray:
+    """
+    Render Symbol model previews: model component ellipses over
+    a faint average of Symbol Drawings.
+
+    All Drawings and ellipses of all Symbols are rendered in two batches
+    using [render_drawings][texnomagic.render.render_drawings].
+
+    Returns:
+        uint8 array of shape (len(symbols), res, res)
+    """
+    if not line_width:
+        line_width = default_line_width(res)
+    drawings, owners = [], []
+    ellipses, ellipse_owners = [], []
+    for i, symbol in enumerate(symbols):
+        for d in symbol.drawings:
+            if len(d.points) > 0:
+                drawings.append(d)
+                owners.append(i)
+        if symbol.model.ready:
+            ellipses.append(symbol.model.preview_drawing())
+            ellipse_owners.append(i)
+
+    previews = np.zeros((len(symbols), res, res), dtype=np.float32)
+    if drawings:
+        stack = render_drawings(drawings, res=res, line_width=line_width, antialias=antialias, jobs=jobs)
+        owners = np.array(owners)
+        counts = np.bincount(owners, minlength=len(symbols))
+        np.add.at(previews, owners, stack)
+        previews /= np.maximum(counts, 1)[:, None, None]
+        # drawings are only a faint background
+        previews *= 0.4
+    if ellipses:
+        stack = render_drawings(ellipses, res=res, line_width=max(line_width // 3, 1),
+                                antialias=antialias, jobs=jobs)
+        previews[ellipse_owners] = np.maximum(previews[ellipse_owners], stack)
+    return np.rint(previews).astype(np.uint8)
@@ -4,24 +4,57 @@ TexnoMagic RPC handling logic
 Individual functions in this module marked with @jsonrpcserver.method decorator
 are used for Remote Procedure Calls (RPC) by the TexnoMagic server.
 """
-from texnomagic.jsonrpcserver import method, Success
+import base64
+import logging
+import os
+import secrets
+import time
+
+from texnomagic.jsonrpcserver import method, Success, InvalidParams
 
 from texnomagic import __version__
 from texnomagic.drawing import TexnoMagicDrawing
+from texnomagic.jobs import TexnoMagicJob
+from texnomagic import memory
+from texnomagic.stream import TexnoMagicRecognitionStream, STREAMS_MAX, STREAMS_IDLE_TIMEOUT
 from texnomagic import mods
+from texnomagic import render
+from texnomagic import thumbs
 
 
 @method
 def reload(context):
     context['abcs'].load()
+    abcs_changed(context)
     return Success(True)
 
 
+def abcs_changed(context):
+    if 'reload' in context:
+        # propagate to other server workers
+        context['reload'].bump()
+
+
 @method
 def spell(context, text):
     return Success(context['lang'].parse(text))
 
 
+@method
+def spell_batch(context, texts):
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return InvalidParams("texts must be a list of strings")
+    if 'limits' in context and len(texts) > context['limits'].max_batch:
+        return InvalidParams({'size': len(texts), 'max': context['limits'].max_batch})
+    r = []
+    for spell_, error in context['lang'].parse_many(texts):
+        if error:
+            r.append({'error': error})
+        else:
+            r.append({'result': spell_})
+    return Success(r)
+
+
 @method
 def recognize(context, abc, curves):
     if not curves:
@@ -41,7 +74,7 @@ def recognize(context, abc, curves):
 
 
 @method
-def recognize_top(context, abc, curves, n=0):
+def recognize_top(context, abc, curves, n=0, shortlist=0, algo='gmm'):
     if not curves:
         return []
     _abc = context['abcs'].get_alphabet(name=abc)
@@ -50,7 +83,18 @@ def recognize_top(context, abc, curves, n=0):
 
     drawing = TexnoMagicDrawing(curves=curves)
     drawing.normalize()
-    symbols = _abc.scores(drawing)
+    if algo == 'knn':
+        # fast secondary recognizer using alphabet drawings index
+        symbols = []
+        for meaning, score in _abc.index.recognize(drawing):
+            s = _abc.get_symbol(meaning)
+            if s:
+                symbols.append((s, score))
+    elif algo == 'gmm':
+        # only fully score shortlisted candidates when requested
+        symbols = _abc.scores(drawing, shortlist=int(shortlist))
+    else:
+        raise ValueError("invalid recognition algorithm: %s" % algo)
     symbols = [s for s in symbols if s[1] > 0]
     if n:
         n = int(n)
@@ -58,6 +102,50 @@ def recognize_top(context, abc, curves, n=0):
     return Success([(s.name, score) for (s, score) in symbols])
 
 
+@method
+def stream_open(context, abc, n=5):
+    _abc = context['abcs'].get_alphabet(abc)
+    if not _abc:
+        raise ValueError("requested alphabet isn't available: %s" % abc)
+    streams = context.setdefault('streams', {})
+    if len(streams) >= STREAMS_MAX:
+        # close the least recently used stream if it's idle
+        stream_id, _stream = min(streams.items(), key=lambda i: i[1].last_used)
+        if time.monotonic() - _stream.last_used < STREAMS_IDLE_TIMEOUT:
+            raise ValueError("too many open recognition streams (max %d)" % STREAMS_MAX)
+        del streams[stream_id]
+    # random ids so that clients can't guess streams of others
+    stream_id = secrets.token_hex(16)
+    streams[stream_id] = TexnoMagicRecognitionStream(_abc, n=int(n))
+    return Success(stream_id)
+
+
+def get_stream(context, stream):
+    _stream = context.get('streams', {}).get(stream)
+    if not _stream:
+        raise ValueError("requested recognition stream isn't open: %s" % stream)
+    _stream.touch()
+    return _stream
+
+
+@method
+def stream_add(context, stream, points=None, curves=None, new_curve=False):
+    _stream = get_stream(context, stream)
+    if points:
+        _stream.add_points(points, new_curve=new_curve)
+    for curve in curves or []:
+        _stream.add_curve(curve)
+    return Success([(s.name, score) for (s, score) in _stream.top()])
+
+
+@method
+def stream_close(context, stream):
+    _stream = get_stream(context, stream)
+    del context['streams'][stream]
+    # final results are exact
+    return Success([(s.name, score) for (s, score) in _stream.finish()])
+
+
 @method
 def train_symbol(context, abc, symbol, n_gauss=0):
     _abc = context['abcs'].get_alphabet(abc)
@@ -66,43 +154,162 @@ def train_symbol(context, abc, symbol, n_gauss=0):
     _symbol = _abc.get_symbol(symbol)
     if not _symbol:
         raise ValueError("requested symbol isn't available: %s" % symbol)
-    r = _symbol.train_model(n_gauss=n_gauss)
+    r = _symbol.train_model(n_gauss=n_gauss, preprocess=_abc.preprocess)
     assert(r)
     _symbol.model.save()
+    abcs_changed(context)
     return Success(True)
 
 
 @method
-def model_preview(context, abc, symbol):
+def model_preview(context, abc, symbol, image=False, res=256, format=thumbs.THUMB_FORMAT_DEFAULT):
     _abc = context['abcs'].get_alphabet(abc)
     if not _abc:
         raise ValueError("requested alphabet isn't available: %s" % abc)
     _symbol = _abc.get_symbol(symbol)
     if not _symbol:
         raise ValueError("requested symbol isn't available: %s" % symbol)
+    if image:
+        if format not in thumbs.THUMB_FORMATS:
+            raise ValueError("invalid preview format: %s" % format)
+        res = int(res)
+        if not 0 < res <= thumbs.THUMBS_RES_MAX:
+            raise ValueError("invalid preview resolution: %s (max %d)" % (res, thumbs.THUMBS_RES_MAX))
     model = _symbol.model
     if not model:
         return {}
-    p = model.get_preview()
+    p = dict(model.get_preview())
+    if image:
+        # server-side render of model components over symbol drawings
+        data = render.render_symbol_previews([_symbol], res=res)[0]
+        p['image'] = {
+            'format': format,
+            'res': res,
+            'data': base64.b64encode(thumbs.encode_thumb(data, format=format)).decode('ascii'),
+        }
     return Success(p)
 
 
 @method
-def download_mod(context, mod):
-    all_mods = mods.get_online_mods()
-    for m in all_mods:
-        if m.name_id == mod or m.name == mod:
-            m.download()
-            return Success(True)
-    return Success(False)
+def thumbnail(context, abc, symbol, drawing=None, res=thumbs.THUMBS_RES_DEFAULT, format=thumbs.THUMB_FORMAT_DEFAULT):
+    _abc = context['abcs'].get_alphabet(abc)
+    if not _abc:
+        raise ValueError("requested alphabet isn't available: %s" % abc)
+    _symbol = _abc.get_symbol(symbol)
+    if not _symbol:
+        raise ValueError("requested symbol isn't available: %s" % symbol)
+    if format not in thumbs.THUMB_FORMATS:
+        raise ValueError("invalid thumbnail format: %s" % format)
+    res = int(res)
+    if not 0 < res <= thumbs.THUMBS_RES_MAX:
+        raise ValueError("invalid thumbnail resolution: %s (max %d)" % (res, thumbs.THUMBS_RES_MAX))
+    cache = context['thumbs']
+    if drawing:
+        _drawing = next((d for d in _symbol.drawings if d.name == drawing), None)
+        if not _drawing:
+            raise ValueError("requested drawing isn't available: %s" % drawing)
+        data = cache.get_one(_drawing, res=res)
+    else:
+        # symbol thumbnail is an average of its drawings
+        data = cache.get_symbol(_symbol, res=res)
+    r = {
+        'format': format,
+        'res': res,
+        'data': base64.b64encode(thumbs.encode_thumb(data, format=format)).decode('ascii'),
+    }
+    return Success(r)
+
+
+@method
+def download_mod(context, mod, wait=False):
+
+    def download(job):
+        # mods index is fetched in the job, it can take a while
+        job.update(message="looking up %s" % mod)
+        index = mods.get_mod_index()
+        all_mods = mods.get_online_mods(index=index)
+        m = next((m for m in all_mods if m.name_id == mod or m.name == mod), None)
+        if not m:
+            raise ValueError("requested mod isn't available: %s" % mod)
+        job.update(message="downloading %s" % m.name)
+        md5 = m.download(progress=lambda p: job.update(progress=0.9 * p))
+        index.record_install(m, md5)
+        job.update(message="reloading %s" % m.name)
+        # only reload affected alphabets
+        abcs = context['abcs']
+        for path in m.paths:
+            if abcs.get_path_tag(path) is None:
+                logging.warning("mod path isn't within alphabets paths, not reloading: %s", path)
+                continue
+            abcs.reload_alphabet(path)
+        abcs_changed(context)
+        return True
+
+    if wait:
+        return Success(download(TexnoMagicJob(None, 'download_mod')))
+    job = context['jobs'].submit('download_mod', download)
+    return Success({'job': job.id})
 
 
 @method
-def export_abc(context, abc):
+def export_abc(context, abc, wait=False):
     _abc = context['abcs'].get_alphabet(abc)
     if not _abc:
         raise ValueError("requested alphabet isn't available: %s" % abc)
-    return Success(_abc.export())
+
+    def export(job):
+        job.update(message="exporting %s" % _abc.name)
+        return _abc.export(progress=lambda p: job.update(progress=p))
+
+    if wait:
+        return Success(export(TexnoMagicJob(None, 'export_abc')))
+    job = context['jobs'].submit('export_abc', export)
+    return Success({'job': job.id})
+
+
+def get_job(context, job):
+    _job = context['jobs'].get(job)
+    if not _job:
+        raise ValueError("requested job isn't available: %s" % job)
+    return _job
+
+
+@method
+def job_status(context, job):
+    return Success(get_job(context, job).as_dict())
+
+
+@method
+def job_result(context, job):
+    _job = get_job(context, job)
+    if _job.status == 'failed':
+        raise ValueError("job failed: %s" % _job.error)
+    if _job.status != 'done':
+        raise ValueError("job isn't finished: %s" % _job.status)
+    return Success(_job.result)
+
+
+@method
+def stats(context):
+    s = {
+        'spell_cache': context['lang'].cache_stats(),
+        'streams': len(context.get('streams', {})),
+    }
+    if 'thumbs' in context:
+        s['thumbs'] = context['thumbs'].stats()
+    if 'jobs' in context:
+        s['jobs'] = context['jobs'].stats()
+    s['memory'] = memory.memory_stats()
+    if 'limits' in context:
+        s['limits'] = context['limits'].stats()
+    if 'reload' in context:
+        s['worker'] = {
+            'pid': os.getpid(),
+            'reloads': context['reload'].seen,
+        }
+    if 'models' in context:
+        s['models'] = context['models'].stats()
+    return Success(s)
 
 
 @method
@@ -14,15 +14,26 @@ networking or simply write a client of your own in a language of your choice.
 Please see `client.py` for a reference implementation of a client.
 """
 import logging
+import os
+import socket
 import socketserver
 import sys
+import time
 
 from texnomagic.jsonrpcserver import dispatch, ensure_jsonrpcserver
 
 from texnomagic import __version__
 from texnomagic import common
 from texnomagic.abcs import TexnoMagicAlphabets
-from texnomagic.lang import TexnoMagicLanguage
+from texnomagic.lang import TexnoMagicLanguage, SPELL_PARSER_DEFAULT
+from texnomagic.jobs import TexnoMagicJobs
+from texnomagic import jsonio
+from texnomagic.limits import TexnoMagicLimits, error_response, ERROR_INVALID_REQUEST, ERROR_SERVER_BUSY
+from texnomagic import memory
+from texnomagic.shm import TexnoMagicModelStore, SHM_NAME_DEFAULT
+from texnomagic.spelltable import get_spell_table
+from texnomagic.thumbs import TexnoMagicThumbnailCache
+from texnomagic.workers import TexnoMagicReload, TexnoMagicWorkers
 # must be loaded in order for jsonrpc.dispatch() to work
 from texnomagic import requests  # noqa
 
@@ -33,28 +44,118 @@ logging.basicConfig(stream=sys.stderr, level=logging.DEBUG, format=LOG_FORMAT)
 DEFAULT_PORT = 6969
 
 
-def serve(host='localhost', port=DEFAULT_PORT, abcs=None):
+def serve(host='localhost', port=DEFAULT_PORT, abcs=None, spell_parser=SPELL_PARSER_DEFAULT,
+          spell_table=0, memory_budget=0, workers=0, limits=None):
     """
     start TexnoMagic TCP server and serve forever
+
+    Use precomputed table of spells up to `spell_table` tokens long
+    (see texnomagic.spelltable), 0 disables the table.
+
+    Loaded drawings points are limited to `memory_budget` bytes
+    (see texnomagic.memory), 0 means unlimited.
+
+    Serve using `workers` pre-forked processes (see texnomagic.workers),
+    0 means serving in a single process.
+
+    Server `limits` are texnomagic.limits.TexnoMagicLimits,
+    default limits are used when not supplied.
     """
     ensure_jsonrpcserver()
+    memory.set_memory_budget(memory_budget)
 
     logging.info("START TexnoMagic TCP server %s on %s:%s ..." % (__version__, host, port))
     if not abcs:
         abcs = TexnoMagicAlphabets()
         abcs.load()
 
-    with socketserver.TCPServer((host, port), TexnoMagicTCPHandler) as server:
-        server.context = {
+    table = None
+    if spell_table:
+        table = get_spell_table(max_tokens=spell_table)
+        if table:
+            logging.info("spell table: %d spells" % len(table))
+        else:
+            # building the table takes a while, don't block the server
+            logging.warning("spell table up to %d tokens NOT FOUND, serving without it "
+                            "- build it using: texnomagic spell table -n %d"
+                            % (spell_table, spell_table))
+
+    if not limits:
+        limits = TexnoMagicLimits()
+
+    def new_context(**kwargs):
+        return {
             'abcs': abcs,
-            'lang': TexnoMagicLanguage()
+            'lang': TexnoMagicLanguage(parser=spell_parser, table=table),
+            'streams': {},
+            'thumbs': TexnoMagicThumbnailCache(),
+            'jobs': TexnoMagicJobs(),
+            'limits': limits,
+            **kwargs,
         }
+
+    with TexnoMagicTCPServer((host, port), TexnoMagicTCPHandler) as server:
         logging.info("alphabets: %s" % abcs.pretty())
-        logging.info("server is RUNNING at %s:%s (CTRL+C to terminate)", host, port)
-        try:
-            server.serve_forever()
-        except (KeyboardInterrupt, SystemExit):
+        if workers:
+            # workers accept connections on the shared listening socket,
+            # idle workers mustn't block in accept() when another one was faster
+            server.socket.setblocking(False)
+            reload = TexnoMagicReload()
+            # supervisor publishes models into shared memory, workers use them
+            models = TexnoMagicModelStore('%s-%d' % (SHM_NAME_DEFAULT, os.getpid()))
+
+            def publish_models():
+                models.publish(abcs)
+                models.apply(abcs)
+                logging.info("models PUBLISHED: %s" % models)
+
+            def on_reload():
+                logging.info("RELOAD alphabets")
+                abcs.load()
+                publish_models()
+
+            publish_models()
+            supervisor = TexnoMagicWorkers(
+                workers,
+                work=lambda: run_server(server, new_context(reload=reload, models=models)),
+                reload=reload,
+                on_reload=on_reload)
+            logging.info("server is RUNNING at %s:%s with %d workers (CTRL+C to terminate)",
+                         host, port, workers)
+            try:
+                supervisor.run()
+            finally:
+                models.unlink()
             logging.info("server is SHUTTING DOWN, bye o/")
+        else:
+            logging.info("server is RUNNING at %s:%s (CTRL+C to terminate)", host, port)
+            run_server(server, new_context())
+
+
+def run_server(server, context):
+    """
+    serve forever using supplied context
+    """
+    server.context = context
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        logging.info("server is SHUTTING DOWN, bye o/")
+    finally:
+        context['jobs'].shutdown(wait=False)
+
+
+class TexnoMagicTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    TexnoMagic TCP server handling each connection in a thread
+
+    Number of connections and concurrently processed requests
+    is limited by context['limits'] (see texnomagic.limits).
+    """
+    daemon_threads = True
+    block_on_close = False
+    # server closes misbehaving connections, don't wait for TIME_WAIT on restart
+    allow_reuse_address = True
 
 
 class TexnoMagicTCPHandler(socketserver.BaseRequestHandler):
@@ -65,10 +166,46 @@ class TexnoMagicTCPHandler(socketserver.BaseRequestHandler):
     """
     def handle(self):
         logging.info("NEW STREAM: %s", self.client_address)
+        limits = self.server.context['limits']
+        if not limits.connect():
+            logging.warning("TOO MANY CONNECTIONS: %s", limits.connections)
+            self.send_data(error_response(ERROR_SERVER_BUSY, "Too many connections"))
+            return
+        try:
+            self.handle_requests(limits)
+        finally:
+            limits.disconnect()
+
+    def handle_requests(self, limits):
         while True:
             # self.request is the TCP socket connected to the client
             try:
-                size_raw = self.request.recv(4)
+                size_raw = self.recv_data(4, timeout=limits.idle_timeout)
+                if size_raw is None:
+                    logging.info("DISCONNECT")
+                    return
+                size = common.bytes2int(size_raw)
+                if size > limits.max_frame:
+                    logging.warning("TOO BIG REQUEST: %s B", size)
+                    limits.reject('frame')
+                    # the rest of the stream can't be trusted
+                    self.send_data(error_response(
+                        ERROR_INVALID_REQUEST, "Request too large",
+                        data={'size': size, 'max': limits.max_frame}))
+                    return
+                data_raw = self.recv_data(size, timeout=limits.read_timeout)
+                if data_raw is None:
+                    logging.warning("TOO FEW BYTES: expected %s", size)
+                    return
+                response = self.process(data_raw, limits)
+                if response:
+                    # don't wait for a slow client forever
+                    self.request.settimeout(limits.read_timeout or None)
+                    self.send_data(response)
+            except socket.timeout:
+                logging.warning("TIMEOUT: %s", self.client_address)
+                limits.reject('timeout')
+                return
             except ConnectionResetError:
                 logging.info("CLOSED connection by client")
                 return
@@ -76,34 +213,75 @@ class TexnoMagicTCPHandler(socketserver.BaseRequestHandler):
                 logging.info("ABORTED connection")
                 return
 
-            n_read = len(size_raw)
-            if n_read == 0:
-                logging.info("DISCONNECT (0 bytes read)")
-                return
-            elif n_read != 4:
-                logging.warning("TOO FEW BYTES: %s", n_read)
-                return
-            size = common.bytes2int(size_raw)
-            i = 0
-            data_raw = bytes()
-            while i < size:
-                rest = size - i
-                n = min(rest, common.BUFFER_SIZE)
-                data_raw += self.request.recv(n)
-                i += n
-            data = data_raw.decode('utf-8')
+    def process(self, data, limits):
+        try:
+            request = jsonio.loads(data)
+        except ValueError:
+            # let dispatch() report parse error
+            request = None
+            deserializer = jsonio.loads
+        else:
+            deserializer = lambda _: request  # noqa: E731
+        if isinstance(request, list) and len(request) > limits.max_batch:
+            limits.reject('batch')
+            return error_response(
+                ERROR_INVALID_REQUEST, "Batch too large",
+                data={'size': len(request), 'max': limits.max_batch})
+        if not limits.acquire():
+            id_ = request.get('id') if isinstance(request, dict) else None
+            return error_response(ERROR_SERVER_BUSY, "Server busy", id=id_)
+        try:
+            context = self.server.context
+            reload = context.get('reload')
+            if reload and reload.changed():
+                # alphabets were reloaded by another worker
+                logging.info("RELOAD alphabets")
+                context['abcs'].load()
+            models = context.get('models')
+            if models and models.refresh():
+                # use models published by supervisor after (re)load
+                models.apply(context['abcs'])
             # please see requests.py for individual requests' code
-            response = dispatch(data, context=self.server.context)
-            if response:
-                self.send_data(response)
+            return dispatch(data, context=context, deserializer=deserializer, serializer=jsonio.dumpb)
+        finally:
+            limits.release()
+
+    def recv_data(self, size, timeout=None):
+        """
+        Receive exactly size bytes within timeout.
+
+        Returns None when connection is closed before that.
+
+        Memory is only allocated as data arrive, not for the claimed size.
+        """
+        chunks = []
+        deadline = None
+        if timeout:
+            deadline = time.monotonic() + timeout
+        else:
+            self.request.settimeout(None)
+        i = 0
+        while i < size:
+            if deadline:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout()
+                self.request.settimeout(remaining)
+            chunk = self.request.recv(min(size - i, common.BUFFER_SIZE))
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            i += len(chunk)
+        return b''.join(chunks)
 
     def finish(self):
         logging.info("STREAM CLOSED: %s", self.client_address)
 
     def send_data(self, data):
-        raw_data = bytes(data.encode('utf-8'))
-        head = common.int2bytes(len(raw_data))
-        payload = head + raw_data
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        head = common.int2bytes(len(data))
+        payload = head + data
         return self.request.sendall(payload)
 
 
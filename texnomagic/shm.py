@@ -0,0 +1,340 @@
+"""
+TexnoMagic shared-memory model store
+
+Symbol models of all alphabets are published by a single loader process
+into a `multiprocessing.shared_memory` block as a few stacked arrays:
+
+* GMM parameters of all components of all models (`weights`, `means`,
+  `covariances`, `precisions_cholesky`) and `labels_avg` normalization stats
+* `offsets`: start of each model in component arrays (plus total end)
+* `score_avg`: score normalization stat of each model
+
+Other processes attach to the block and use read-only views of the arrays
+without copying (see [apply][texnomagic.shm.TexnoMagicModelStore.apply]).
+
+Each publish creates a new block and then bumps a generation counter
+in a small control block so that readers atomically swap to new models
+on retrain or reload (see [refresh][texnomagic.shm.TexnoMagicModelStore.refresh]).
+
+Server with workers (see [texnomagic.workers][]) publishes models from its
+supervisor after alphabets are loaded and workers apply new generations.
+"""
+import json
+from multiprocessing import resource_tracker, shared_memory
+import struct
+import threading
+
+import numpy as np
+
+from texnomagic.model import TexnoMagicSymbolModel
+
+
+SHM_NAME_DEFAULT = 'texnomagic-models'
+SHM_MAGIC = b'TXMS'
+# magic, generation, index length
+SHM_HEADER = struct.Struct('<4sqq')
+SHM_ALIGN = 64
+# generation counter
+CONTROL_SIZE = 8
+# attempts to attach a generation being replaced
+ATTACH_RETRIES = 8
+
+PARAMS = ['weights', 'means', 'covariances', 'precisions_cholesky']
+
+_untracked_lock = threading.Lock()
+
+
+class TexnoMagicModelStore:
+    """
+    Shared-memory store of Symbol models.
+
+    Loader process [publishes][texnomagic.shm.TexnoMagicModelStore.publish]
+    models, other processes [refresh][texnomagic.shm.TexnoMagicModelStore.refresh]
+    to attach to the current generation.
+    """
+    def __init__(self, name=SHM_NAME_DEFAULT):
+        self.name = name
+        # generation of attached/published data
+        self.generation = 0
+        self.index = {}
+        self.arrays = {}
+        self._control = None
+        self._block = None
+        self._owner = False
+        # detached blocks still referenced by models
+        self._retired = []
+
+    @property
+    def current_generation(self) -> int:
+        """Latest published generation (0 = nothing published)."""
+        if self._control is None:
+            self._control = attach_shm(self.control_name)
+            if self._control is None:
+                return 0
+        return int(np.ndarray((1,), dtype=np.int64, buffer=self._control.buf)[0])
+
+    @property
+    def control_name(self) -> str:
+        return f'{self.name}-ctl'
+
+    def block_name(self, generation) -> str:
+        return f'{self.name}-{generation}'
+
+    def publish(self, abcs) -> int:
+        """
+        Publish ready models of all Alphabets into a new generation.
+
+        Args:
+            abcs: [TexnoMagicAlphabets][texnomagic.abcs.TexnoMagicAlphabets]
+
+        Returns:
+            new generation
+        """
+        models = {}
+        for abcs_ in abcs.abcs.values():
+            for abc in abcs_:
+                for symbol in abc.symbols:
+                    if symbol.model.ready:
+                        models[(str(abc.path), symbol.meaning)] = symbol.model
+        index, arrays = pack_models(models)
+
+        if self._control is None:
+            self._control = attach_shm(self.control_name)
+        # created memory must be tracked, see attach_shm
+        with _untracked_lock:
+            if self._control is None:
+                self._control = shared_memory.SharedMemory(
+                    name=self.control_name, create=True, size=CONTROL_SIZE)
+                self._owner = True
+            counter = np.ndarray((1,), dtype=np.int64, buffer=self._control.buf)
+            generation = int(counter[0]) + 1
+            block = write_block(self.block_name(generation), generation, index, arrays)
+        # swap
+        counter[0] = generation
+        old = self._block
+        self._block = block
+        self._owner = True
+        self._set_data(generation, block)
+        if old is not None:
+            unlink_shm(old)
+            self._retire(old)
+        return generation
+
+    def refresh(self) -> bool:
+        """
+        Attach to current generation when it changed.
+
+        Returns:
+            True when new generation was attached.
+        """
+        for _ in range(ATTACH_RETRIES):
+            generation = self.current_generation
+            if generation == self.generation:
+                return False
+            block = attach_shm(self.block_name(generation))
+            if block is None:
+                # replaced in the meantime, try again
+                continue
+            old = self._block
+            self._block = block
+            self._set_data(generation, block)
+            if old is not None:
+                self._retire(old)
+            return True
+        return False
+
+    def get_model(self, abc_path, meaning) -> TexnoMagicSymbolModel | None:
+        """Get a model using read-only views of shared arrays."""
+        entry = self.index.get(str(abc_path), {}).get(meaning)
+        if entry is None:
+            return None
+        i, preprocess = entry
+        a, b = self.arrays['offsets'][i:i + 2]
+        model = TexnoMagicSymbolModel()
+        model.set_params(
+            [self.arrays[p][a:b] for p in PARAMS],
+            score_avg=float(self.arrays['score_avg'][i]),
+            labels_avg=self.arrays['labels_avg'][a:b],
+            preprocess=preprocess)
+        return model
+
+    def apply(self, abcs) -> int:
+        """
+        Replace models of all loaded Alphabets Symbols by shared models.
+
+        Returns:
+            number of replaced models
+        """
+        n = 0
+        for abcs_ in abcs.abcs.values():
+            for abc in abcs_:
+                for symbol in abc.symbols:
+                    model = self.get_model(abc.path, symbol.meaning)
+                    if model:
+                        model.path = symbol.model_path
+                        symbol.model = model
+                        n += 1
+        return n
+
+    def close(self):
+        """Detach from shared memory.
+
+        Blocks still used by models are closed once they are released."""
+        self.index = {}
+        self.arrays = {}
+        for shm in (self._block, self._control):
+            if shm is not None:
+                self._retire(shm)
+        self._block = None
+        self._control = None
+
+    def unlink(self):
+        """Detach and remove published shared memory (publisher only)."""
+        block, control = self._block, self._control
+        self.close()
+        if self._owner:
+            for shm in (block, control):
+                if shm is not None:
+                    unlink_shm(shm)
+
+    def stats(self) -> dict:
+        return {
+            'name': self.name,
+            'generation': self.generation,
+            'models': len(self.arrays.get('score_avg', [])),
+            'size': self._block.size if self._block else 0,
+        }
+
+    def _retire(self, shm):
+        """Close detached block, or retry later while it's still in use."""
+        self._retired.append(shm)
+        retired = []
+        for s in self._retired:
+            try:
+                s.close()
+            except BufferError:
+                # exported array views still exist
+                retired.append(s)
+        self._retired = retired
+
+    def _set_data(self, generation, block):
+        self.generation, self.index, self.arrays = read_block(block)
+        assert self.generation == generation
+
+    def __repr__(self):
+        return '<TexnoMagicModelStore %s: generation %d>' % (self.name, self.generation)
+
+
+def pack_models(models):
+    """
+    Pack models into stacked arrays.
+
+    Returns:
+        (index, arrays) tuple where index maps abc path and symbol meaning
+        to (model number, preprocess)
+    """
+    index = {}
+    params = {p: [] for p in PARAMS}
+    labels_avg = []
+    score_avg = []
+    sizes = []
+    for i, ((abc_path, meaning), model) in enumerate(models.items()):
+        index.setdefault(abc_path, {})[meaning] = (i, model.preprocess)
+        for p, v in zip(PARAMS, model.gmm._get_parameters()):
+            params[p].append(np.asarray(v, dtype=np.float64))
+        labels_avg.append(np.asarray(model.labels_avg, dtype=np.float64))
+        score_avg.append(model.score_avg)
+        sizes.append(len(model.gmm.weights_))
+    arrays = {}
+    for p, vv in params.items():
+        arrays[p] = np.concatenate(vv) if vv else np.zeros(0)
+    arrays['labels_avg'] = np.concatenate(labels_avg) if labels_avg else np.zeros(0)
+    arrays['score_avg'] = np.array(score_avg, dtype=np.float64)
+    arrays['offsets'] = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+    return index, arrays
+
+
+def write_block(name, generation, index, arrays):
+    """Create a new shared memory block with index and arrays."""
+    layout = {}
+    offset = 0
+    for key, a in arrays.items():
+        layout[key] = [offset, a.dtype.str, a.shape]
+        offset = align(offset + a.nbytes)
+    meta = json.dumps({'index': index, 'layout': layout}).encode('utf-8')
+    data_offset = align(SHM_HEADER.size + len(meta))
+    block = shared_memory.SharedMemory(name=name, create=True, size=max(data_offset + offset, 1))
+    SHM_HEADER.pack_into(block.buf, 0, SHM_MAGIC, generation, len(meta))
+    block.buf[SHM_HEADER.size:SHM_HEADER.size + len(meta)] = meta
+    for key, a in arrays.items():
+        start, dtype, shape = layout[key]
+        view = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=data_offset + start)
+        view[...] = a
+    return block
+
+
+def read_block(block):
+    """
+    Read index and read-only array views from a shared memory block.
+
+    Returns:
+        (generation, index, arrays) tuple
+    """
+    magic, generation, meta_size = SHM_HEADER.unpack_from(block.buf, 0)
+    if magic != SHM_MAGIC:
+        raise ValueError("invalid shared model store: %s" % block.name)
+    meta = json.loads(bytes(block.buf[SHM_HEADER.size:SHM_HEADER.size + meta_size]))
+    data_offset = align(SHM_HEADER.size + meta_size)
+    arrays = {}
+    for key, (start, dtype, shape) in meta['layout'].items():
+        a = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=data_offset + start)
+        a.flags.writeable = False
+        arrays[key] = a
+    index = {
+        abc_path: {meaning: tuple(entry) for meaning, entry in models.items()}
+        for abc_path, models in meta['index'].items()}
+    return generation, index, arrays
+
+
+def attach_shm(name):
+    """
+    Attach to existing shared memory without tracking it.
+
+    Attached memory mustn't be removed by resource tracker
+    when attaching process exits. Returns None when it doesn't exist.
+
+    [!] On Python < 3.13 `resource_tracker.register` is replaced
+    for the whole process while attaching so shared memory created
+    by other threads at the same time wouldn't be tracked.
+    [TexnoMagicModelStore][texnomagic.shm.TexnoMagicModelStore] creates
+    memory under the same lock, other code mustn't create shared memory
+    concurrently with attaching.
+    """
+    try:
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            pass
+        # Python < 3.13 always registers attached memory with resource tracker
+        # which is shared with forked processes, unregistering it afterwards
+        # would also drop registration of the creating process
+        with _untracked_lock:
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                return shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+    except FileNotFoundError:
+        return None
+
+
+def unlink_shm(shm):
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def align(n):
+    return (n + SHM_ALIGN - 1) // SHM_ALIGN * SHM_ALIGN
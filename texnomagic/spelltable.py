@@ -0,0 +1,225 @@
+"""
+TexnoMagic spell table
+
+TexnoMagic grammar is finite once spell length is bounded so all
+canonical spells (keywords separated by single spaces) up to a maximal
+number of tokens can be precomputed into a lookup table with O(1) lookups.
+
+Candidate spells are enumerated from `TEXNOMAGIC_GRAMMAR` expressions
+and each candidate is parsed using the reference PEG parser so the table
+contains exactly the same results as the grammar.
+
+Building the table takes a while so it's built offline using
+`texnomagic spell table` and only loaded by the server.
+
+Table is stored as gzip compressed JSON with identical parse results
+stored only once (different mods order often produces the same spell).
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from parsimonious import expressions
+from parsimonious.exceptions import ParseError
+
+from texnomagic import common
+from texnomagic import lang
+
+
+SPELL_TABLE_FILE = 'spell_table.json.gz'
+SPELL_TABLE_PATH = common.CACHE_PATH / SPELL_TABLE_FILE
+# longest realistic spells: big fast fire bolt forward
+SPELL_TABLE_MAX_TOKENS = 5
+
+
+class TexnoMagicSpellTable:
+    """
+    Precomputed table of all canonical spells up to `max_tokens` long.
+
+    Use [get][texnomagic.spelltable.TexnoMagicSpellTable.get] for lookups.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.max_tokens = 0
+        self.build_time = None
+        # spell text -> index into results
+        self.spells = {}
+        # unique parse results
+        self.results = []
+
+    def __len__(self):
+        return len(self.spells)
+
+    def __contains__(self, text):
+        return text in self.spells
+
+    def get(self, text):
+        """
+        Look up parsed spell.
+
+        Returns:
+            a copy of parsed spell or `None` when spell isn't in the table.
+        """
+        i = self.spells.get(text)
+        if i is None:
+            return None
+        return lang.copy_spell(self.results[i])
+
+    def build(self, max_tokens=SPELL_TABLE_MAX_TOKENS, parser='peg'):
+        """
+        Build the table by parsing all candidate spells up to max_tokens long.
+
+        Candidates are validated using the reference `peg` parser by default.
+        """
+        start = time.perf_counter()
+        txlang = lang.TexnoMagicLanguage(cache_size=0, parser=parser)
+        spells = {}
+        results = []
+        result_index = {}
+        for text in spell_candidates(max_tokens):
+            try:
+                spell = txlang.parse(text)
+            except ParseError:
+                continue
+            key = json.dumps(spell, sort_keys=True)
+            i = result_index.get(key)
+            if i is None:
+                i = result_index[key] = len(results)
+                results.append(spell)
+            spells[text] = i
+        self.max_tokens = max_tokens
+        self.spells = spells
+        self.results = results
+        self.build_time = time.perf_counter() - start
+        return self
+
+    def save(self):
+        """
+        Save table into its path.
+
+        [!] Overwrites existing data!
+        """
+        data = {
+            'grammar': grammar_hash(),
+            'max_tokens': self.max_tokens,
+            'results': self.results,
+            'spells': self.spells,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # write atomically to avoid partial tables from concurrent processes
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            with gzip.GzipFile(fileobj=f, mode='wb') as gz:
+                gz.write(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        os.replace(tmp, self.path)
+
+    def load(self, path=None):
+        """
+        Load table from path.
+
+        Tables generated from a different grammar are ignored.
+        """
+        if path:
+            self.path = path
+        if not self.path.exists():
+            return False
+        with gzip.open(self.path, 'rb') as f:
+            data = json.loads(f.read())
+        if data.get('grammar') != grammar_hash():
+            return False
+        self.max_tokens = data['max_tokens']
+        self.results = data['results']
+        self.spells = data['spells']
+        return True
+
+    def __repr__(self):
+        return '<TexnoMagicSpellTable: %d spells @ %s>' % (len(self), self.path)
+
+
+def get_spell_table(path=None, max_tokens=SPELL_TABLE_MAX_TOKENS):
+    """
+    Load spell table from path.
+
+    Returns:
+        loaded table or `None` when it's missing, outdated,
+        or smaller than required - build it using `texnomagic spell table`.
+    """
+    table = TexnoMagicSpellTable(path=path or SPELL_TABLE_PATH)
+    if table.load() and table.max_tokens >= max_tokens:
+        return table
+    return None
+
+
+def grammar_hash():
+    """Hash of TexnoMagic grammar used to detect outdated tables."""
+    return hashlib.sha1(lang.TEXNOMAGIC_GRAMMAR.encode('utf-8')).hexdigest()[:16]
+
+
+def spell_candidates(max_tokens=SPELL_TABLE_MAX_TOKENS):
+    """
+    Enumerate candidate spell texts up to max_tokens long from the grammar.
+
+    Grammar is read as if it was context-free (ignoring PEG ordered choice
+    and greediness) which generates a superset of valid spells.
+    Candidates need to be validated by parsing.
+    """
+    grammar = lang.get_grammar()
+    memo = {}
+    for tokens in sorted(expression_tokens(grammar.default_rule, max_tokens, memo)):
+        yield ' '.join(tokens)
+
+
+def expression_tokens(expr, budget, memo):
+    """
+    Return a set of token tuples up to budget tokens long matched by
+    a grammar expression.
+
+    Whitespace literals don't produce tokens - tokens are joined by spaces.
+    """
+    key = (id(expr), budget)
+    if key in memo:
+        return memo[key]
+
+    if isinstance(expr, expressions.Literal):
+        if not expr.literal.strip():
+            r = {()}
+        elif budget >= 1:
+            r = {(expr.literal,)}
+        else:
+            r = set()
+    elif isinstance(expr, expressions.OneOf):
+        r = set()
+        for m in expr.members:
+            r |= expression_tokens(m, budget, memo)
+    elif isinstance(expr, expressions.Sequence):
+        r = {()}
+        for m in expr.members:
+            r = concat_tokens(r, m, budget, memo)
+    elif isinstance(expr, expressions.Quantifier):
+        r = {()} if expr.min == 0 else set()
+        seq = {()}
+        # each non-empty repetition adds a token so there's nothing new after this
+        n_max = min(expr.max, budget + max(expr.min, 1))
+        k = 1
+        while k <= n_max:
+            seq = concat_tokens(seq, expr.members[0], budget, memo)
+            if k >= expr.min:
+                r |= seq
+            k += 1
+    else:
+        raise ValueError("unsupported grammar expression: %s" % expr)
+
+    memo[key] = r
+    return r
+
+
+def concat_tokens(prefixes, expr, budget, memo):
+    """Concatenate token tuples with tuples matched by expr within budget."""
+    r = set()
+    for prefix in prefixes:
+        for suffix in expression_tokens(expr, budget - len(prefix), memo):
+            r.add(prefix + suffix)
+    return r
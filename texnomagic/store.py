@@ -0,0 +1,105 @@
+"""
+TexnoMagic columnar drawings store
+
+Many loaded [Drawings][texnomagic.drawing.TexnoMagicDrawing] are packed
+into a few large arrays instead of keeping separate points arrays and
+curve views for each Drawing:
+
+* `points`: all points of all Drawings in a single (N, 2) array
+* `curve_offsets`: start of each curve in `points` (plus total end)
+* `drawing_offsets`: start of each Drawing in `curve_offsets` (plus total end)
+
+Packed Drawings become lightweight views into the store, their points and
+curves are created on access as NumPy views so in-place changes
+(such as normalization) are written directly into the store.
+"""
+import numpy as np
+
+
+class TexnoMagicDrawingStore:
+    """
+    Columnar store of Drawings points.
+
+    Use [pack_drawings][texnomagic.store.pack_drawings] to create it.
+    """
+    __slots__ = ('points', 'curve_offsets', 'drawing_offsets', '__weakref__')
+
+    def __init__(self, points=None, curve_offsets=None, drawing_offsets=None):
+        self.points = points if points is not None else np.zeros((0, 2))
+        self.curve_offsets = curve_offsets if curve_offsets is not None else np.zeros(1, dtype=np.int64)
+        self.drawing_offsets = drawing_offsets if drawing_offsets is not None else np.zeros(1, dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of store arrays in bytes."""
+        return self.points.nbytes + self.curve_offsets.nbytes + self.drawing_offsets.nbytes
+
+    def drawing_points(self, i : int) -> np.array:
+        """Points of i-th Drawing (a view)."""
+        c0, c1 = self.drawing_offsets[i], self.drawing_offsets[i + 1]
+        return self.points[self.curve_offsets[c0]:self.curve_offsets[c1]]
+
+    def drawing_curves(self, i : int) -> list[np.array]:
+        """Curves of i-th Drawing (views)."""
+        c0, c1 = self.drawing_offsets[i], self.drawing_offsets[i + 1]
+        offsets = self.curve_offsets[c0:c1 + 1].tolist()
+        return [self.points[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def span_points(self, first : int, last : int) -> np.array:
+        """Points of consecutive Drawings first..last (inclusive) as a single view."""
+        a = self.curve_offsets[self.drawing_offsets[first]]
+        b = self.curve_offsets[self.drawing_offsets[last + 1]]
+        return self.points[a:b]
+
+    def __len__(self) -> int:
+        return len(self.drawing_offsets) - 1
+
+    def __repr__(self) -> str:
+        return '<TexnoMagicDrawingStore: %d drawings, %d points, %d B>' % (
+            len(self), len(self.points), self.nbytes)
+
+
+def pack_drawings(drawings) -> TexnoMagicDrawingStore:
+    """
+    Pack Drawings into a new columnar store.
+
+    Drawings are loaded when needed and turned into views into the store
+    in-place, releasing their own points arrays.
+    """
+    drawings = list(drawings)
+    curve_sizes = []
+    n_curves = [0]
+    pp = []
+    for d in drawings:
+        curves = d.curves
+        curve_sizes += [len(c) for c in curves]
+        n_curves.append(len(curves))
+        pp.append(np.asarray(d.points, dtype=np.float64).reshape(-1, 2))
+    if pp:
+        points = np.concatenate(pp)
+    else:
+        points = np.zeros((0, 2))
+    curve_offsets = np.zeros(len(curve_sizes) + 1, dtype=np.int64)
+    np.cumsum(curve_sizes, out=curve_offsets[1:])
+    drawing_offsets = np.cumsum(n_curves, dtype=np.int64)
+    store = TexnoMagicDrawingStore(points, curve_offsets, drawing_offsets)
+    for i, d in enumerate(drawings):
+        d.attach_store(store, i)
+    return store
+
+
+def store_span(drawings) -> np.ndarray | None:
+    """
+    Get points of drawings as a single view when they are packed
+    consecutively in the same store, otherwise None.
+    """
+    if not drawings:
+        return None
+    store = drawings[0]._store
+    if store is None:
+        return None
+    first = drawings[0]._store_index
+    for i, d in enumerate(drawings):
+        if d._store is not store or d._store_index != first + i:
+            return None
+    return store.span_points(first, first + len(drawings) - 1)
@@ -0,0 +1,205 @@
+"""
+TexnoMagic streaming recognition
+
+Recognize a Drawing incrementally while it's being drawn.
+
+Symbol model scores only depend on additive per-point statistics
+(log-likelihood sums and component label counts, see
+[texnomagic.model.TexnoMagicSymbolModel.point_stats][]) so each update
+only needs to score new points.
+
+Models expect normalized points but normalization of a partial Drawing
+changes as the Drawing grows. Accumulated statistics are computed using
+the normalization in effect when they were computed and they're only
+recomputed from scratch (rebased) when the current normalization differs
+from it by more than `tolerance` of points range. Bounding box of a
+Drawing stabilizes quickly so rebases become rare as the Drawing grows.
+
+Models using drawings preprocessing (see
+[texnomagic.drawing.TexnoMagicDrawing.preprocessed][]) can't be scored
+incrementally and the whole Drawing is rescored on each update instead.
+"""
+import time
+
+import numpy as np
+
+from texnomagic.drawing import TexnoMagicDrawing
+
+
+# maximum number of simultaneously open streams in server
+STREAMS_MAX = 64
+# streams unused for longer (in seconds) may be closed to open new ones
+STREAMS_IDLE_TIMEOUT = 300.0
+
+class TexnoMagicRecognitionStream:
+    """
+    Incremental recognition session of a Drawing within an Alphabet.
+
+    Add points using [add_points][texnomagic.stream.TexnoMagicRecognitionStream.add_points]
+    and get provisional results using [top][texnomagic.stream.TexnoMagicRecognitionStream.top].
+    """
+    def __init__(self, abc, n=5, tolerance=0.05, points_range=1000.0):
+        self.abc = abc
+        self.n = n
+        self.tolerance = tolerance
+        self.points_range = points_range
+        self.curves = []
+        self.n_rebases = 0
+        # scored points chunks
+        self._chunks = []
+        # new points chunks waiting for update()
+        self._new = []
+        self._bbox = None
+        self._transform = None
+        self._stats = {}
+        self._scores = None
+        # time.monotonic() of last use, see touch()
+        self.last_used = time.monotonic()
+
+    @property
+    def points(self) -> np.array:
+        """All points added so far (not normalized)."""
+        chunks = self._chunks + self._new
+        if not chunks:
+            return np.zeros((0, 2))
+        return np.concatenate(chunks)
+
+    @property
+    def symbols(self) -> list:
+        """Alphabet Symbols with usable models."""
+        return [s for s in self.abc.symbols if s.model.ready]
+
+    def touch(self):
+        """Mark stream as used now."""
+        self.last_used = time.monotonic()
+
+    def add_points(self, points, new_curve=False):
+        """
+        Add points to current curve or start a new curve.
+
+        Returns:
+            provisional top results, see [top][texnomagic.stream.TexnoMagicRecognitionStream.top]
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if new_curve or not self.curves:
+            self.curves.append([])
+        self.curves[-1].extend(points.tolist())
+        if len(points):
+            self._new.append(points)
+        self.update()
+        return self.top()
+
+    def add_curve(self, curve):
+        """Add a new curve.
+
+        Returns:
+            provisional top results, see [top][texnomagic.stream.TexnoMagicRecognitionStream.top]
+        """
+        return self.add_points(curve, new_curve=True)
+
+    def update(self):
+        """Update scoring statistics with newly added points."""
+        if not self._new:
+            return
+        new = np.concatenate(self._new)
+        self._chunks += self._new
+        self._new = []
+        if any(s.model.preprocess for s in self.symbols):
+            # preprocessing isn't incremental - rescore everything
+            self._scores = self.abc.scores(self.drawing())
+            return
+
+        # running bounding box
+        bbox = np.array([np.min(new, axis=0), np.max(new, axis=0)])
+        if self._bbox is not None:
+            bbox = np.array([np.minimum(bbox[0], self._bbox[0]), np.maximum(bbox[1], self._bbox[1])])
+        self._bbox = bbox
+        transform = normalize_transform(bbox, self.points_range)
+        if self._transform is None or self._transform_diff(transform) > self.tolerance * self.points_range:
+            # normalization changed too much - rescore everything
+            self._transform = transform
+            self._stats = {}
+            new = self.points
+            self.n_rebases += 1
+
+        new = apply_transform(new, self._transform)
+        for symbol in self.symbols:
+            ll_sum, counts = symbol.model.point_stats(new)
+            stats = self._stats.get(symbol)
+            if stats:
+                ll_sum += stats[0]
+                counts = counts + stats[1]
+            self._stats[symbol] = (ll_sum, counts)
+
+    def top(self, n=None) -> list:
+        """
+        Get provisional top results.
+
+        Returns:
+            A list of up to n (symbol, score) tuples with positive score
+            ordered by score.
+        """
+        n = n or self.n
+        if self._scores is not None:
+            scores = [s for s in self._scores if s[1] > 0]
+        else:
+            scores = []
+            for symbol, (ll_sum, counts) in self._stats.items():
+                score = symbol.model.stats_score(ll_sum, counts)
+                if score > 0:
+                    scores.append((symbol, score))
+            scores.sort(key=lambda x: x[1], reverse=True)
+        if n:
+            scores = scores[:n]
+        return scores
+
+    def drawing(self) -> TexnoMagicDrawing:
+        """Return normalized Drawing of all points added so far."""
+        drawing = TexnoMagicDrawing(curves=self.curves, points_range=self.points_range)
+        drawing.normalize()
+        return drawing
+
+    def finish(self, n=None) -> list:
+        """
+        Get final (exact) top results by scoring the whole normalized Drawing.
+        """
+        n = n or self.n
+        if len(self.points) == 0:
+            return []
+        scores = [s for s in self.abc.scores(self.drawing()) if s[1] > 0]
+        if n:
+            scores = scores[:n]
+        return scores
+
+    def _transform_diff(self, transform) -> float:
+        """Maximal point shift between current and given normalization."""
+        # affine transforms differ the most in bounding box corners
+        corners = np.array([self._bbox[[0, 0, 1, 1], 0], self._bbox[[0, 1, 0, 1], 1]]).T
+        diff = apply_transform(corners, transform) - apply_transform(corners, self._transform)
+        return np.max(np.abs(diff))
+
+    def __repr__(self):
+        return '<TexnoMagicRecognitionStream: %d points, %d curves>' % (
+            len(self.points), len(self.curves))
+
+
+def normalize_transform(points, points_range=1000.0) -> tuple:
+    """
+    Compute normalization transform of points.
+
+    Equivalent to [texnomagic.drawing.normalize_points][].
+
+    Returns:
+        (min, k, offset) tuple, see [apply_transform][texnomagic.stream.apply_transform].
+    """
+    mins = np.min(points, axis=0)
+    extent = np.max(points, axis=0) - mins
+    k = points_range / max(np.max(extent), 0.2)
+    offset = (points_range - extent * k) / 2
+    return mins, k, offset
+
+
+def apply_transform(points, transform) -> np.array:
+    """Apply normalization transform to points."""
+    mins, k, offset = transform
+    return (points - mins) * k + offset
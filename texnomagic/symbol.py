@@ -5,8 +5,9 @@ import time
 from pathlib import Path
 
 from texnomagic import common
-from texnomagic.drawing import TexnoMagicDrawing
+from texnomagic.drawing import TexnoMagicDrawing, check_preprocess, normalize_drawings, save_drawings
 from texnomagic.model import TexnoMagicSymbolModel
+from texnomagic import store
 
 
 INFO_FILE = 'texno_symbol.json'
@@ -30,6 +31,11 @@ class TexnoMagicSymbol:
     This class provides convenient utilities for working with TexnoMagic Symbols,
     see individual methods.
     """
+    __slots__ = (
+        'path', 'name', 'meaning',
+        '_drawings', '_images', '_model', '_n_drawings', '_has_model',
+        '__weakref__',
+    )
     def __init__(self, path=None, meaning=None, name=None):
         if path and path.name.lower() == INFO_FILE:
             # accept path to symbol info file as well
@@ -41,6 +47,9 @@ class TexnoMagicSymbol:
         self._drawings = None
         self._images = None
         self._model = None
+        # catalog hints used until drawings/model are loaded
+        self._n_drawings = None
+        self._has_model = None
 
     @property
     def info_path(self) -> Path:
@@ -67,6 +76,20 @@ class TexnoMagicSymbol:
         """Symbol handle (lowercase string)."""
         return common.name2handle(self.name)
 
+    @property
+    def n_drawings(self) -> int:
+        """Number of Symbol drawings without loading them when known."""
+        if self._drawings is None and self._n_drawings is not None:
+            return self._n_drawings
+        return len(self.drawings)
+
+    @property
+    def has_model(self) -> bool:
+        """Does Symbol have a ready model? Avoids loading it when known."""
+        if self._model is None and self._has_model is not None:
+            return self._has_model
+        return self.model.ready
+
     @property
     def model(self) -> TexnoMagicSymbolModel:
         """Symbol model.
@@ -76,6 +99,11 @@ class TexnoMagicSymbol:
             self.load_model()
         return self._model
 
+    @model.setter
+    def model(self, model : TexnoMagicSymbolModel):
+        self._model = model
+        self._has_model = None
+
     def get_image_path(self, format=common.IMAGE_FORMAT_DEFAULT) -> Path:
         return self.image_base_path / f'symbol.{format}'
 
@@ -101,12 +129,23 @@ class TexnoMagicSymbol:
 
         assert self.path
         info = json.load(self.info_path.open())
+        return self.load_info(info)
+
+    def load_info(self, info : dict, path=None, n_drawings=None, has_model=None):
+        """Load Symbol metadata from info dict.
+
+        Optional `n_drawings` and `has_model` hints (from alphabets catalog)
+        are used until drawings or model are loaded."""
+        if path:
+            self.path = path
 
         name = info.get('name')
         if not name:
             name = self.path.name
         self.name = name
         self.meaning = info.get('meaning')
+        self._n_drawings = n_drawings
+        self._has_model = has_model
 
         return self
 
@@ -123,12 +162,17 @@ class TexnoMagicSymbol:
         self._model = TexnoMagicSymbolModel(self.model_path)
         self._model.load()
 
-    def train_model(self, n_gauss=0):
-        """Train Symbol model from drawings."""
+    def train_model(self, n_gauss=0, preprocess=None):
+        """Train Symbol model from drawings.
+
+        Optionally set drawings `preprocess` params used by the model,
+        see [texnomagic.drawing.TexnoMagicDrawing.preprocessed][]."""
         if not self._model:
             self._model = TexnoMagicSymbolModel(self.model_path)
         if n_gauss:
             self._model.n_gauss = n_gauss
+        if preprocess is not None:
+            self._model.preprocess = check_preprocess(preprocess)
         return self._model.train_symbol(self)
 
     def save(self):
@@ -163,7 +207,13 @@ class TexnoMagicSymbol:
         return self._drawings
 
     def get_all_drawing_points(self) -> np.array:
-        """Get a list of all points from all drawings."""
+        """Get a list of all points from all drawings.
+
+        Returns a view without copying when drawings are packed in a store,
+        see [texnomagic.store.pack_drawings][]."""
+        points = store.store_span(self.drawings)
+        if points is not None:
+            return points
         pp = [d.points for d in self.drawings]
         if pp:
             return np.concatenate(pp)
@@ -175,14 +225,16 @@ class TexnoMagicSymbol:
             return random.choice(self.drawings)
         return None
 
-    def normalize(self):
-        """Normalize all drawings. Overwrites files.
+    def normalize(self) -> int:
+        """Normalize all drawings. Overwrites changed files.
+
+        See [texnomagic.drawing.normalize_drawings][].
 
-        See [texnomagic.drawing.TexnoMagicDrawing.normalize]."""
-        for d in self.drawings:
-            if d.points.any():
-                d.normalize()
-                d.save()
+        Returns:
+            Number of rewritten drawings."""
+        changed = normalize_drawings([d for d in self.drawings if d.points.any()])
+        save_drawings(changed)
+        return len(changed)
 
     def as_dict(self) -> dict:
         """Return Symbol as a dict."""
@@ -191,7 +243,7 @@ class TexnoMagicSymbol:
             'name': self.name,
             'meaning': self.meaning,
             'path': str(self.path),
-            'n_drawings': len(self.drawings),
+            'n_drawings': self.n_drawings,
             'images': images,
         }
         if self.model:
@@ -208,9 +260,9 @@ class TexnoMagicSymbol:
         if images and self.images:
             fmts = [f'[blue]{f.upper()}[/]' for f in self.images.keys()]
             extras.append(f"{', '.join(fmts)} image")
-        if drawings and self.drawings:
-            extras.append(f'[white]{len(self.drawings)}[/] drawings')
-        if model and self.model.ready:
+        if drawings and self.n_drawings:
+            extras.append(f'[white]{self.n_drawings}[/] drawings')
+        if model and self.has_model:
             extras.append(f'{self.model.pretty()}')
         if extras:
             s += f": {', '.join(extras)}"
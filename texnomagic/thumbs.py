@@ -0,0 +1,203 @@
+"""
+TexnoMagic thumbnail cache
+
+Rendered Drawings (see [texnomagic.render.render_drawings][]) are cached
+on disk as raw grayscale rasters keyed by Drawing content hash,
+resolution, line width, and anti-aliasing.
+
+Cache size is bounded, least recently used thumbnails are evicted first
+(file modification time is updated on each use).
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+import numpy as np
+
+from texnomagic import common
+from texnomagic import render
+
+
+THUMBS_MAX_SIZE = 64 * 1024 * 1024
+THUMBS_RES_DEFAULT = 128
+# larger thumbnails are expensive to render and huge to send
+THUMBS_RES_MAX = 1024
+THUMB_FORMATS = ['png', 'raw']
+THUMB_FORMAT_DEFAULT = 'png'
+
+
+class TexnoMagicThumbnailCache:
+    """
+    On-disk cache of rendered Drawings.
+
+    Use [get][texnomagic.thumbs.TexnoMagicThumbnailCache.get] to get
+    thumbnails of many Drawings rendering only those not in cache.
+    """
+    def __init__(self, path=None, max_size=THUMBS_MAX_SIZE):
+        self.path = path or common.THUMBS_PATH
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # total size of cached files, computed on-demand
+        self._size = None
+
+    def key(self, drawing, res=THUMBS_RES_DEFAULT, line_width=None,
+            antialias=render.ANTIALIAS_DEFAULT) -> str:
+        """Cache key of a Drawing thumbnail."""
+        line_width = line_width or render.default_line_width(res)
+        k = f'{drawing.content_hash()}:{res}:{line_width}:{antialias}'
+        return hashlib.sha1(k.encode('utf-8')).hexdigest()
+
+    def thumb_path(self, key):
+        return self.path / key[:2] / f'{key}.raw'
+
+    def get(self, drawings, res=THUMBS_RES_DEFAULT, line_width=None,
+            antialias=render.ANTIALIAS_DEFAULT, jobs=1) -> np.ndarray:
+        """
+        Get thumbnails of Drawings, render and cache missing ones.
+
+        Returns:
+            uint8 array of shape (len(drawings), res, res)
+        """
+        stack = np.zeros((len(drawings), res, res), dtype=np.uint8)
+        missing = []
+        keys = [self.key(d, res, line_width, antialias) for d in drawings]
+        for i, key in enumerate(keys):
+            data = self._read(key, res)
+            if data is None:
+                missing.append(i)
+            else:
+                stack[i] = data
+        self.hits += len(drawings) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            rendered = render.render_drawings(
+                [drawings[i] for i in missing],
+                res=res, line_width=line_width, antialias=antialias, jobs=jobs)
+            for i, data in zip(missing, rendered):
+                stack[i] = data
+                self._write(keys[i], data)
+                # keep within max size during large batches
+                if self.size > self.max_size:
+                    self.evict()
+        return stack
+
+    def get_one(self, drawing, **kwargs) -> np.ndarray:
+        """Get thumbnail of a single Drawing."""
+        return self.get([drawing], **kwargs)[0]
+
+    def get_symbol(self, symbol, **kwargs) -> np.ndarray:
+        """
+        Get thumbnail of a Symbol: average of its Drawings thumbnails.
+        """
+        drawings = [d for d in symbol.drawings if len(d.points) > 0]
+        stack = self.get(drawings, **kwargs)
+        if not len(stack):
+            res = kwargs.get('res', THUMBS_RES_DEFAULT)
+            return np.zeros((res, res), dtype=np.uint8)
+        return np.rint(stack.mean(axis=0)).astype(np.uint8)
+
+    @property
+    def size(self) -> int:
+        """Total size of cached thumbnails in bytes."""
+        if self._size is None:
+            self._size = sum(f.stat().st_size for f in self.path.glob('*/*.raw'))
+        return self._size
+
+    def evict(self):
+        """
+        Remove least recently used thumbnails until cache fits into max size.
+
+        Returns:
+            number of removed thumbnails
+        """
+        if self.size <= self.max_size:
+            return 0
+        files = []
+        for f in self.path.glob('*/*.raw'):
+            st = f.stat()
+            files.append((st.st_mtime, st.st_size, f))
+        files.sort()
+        size = sum(f[1] for f in files)
+        # leave some room to avoid evicting on every write
+        target = self.max_size * 0.9
+        n = 0
+        for _, fsize, f in files:
+            if size <= target:
+                break
+            try:
+                f.unlink()
+            except FileNotFoundError:
+                pass
+            size -= fsize
+            n += 1
+        self._size = size
+        return n
+
+    def clear(self):
+        """Remove all cached thumbnails."""
+        for f in self.path.glob('*/*.raw'):
+            f.unlink()
+        self._size = 0
+
+    def stats(self) -> dict:
+        """Return thumbnail cache statistics."""
+        return {
+            'size': self.size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _read(self, key, res):
+        path = self.thumb_path(key)
+        try:
+            data = np.fromfile(path, dtype=np.uint8)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if data.size != res * res:
+            # partial or invalid thumbnail
+            return None
+        try:
+            # mark as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return data.reshape(res, res)
+
+    def _write(self, key, data):
+        path = self.thumb_path(key)
+        # count existing files before adding new one
+        size = self.size
+        try:
+            # replaced file (re-render or partial thumbnail)
+            size -= path.stat().st_size
+        except OSError:
+            pass
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write atomically to avoid partial thumbnails
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data.tobytes())
+            os.replace(tmp, path)
+        except OSError:
+            # cache is optional
+            return
+        self._size = size + data.size
+
+
+def encode_thumb(data : np.ndarray, format=THUMB_FORMAT_DEFAULT) -> bytes:
+    """
+    Encode thumbnail into PNG or raw grayscale (8-bit, row-major) bytes.
+    """
+    if format == 'raw':
+        return np.ascontiguousarray(data, dtype=np.uint8).tobytes()
+    if format == 'png':
+        render.ensure_pil()
+        out = io.BytesIO()
+        render.Image.fromarray(data).save(out, format='PNG')
+        return out.getvalue()
+    raise ValueError("invalid thumbnail format: %s" % format)
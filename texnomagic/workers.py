@@ -0,0 +1,166 @@
+"""
+TexnoMagic pre-forking server workers
+
+Scoring is CPU-bound so a single server process can't use much more than
+one CPU core. [TexnoMagicWorkers][texnomagic.workers.TexnoMagicWorkers]
+supervisor forks N worker processes after alphabets are loaded so that
+their memory is shared copy-on-write. Workers accept connections on the same
+listening socket inherited from the supervisor.
+
+Supervisor restarts crashed workers. Alphabets reload requested in any worker
+is propagated to all of them (and the supervisor) using a shared reload
+generation, see [TexnoMagicReload][texnomagic.workers.TexnoMagicReload].
+
+Requires `os.fork()` (POSIX).
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+
+# workers exiting sooner than this (in seconds) are restarted with a delay
+WORKERS_RESTART_DELAY = 1.0
+# how often (in seconds) supervisor checks for reloads in workers
+WORKERS_POLL_INTERVAL = 0.2
+
+
+class TexnoMagicReload:
+    """
+    Alphabets reload generation shared by supervisor and its workers.
+
+    Must be created before forking.
+    """
+    def __init__(self):
+        self._generation = multiprocessing.Value('q', 0)
+        # generation seen by this process
+        self.seen = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation.value
+
+    def bump(self) -> int:
+        """Announce alphabets reloaded in this process to others."""
+        with self._generation.get_lock():
+            self._generation.value += 1
+            self.seen = self._generation.value
+        return self.seen
+
+    def changed(self) -> bool:
+        """Check whether alphabets were reloaded elsewhere since last check."""
+        generation = self._generation.value
+        if generation == self.seen:
+            return False
+        self.seen = generation
+        return True
+
+    def __repr__(self):
+        return '<TexnoMagicReload: %d / %d>' % (self.seen, self.generation)
+
+
+class TexnoMagicWorkers:
+    """
+    Supervisor of pre-forked worker processes.
+
+    Each worker runs `work()` until it's terminated.
+    When alphabets reload happened in a worker, `on_reload()` is called
+    in the supervisor (within `WORKERS_POLL_INTERVAL`) so that it can
+    share current alphabets with workers and start new workers with them.
+    """
+    def __init__(self, n, work, reload=None, on_reload=None):
+        if not hasattr(os, 'fork'):
+            raise NotImplementedError("server workers require os.fork()")
+        self.n = n
+        self.work = work
+        self.reload = reload or TexnoMagicReload()
+        self.on_reload = on_reload
+        # pid -> start time
+        self.pids = {}
+        self.restarts = 0
+
+    def run(self):
+        """
+        Start workers and supervise them until interrupted or terminated.
+        """
+        sigterm = signal.signal(signal.SIGTERM, _terminate)
+        try:
+            for _ in range(self.n):
+                self.spawn()
+            while True:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    # no worker exited
+                    if self.reload.changed() and self.on_reload:
+                        self.on_reload()
+                    time.sleep(WORKERS_POLL_INTERVAL)
+                    continue
+                started = self.pids.pop(pid, None)
+                if started is None:
+                    # not a worker
+                    continue
+                logging.warning("worker %s DIED (status %s), restarting", pid, status)
+                if time.monotonic() - started < WORKERS_RESTART_DELAY:
+                    time.sleep(WORKERS_RESTART_DELAY)
+                self.restarts += 1
+                self.spawn()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            self.stop()
+            signal.signal(signal.SIGTERM, sigterm)
+
+    def spawn(self) -> int:
+        """
+        Fork a new worker.
+
+        Returns:
+            worker pid
+        """
+        if self.reload.changed() and self.on_reload:
+            self.on_reload()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            # worker
+            code = 1
+            try:
+                # supervisor takes care of terminating workers
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                self.pids = {}
+                self.work()
+                code = 0
+            except BaseException:
+                logging.exception("worker %s FAILED", os.getpid())
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        logging.info("worker %s STARTED", pid)
+        self.pids[pid] = time.monotonic()
+        return pid
+
+    def stop(self):
+        """Terminate all workers and wait for them."""
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.pids = {}
+
+    def __repr__(self):
+        return '<TexnoMagicWorkers: %d / %d running>' % (len(self.pids), self.n)
+
+
+def _terminate(signum, frame):
+    raise SystemExit(0)